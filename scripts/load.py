@@ -1,5 +1,21 @@
+from datetime import datetime
+
 import polars as pl
 
+from sdsprint import utils
+
 # Read 10k rows
 df = pl.read_parquet("data/aisdk-2024-1h.parquet", n_rows=10_000)
 print(df.head())
+
+# Read a day around Bornholm; only the overlapping row groups are read
+df, rep = utils.read_window(
+    "data/aisdk-2024-1h.parquet",
+    start=datetime(2024, 6, 17),
+    end=datetime(2024, 6, 18),
+    bbox=(14.5, 54.8, 15.5, 55.4),
+    columns=["MMSI", "# Timestamp", "Latitude", "Longitude"],
+    report=True,
+)
+print(df.head())
+print(rep)
@@ -12,17 +12,19 @@ os.environ["POLARS_MAX_THREADS"] = "4"  # Useful on personal laptop
 import polars as pl
 import seaborn as sns
 
+from sdsprint import storage
+
 df = (
-    pl.scan_parquet(
+    storage.scan(
         [
             "data/aisdk-2021-1h.parquet",
             "data/aisdk-2022-1h.parquet",
             "data/aisdk-2023-1h.parquet",
             "data/aisdk-2024-1h.parquet",
             "data/aisdk-2025-1h.parquet",
-        ]
+        ],
+        ensure_sorted=True,  # Only sorts files without a recorded order
     )
-    .sort("# Timestamp")
     .group_by_dynamic(
         "# Timestamp",
         every="1d",
@@ -15,6 +15,8 @@ os.environ["POLARS_MAX_THREADS"] = "4"  # Useful on personal laptop
 import polars as pl
 import seaborn as sns
 
+from sdsprint import storage
+
 if len(sys.argv) != 2:
     raise ValueError("Please provide the path to the data file")
 
@@ -28,34 +30,28 @@ if not file.exists():
 print(f"Reading file {file}")
 suffix = "-".join(file.stem.split("-")[-2:])  # year-frequency
 
-df = pl.read_parquet(file)
+df = storage.scan(file, ensure_sorted=True).collect()
 
 print("Schema:")
 pprint.pprint(df.schema)
 print(f"Shape: {df.shape}")
 
-gp = (
-    df.sort("# Timestamp")
-    .group_by_dynamic(
-        "# Timestamp",
-        every="1d",
-        closed="left",
-        include_boundaries=False,
-    )
-    .agg(pl.len())
-)
+gp = df.group_by_dynamic(
+    "# Timestamp",
+    every="1d",
+    closed="left",
+    include_boundaries=False,
+).agg(pl.len())
 
 
 gp_tom = (
-    df.sort("# Timestamp")
-    .group_by_dynamic(
+    df.group_by_dynamic(
         "# Timestamp",
         every="1w",
         closed="left",
         include_boundaries=False,
         group_by="Type of mobile",
-    )
-    .agg(pl.len())
+    ).agg(pl.len())
 ).sort("# Timestamp", "Type of mobile")
 
 
@@ -22,6 +22,13 @@ import polars as pl
 import tabulate
 from loguru import logger
 
+from sdsprint import metrics, storage, vessels
+from sdsprint.cli import write_profile_option, write_profiles_option
+from sdsprint.ingest import dedup_keys, proc_ais, proc_zip, sink_csv
+from sdsprint.resampling import final_products, rs_df, specs
+from sdsprint.watch import Watcher
+from sdsprint.watch import outputs as watch_outputs
+
 KU_ID = os.getenv("KUID")
 
 fp_ais = Path(f"/home/{KU_ID}/main-compute/ais-proc")
@@ -58,72 +65,16 @@ years = [
     "2025",
 ]
 
-cats = [
-    "IMO",  # IMO number of the vessel
-    "Callsign",  # Callsign of the vessel
-    "Name",  # Name of the vessel
-    "Destination",  # Destination of the vessel
-]
-nums = [
-    "ROT",
-    "Heading",
-    "SOG",
-    "COG",
-    "A",
-    "B",
-    "C",
-    "D",
-    "Width",
-    "Length",
-    "Draught",
-]
-
-
-def proc_ais(df: pl.DataFrame):
-    return df.with_columns(
-        pl.col("# Timestamp").str.to_datetime(
-            # format="%Y-%m-%d %H:%M:%S"
-            format="%d/%m/%Y %H:%M:%S"
-        ),
-        pl.col("ETA").str.to_datetime(format="%d/%m/%Y %H:%M:%S"),
-    ).with_columns(
-        pl.col(nums).cast(pl.Float64),
-        #  NOTE: If categorical we'll get some problems when concatenating
-        pl.col(cats).cast(pl.Utf8),
-        pl.col("MMSI").cast(pl.Utf8),
-    )
 
-
-def sink_csv(csv_path: Path, pq_path: Path):
-    pl.scan_csv(csv_path).sink_parquet(pq_path)
-    logger.info(f"Sinked {csv_path} to {pq_path}")
-
-
-def proc_zip(zip_path: Path, output_dir: Path):
-    """
-    Extracts the CSV files from a ZIP archive and sinks them as Parquet files.
-    """
-    with zipfile.ZipFile(zip_path, "r") as z:
-        names = z.namelist()
-        logger.info(f"Extracting {len(names)} files from {zip_path}")
-        for filename in names:
-            if filename.endswith(".csv"):
-                csv_out = Path.joinpath(output_dir, filename)
-                pqfile = csv_out.with_suffix(".parquet")
-                if pqfile.exists():
-                    logger.info(f"File {pqfile} already exists")
-                    continue
-                logger.info(f"Extracting {filename}...")
-                z.extract(filename, output_dir)
-                logger.info(f"Extracted {filename} to {output_dir}")
-                sink_csv(csv_out, pqfile)
-                csv_out.unlink()
-                logger.info(f"Deleted {filename}")
-
-
-def extract_and_sink(zip_path: Path, output_dir: Path):
+def extract_and_sink(
+    zip_path: Path,
+    output_dir: Path,
+    keys: list[str] | None = None,
+    tolerant: bool = False,
+    profile: str = "default",
+):
     try:
-        proc_zip(zip_path, output_dir)
+        proc_zip(zip_path, output_dir, keys=keys, tolerant=tolerant, profile=profile)
     except zipfile.BadZipfile as ex:
         logger.info(f"Error: {ex}")
         error_file = fp_ais / "errors.csv"
@@ -149,26 +100,46 @@ def current_time():
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def proc_zip_files(zip_files: list[Path], out_dir: Path):
+def proc_zip_files(
+    zip_files: list[Path],
+    out_dir: Path,
+    keys: list[str] | None = None,
+    tolerant: bool = False,
+    profile: str = "default",
+):
     out_dir.mkdir(parents=True, exist_ok=True)
     for i, file in enumerate(zip_files):
         logger.info(f": Processing zip-file: {file.name}")
-        extract_and_sink(file, out_dir)
+        extract_and_sink(file, out_dir, keys=keys, tolerant=tolerant, profile=profile)
         logger.info(f"Done processing {file.name} ({i + 1}/{len(zip_files)})")
 
 
-def proc_zip_files_year(year: int):
+def proc_zip_files_year(
+    year: int,
+    keys: list[str] | None = None,
+    tolerant: bool = False,
+    profile: str = "default",
+):
     out_dir = fp_ais.joinpath("data", f"{year}")
     out_dir.mkdir(parents=True, exist_ok=True)
     zip_files = get_zip_files(f"{year}")
     print(f"Processing files for {year=}")
-    proc_zip_files(zip_files, out_dir)
+    proc_zip_files(zip_files, out_dir, keys=keys, tolerant=tolerant, profile=profile)
     logger.info(f"Done processing all files for {year}")
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--metrics",
+    "metrics_file",
+    default=fp_ais / "metrics.jsonl",
+    show_default=True,
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="JSON lines file the stage metrics are appended to.",
+)
+@click.option("--profile", is_flag=True, help="Add polars query profiles.")
+def cli(metrics_file: Path, profile: bool):
+    metrics.configure(metrics_file, profile=profile)
 
 
 @cli.command()
@@ -199,13 +170,42 @@ def inspect_sizes():
     print(tabulate.tabulate(tots, headers=["Year", "Size (GB)", "Zip size (GB)"]))
 
 
+dedup_option = click.option(
+    "--dedup-key",
+    "keys",
+    multiple=True,
+    default=dedup_keys,
+    show_default=True,
+    help="Columns identifying duplicate messages (repeat for several).",
+)
+no_dedup_option = click.option(
+    "--no-dedup", is_flag=True, help="Keep duplicate messages."
+)
+tolerant_option = click.option(
+    "--tolerant",
+    is_flag=True,
+    help="Quarantine invalid lines to `quarantine/` instead of failing the file.",
+)
+
+
 @cli.command()
 @click.argument("year", type=int)
-def proc_year(year: int):
+@dedup_option
+@no_dedup_option
+@tolerant_option
+@write_profile_option
+def proc_year(
+    year: int, keys: tuple[str, ...], no_dedup: bool, tolerant: bool, write_profile: str
+):
     """
     Process all zip files for a given year.
     """
-    proc_zip_files_year(year)
+    proc_zip_files_year(
+        year,
+        keys=None if no_dedup else list(keys),
+        tolerant=tolerant,
+        profile=write_profile,
+    )
 
 
 @cli.command()
@@ -255,41 +255,55 @@ def proc_errdcsvs():
         f_csv = fp_csvs / file
         f_pq = fp_ais.joinpath("data", "2024") / file.with_suffix(".parquet")
         logger.info(f"Processing errd csv `{f_csv}`")
-        sink_csv(csv_path=f_csv, pq_path=f_pq)
-
-
-def resample_df(df: pl.DataFrame, every: str) -> pl.DataFrame:
-    return df.group_by_dynamic(
-        "# Timestamp",
-        every=every,
-        closed="left",
-        group_by="MMSI",
-        include_boundaries=False,
-    ).agg(pl.all().backward_fill().first())
-
-
-def rs_df(file: Path, every: str) -> pl.DataFrame:
-    """Resample dataframe by backwards-filling nans.
-
-    The first observation is kept for each group (id, time).
+        sink_csv(csv_path=f_csv, pq_path=f_pq, keys=dedup_keys)
+
+
+def resample_files(
+    files: list[Path],
+    every: str,
+    fp_out: Path,
+    spec: str = "bfill",
+    memory_budget: int | None = None,
+    split: str = "mmsi",
+    profile: str = "default",
+    split_static: bool = False,
+):
     """
-    return (
-        pl.scan_parquet(file)
-        .pipe(proc_ais)
-        .pipe(resample_df, every=every)
-        # collect
-        .collect()
-    )
-
+    Resample daily files to `fp_out`.
 
-def resample_files(files: list[Path], every: str, fp_out: Path):
+    With `split_static` the static fields are written to a daily vessel table
+    in `fp_out / "vessels"` and only the positions are resampled, to
+    `{stem}-{every}-pos.parquet`.
+    """
+    suffix = "-pos" if split_static else ""
     for f in files:
         print(f"Processing {f}")
         stem = f.stem
-        file_out = fp_out / f"{stem}-{every}.parquet"
-        try:  # Just write it directly to avoid memory issues
+        file_out = fp_out / f"{stem}-{every}{suffix}.parquet"
+        try:
+            f_dim = fp_out / "vessels" / f"{stem}.parquet"
+            if split_static and not f_dim.exists():
+                f_dim.parent.mkdir(exist_ok=True)
+                with metrics.stage("split", file=f.name, paths_out=[f_dim]) as rec:
+                    dim = vessels.vessel_dim(pl.scan_parquet(f).pipe(proc_ais))
+                    dim = dim.collect()
+                    storage.write_parquet(
+                        dim, f_dim, sorted_by=["MMSI", "valid_from"], profile=profile
+                    )
+                    rec["rows_out"] = dim.height
             if not file_out.exists():
-                rs_df(f, every=every).write_parquet(file_out)
+                with metrics.stage("resample", file=f.name, paths_in=[f]) as rec:
+                    df = rs_df(
+                        f,
+                        every=every,
+                        spec=specs[spec],
+                        memory_budget=memory_budget,
+                        split=split,
+                        split_static=split_static,
+                    )
+                    rec["rows_out"] = df.height
+                with metrics.stage("write", file=file_out.name, paths_out=[file_out]):
+                    storage.write_parquet(df, file_out, profile=profile)
             else:
                 print(f"File {file_out} already exists")
         except Exception as ex:
@@ -299,9 +313,45 @@ def resample_files(files: list[Path], every: str, fp_out: Path):
             logger.info(f"Done processing {f} {every=} to {file_out}")
 
 
+spec_option = click.option(
+    "--spec",
+    type=click.Choice(list(specs)),
+    default="bfill",
+    show_default=True,
+    help="Per-column aggregation spec; see `sdsprint.resampling`.",
+)
+
+
 @cli.command()
 @click.argument("year", type=str)
-def resample_year(year: str):
+@spec_option
+@click.option(
+    "--memory-budget",
+    type=int,
+    default=None,
+    help="Memory budget in MB; larger days are resampled in chunks.",
+)
+@click.option(
+    "--split",
+    type=click.Choice(["mmsi", "time"]),
+    default="mmsi",
+    show_default=True,
+    help="Split chunks by MMSI hash bucket or by time windows.",
+)
+@click.option(
+    "--split-static",
+    is_flag=True,
+    help="Write daily vessel tables and resample the positions only.",
+)
+@write_profile_option
+def resample_year(
+    year: str,
+    spec: str,
+    memory_budget: int | None,
+    split: str,
+    split_static: bool,
+    write_profile: str,
+):
     """
     Resample data to 15m intervals for a given year.
     Later on we resample to 30m and 1h.
@@ -315,7 +365,16 @@ def resample_year(year: str):
 
     files = sorted(fp_pq.glob("aisdk*.parquet"), key=lambda f: f.name)
     logger.info(f"Processing {len(files)} files from {fp_pq}; {year=}")
-    resample_files(files, every="15m", fp_out=fp_out)
+    resample_files(
+        files,
+        every="15m",
+        fp_out=fp_out,
+        spec=spec,
+        memory_budget=memory_budget * 1024**2 if memory_budget else None,
+        split=split,
+        profile=write_profile,
+        split_static=split_static,
+    )
     logger.info(f"Done processing all files for {year=} for {every=}")
 
 
@@ -330,28 +389,89 @@ def rs_extra():
 
 @cli.command()
 @click.argument("year", type=str)
-def resample_final(year: str):
+@click.option(
+    "--split-static",
+    is_flag=True,
+    help="Write a vessel table and narrow position products.",
+)
+@spec_option
+@write_profiles_option(["15m", "30m", "1h", "vessels"])
+def resample_final(year: str, split_static: bool, spec: str, profiles: dict):
     """
     Resample all data for a given year into 15m, 30m and 1h intervals.
     These are the datasets provided for the data sprint.
+
+    With `--split-static` the products are built from the position files and
+    daily vessel tables of `resample-year --split-static`: the static/voyage
+    fields are written once to `aisdk-{year}-vessels.parquet` and only the
+    narrow position columns are resampled; join back with
+    `sdsprint.vessels.join_static`.
+
+    E.g. `--write-profile archive --write-profile 1h=hot` writes the 1h
+    product for fast reads and the others as small as possible.
     """
     fp_dsprint = fp_ais.joinpath("data", "proc", "data-sprint")
     fp_dsprint.mkdir(parents=True, exist_ok=True)
     fp = fp_ais.joinpath("data", "proc", year)
 
+    suffix = "-pos" if split_static else ""
+    files = sorted(fp.glob(f"*-15m{suffix}.parquet"), key=lambda f: f.name)
     logger.info(f"Loading all files for {year}")
-    df = pl.read_parquet([f for f in fp.glob("*.parquet")])
-    logger.info(f"Loaded all files; {df.shape[0]} rows in total.")
-
-    df30m = df.sort("# Timestamp", "MMSI").pipe(resample_df, every="30m")
-    df1h = df30m.pipe(resample_df, every="1h")
+    with metrics.stage("load", file=year, paths_in=files) as rec:
+        days = [storage.scan(f, ensure_sorted=True).collect() for f in files]
+        rec["rows_out"] = sum(d.height for d in days)
+    logger.info(f"Loaded all files; {rec['rows_out']} rows in total.")
+
+    if split_static:
+        f_dim = fp_dsprint.joinpath(f"aisdk-{year}-vessels.parquet")
+        dims = sorted(fp.joinpath("vessels").glob("*.parquet"))
+        with metrics.stage("split", file=year, paths_in=dims, paths_out=[f_dim]) as rec:
+            dim = vessels.merge_dims([pl.scan_parquet(f) for f in dims]).collect()
+            storage.write_parquet(
+                dim,
+                f_dim,
+                sorted_by=["MMSI", "valid_from"],
+                profile=profiles["vessels"],
+            )
+            rec["rows_out"] = dim.height
+        logger.info(f"Wrote {dim.shape[0]} vessel versions for {year}")
+
+    products = final_products(
+        days,
+        fp_dsprint,
+        f"aisdk-{year}",
+        spec=specs[spec],
+        profiles=profiles,
+        suffix=suffix,
+    )
+    print(*(d.shape for d in products.values()), sep="\n")
+    logger.info(f"Done resampling {year}")
 
-    df.write_parquet(fp_dsprint.joinpath(f"aisdk-{year}-15m.parquet"))
-    df30m.write_parquet(fp_dsprint.joinpath(f"aisdk-{year}-30m.parquet"))
-    df1h.write_parquet(fp_dsprint.joinpath(f"aisdk-{year}-1h.parquet"))
 
-    print(df.shape, df30m.shape, df1h.shape, sep="\n")
-    logger.info(f"Done resampling {year}")
+@cli.command()
+@click.option("--workers", default=2, show_default=True)
+@click.option("--interval", default=300.0, show_default=True, help="Seconds.")
+@spec_option
+@click.option(
+    "--tolerant/--strict",
+    default=True,
+    show_default=True,
+    help="Quarantine invalid lines, or fail the day on the first one.",
+)
+@write_profiles_option(watch_outputs)
+def watch(workers: int, interval: float, spec: str, tolerant: bool, profiles: dict):
+    """
+    Ingest and resample new zip files in AIS_DK as they land; the monthly
+    products are written to `data/watch` and updated after each new day.
+    """
+    Watcher(
+        fp_sdir,
+        fp_ais.joinpath("data", "watch"),
+        max_workers=workers,
+        spec=specs[spec],
+        tolerant=tolerant,
+        profiles=profiles,
+    ).run(interval=interval)
 
 
 @cli.command()
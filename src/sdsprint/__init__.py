@@ -0,0 +1,4 @@
+def main():
+    from sdsprint.cli import cli
+
+    cli()
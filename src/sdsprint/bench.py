@@ -0,0 +1,257 @@
+"""
+Benchmarks of the pipeline stages on synthetic data.
+
+Each run generates a deterministic synthetic dataset (`sdsprint.synth`), times
+every stage and appends one JSON line per stage to a results file. `compare`
+shows the latest run next to the previous run at the same scale so
+regressions show up between runs.
+
+`profiles` compares the parquet write profiles (`storage.profiles`) on a
+sample day: file size, write time and scan times.
+"""
+
+import json
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+import pyarrow.parquet as pq
+import tabulate
+
+from sdsprint import ingest, resampling, storage, synth, utils
+
+
+def git_commit() -> str | None:
+    try:
+        res = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return res.stdout.strip()
+
+
+def timeit(
+    fn: Callable, repeat: int, setup: Callable | None = None
+) -> tuple[float, object]:
+    """Fastest of `repeat` runs in seconds and the result of the last run.
+
+    `setup` is run once before and not timed.
+    """
+    if setup is not None:
+        setup()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), res
+
+
+def n_rows(res) -> int | None:
+    if isinstance(res, tuple):
+        res = res[-1]
+    if isinstance(res, list):
+        return sum(n_rows(r) for r in res)
+    return getattr(res, "shape", (None,))[0]
+
+
+Stage = tuple[Callable, int | None, Callable | None]
+
+
+def stages(wd: Path, raw: pl.DataFrame) -> dict[str, Stage]:
+    """Stage name -> (function, rows in, untimed setup).
+
+    Stages depend on earlier ones; their inputs are materialized in the setup.
+    """
+    f_csv = wd / "aisdk-2024-01-01.csv"
+    f_raw = wd / "aisdk-2024-01-01.parquet"
+    f_1h = wd / "aisdk-2024-1h.parquet"
+    synth.to_csv(raw, f_csv)
+    state = {}
+
+    def sink():
+        f_raw.unlink(missing_ok=True)
+        return ingest.sink_csv(f_csv, f_raw, keys=ingest.dedup_keys)
+
+    def proc():
+        return pl.read_parquet(f_raw).pipe(ingest.proc_ais)
+
+    def proc_input():
+        state["proc"] = proc()
+
+    def resample():
+        state["15m"] = state["proc"].pipe(resampling.resample_df, every="15m")
+        return state["15m"]
+
+    def split_days():
+        # As written by resample-year: one sorted 15m file per day
+        state["days"] = [
+            d.sort("# Timestamp", "MMSI")
+            for _, d in state["15m"].group_by(
+                pl.col("# Timestamp").dt.date(), maintain_order=True
+            )
+        ]
+
+    def final():
+        products = resampling.final_products(state["days"], wd, "aisdk-2024")
+        return products["1h"]
+
+    def eagle():
+        return utils.read_eagle(str(f_1h))
+
+    def gdf():
+        return utils.to_gdf(utils.read_ships(str(f_1h)))
+
+    def plot():
+        if not Path(utils.fp_dk_shape).exists():
+            raise FileNotFoundError(utils.fp_dk_shape)
+
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        fig, _ = utils.plot_activity(utils.read_ships(str(f_1h)))
+        plt.close(fig)
+        return fig
+
+    return {
+        "sink_csv": (sink, raw.height, None),
+        "proc_ais": (proc, raw.height, None),
+        "resample_df": (resample, raw.height, proc_input),
+        "resample_final": (final, raw.height, split_days),
+        "read_eagle": (eagle, None, None),
+        "to_gdf": (gdf, None, None),
+        "plot_activity": (plot, None, None),
+    }
+
+
+def run(
+    out: Path,
+    n_vessels: int = 200,
+    days: int = 2,
+    rate: float = 60.0,
+    repeat: int = 3,
+    seed: int = 0,
+) -> list[dict]:
+    """Time all stages and append the results to `out` (JSON lines)."""
+    scale = {"vessels": n_vessels, "days": days, "rate": rate, "seed": seed}
+    raw = synth.generate(n_vessels, days=days, rate=rate, seed=seed)
+    meta = {
+        "run": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        **scale,
+    }
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for stage, (fn, rows_in, setup) in stages(Path(tmp), raw).items():
+            try:
+                seconds, res = timeit(fn, repeat, setup)
+            except FileNotFoundError as ex:  # E.g. shapefiles not downloaded
+                print(f"Skipping {stage}: {ex}")
+                continue
+            records.append(
+                {
+                    **meta,
+                    "stage": stage,
+                    "seconds": seconds,
+                    "rows_in": rows_in,
+                    "rows_out": n_rows(res),
+                }
+            )
+            print(f"{stage}: {seconds:.3f}s")
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "a") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+    return records
+
+
+def compare(out: Path, tolerance: float = 0.1) -> pl.DataFrame:
+    """Latest run vs the previous run at the same scale, per stage.
+
+    Stages more than `tolerance` slower are flagged as regressions.
+    """
+    res = pl.read_ndjson(out)
+    scale = ["vessels", "days", "rate", "seed"]
+    latest = res.filter(pl.col("run").eq(pl.col("run").max()))
+    runs = (
+        res.join(latest.select(scale).unique(), on=scale)
+        .select("run")
+        .unique()
+        .sort("run")["run"]
+    )
+    if runs.len() < 2:
+        previous = latest.head(0)
+    else:
+        previous = res.filter(pl.col("run").eq(runs[-2])).join(
+            latest.select(scale).unique(), on=scale
+        )
+    table = (
+        latest.select("stage", "seconds", "commit")
+        .join(
+            previous.select("stage", pl.col("seconds").alias("previous")),
+            on="stage",
+            how="left",
+        )
+        .with_columns(pl.col("seconds").truediv("previous").alias("ratio"))
+        .with_columns(pl.col("ratio").gt(1 + tolerance).alias("regression"))
+    )
+    print(tabulate.tabulate(table.rows(), headers=table.columns, floatfmt=".3f"))
+    return table
+
+
+def profiles(
+    sample: Path | None = None,
+    n_vessels: int = 200,
+    rate: float = 60.0,
+    repeat: int = 3,
+    seed: int = 0,
+) -> pl.DataFrame:
+    """Size, write time and scan times of each write profile on a day.
+
+    The day is read from `sample` (a raw day or a product) or generated. The
+    `scan` reads the whole file, the `window` scan one hour of it (row groups
+    outside the hour are skipped from their statistics).
+    """
+    if sample is None:
+        df = synth.generate(n_vessels, days=1, rate=rate, seed=seed)
+    else:
+        df = storage.scan(sample, hot=False).collect()
+    df = df.sort(storage.sort_order)  # Time the encoding, not the sort
+    ts = pl.col("# Timestamp")
+    lo = df.select(ts.min() + (ts.max() - ts.min()) / 2).item()
+    lo = pl.Series([lo]).dt.truncate("1h").item()
+    hour = ts.is_between(lo, pl.Series([lo]).dt.offset_by("1h").item(), "left")
+
+    def measure(name: str, f: Path) -> dict:
+        write, _ = timeit(lambda: storage.write_parquet(df, f, profile=name), repeat)
+        scan, _ = timeit(lambda: storage.scan(f, hot=False).collect(), repeat)
+        window, res = timeit(
+            lambda: storage.scan(f, hot=False).filter(hour).collect(), repeat
+        )
+        return {
+            "profile": name,
+            "mb": f.stat().st_size / 1024**2,
+            "row_groups": pq.ParquetFile(f).num_row_groups,
+            "write": write,
+            "scan": scan,
+            "window": window,
+            "window_rows": res.height,
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [measure(p, Path(tmp) / f"{p}.parquet") for p in storage.profiles]
+    table = pl.DataFrame(rows)
+    print(f"{df.height} rows, {df.width} columns; seconds (fastest of {repeat}):")
+    print(tabulate.tabulate(table.rows(), headers=table.columns, floatfmt=".3f"))
+    return table
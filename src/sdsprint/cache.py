@@ -0,0 +1,189 @@
+"""
+Hot cache of products as Arrow IPC files.
+
+Reading a parquet product decompresses and decodes it every time. Products
+(or column subsets of them) that are read over and over can be materialized
+as uncompressed or LZ4 Arrow IPC files in `cache_dir` ($SDSPRINT_CACHE, by
+default the user cache directory):
+
+    cache.materialize("data/aisdk-2024-1h.parquet")
+    cache.materialize("data/aisdk-2024-1h.parquet", columns=["MMSI", ...])
+
+Readers open them memory-mapped, so an uncompressed copy is read without
+copying and repeated reads hit the page cache. `storage.scan` uses a full
+copy of a product transparently; `scan` also uses column subsets. A copy is
+only used while the parquet file is unchanged (same size and mtime). Copies
+are keyed by the resolved path of the product, so products with the same
+name in different directories do not collide.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Literal
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import ipc
+
+from sdsprint import metadata
+from sdsprint.metadata import read_schema
+
+cache_dir = Path(
+    os.environ.get("SDSPRINT_CACHE")
+    or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "sdsprint"
+).resolve()
+Compression = Literal["uncompressed", "lz4"]
+source_key = b"sdsprint.source"
+
+
+def source_stat(file: Path | str) -> dict:
+    st = os.stat(file)
+    return {
+        "file": str(Path(file).resolve()),
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+    }
+
+
+def digest(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()[:8]
+
+
+def cache_key(file: Path | str) -> str:
+    """`<stem>-<hash of the resolved path>`; the prefix of all copies of `file`."""
+    return f"{Path(file).stem}-{digest(str(Path(file).resolve()))}"
+
+
+def cache_path(
+    file: Path | str,
+    columns: list[str] | None = None,
+    out_dir: Path | None = None,
+) -> Path:
+    """`<key>.arrow` for a full copy, `<key>-<hash>.arrow` for a subset."""
+    name = cache_key(file)
+    if columns:
+        name += "-" + digest(",".join(sorted(columns)))
+    return (out_dir or cache_dir) / f"{name}.arrow"
+
+
+def materialize(
+    file: Path | str,
+    columns: list[str] | None = None,
+    compression: Compression = "uncompressed",
+    out_dir: Path | None = None,
+) -> Path:
+    """Copy a parquet product (or `columns` of it) to the cache.
+
+    The copy is written row group by row group, so the product never needs
+    to fit in memory. Its metadata keeps the recorded sort order.
+    """
+    pf = pq.ParquetFile(file)
+    schema = pf.schema_arrow
+    meta = {**(schema.metadata or {}), source_key: json.dumps(source_stat(file))}
+    if columns:
+        schema = pa.schema([schema.field(c) for c in columns])
+        # The sort order holds for its leading columns in the subset
+        order = metadata.file_sorted_by(file)
+        order = order[
+            : next((i for i, c in enumerate(order) if c not in columns), None)
+        ]
+        meta[metadata.meta_key] = json.dumps(order)
+    schema = schema.with_metadata(meta)
+    out = cache_path(file, columns, out_dir)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".tmp")
+    options = ipc.IpcWriteOptions(
+        compression=None if compression == "uncompressed" else compression
+    )
+    with ipc.new_file(tmp, schema, options=options) as writer:
+        for batch in pf.iter_batches(columns=columns):
+            writer.write_batch(batch)
+    tmp.replace(out)  # Readers never see a partial file
+    return out
+
+
+def source(file: Path | str) -> dict | None:
+    """Source parquet file of a cached copy as recorded at materialization."""
+    meta = read_schema(file).metadata or {}
+    return json.loads(meta[source_key]) if source_key in meta else None
+
+
+def is_fresh(cached: Path, file: Path | str) -> bool:
+    src = source(cached)
+    return src is not None and src == source_stat(file)
+
+
+def lookup(
+    file: Path | str,
+    columns: list[str] | None = None,
+    out_dir: Path | None = None,
+) -> Path | None:
+    """Smallest fresh cached copy of `file` holding all `columns`.
+
+    Without `columns` only a full copy qualifies.
+    """
+    if columns is None:
+        full = cache_path(file, out_dir=out_dir)
+        return full if full.exists() and is_fresh(full, file) else None
+    key = cache_key(file)
+    copies = [f"{key}.arrow", f"{key}-????????.arrow"]  # Full copy and subsets
+    hits = [
+        f
+        for pattern in copies
+        for f in sorted((out_dir or cache_dir).glob(pattern))
+        if set(columns) <= set(read_schema(f).names) and is_fresh(f, file)
+    ]
+    return min(hits, key=lambda f: f.stat().st_size) if hits else None
+
+
+def scan(
+    file: Path | str,
+    columns: list[str] | None = None,
+    out_dir: Path | None = None,
+) -> pl.LazyFrame:
+    """`columns` of a product; memory-mapped from the cache if available."""
+    hit = lookup(file, columns, out_dir)
+    lf = metadata.scan(hit if hit else file)
+    return lf.select(columns) if columns else lf
+
+
+def entries(out_dir: Path | None = None) -> pl.DataFrame:
+    """Cached copies with their source, size and freshness."""
+    rows = []
+    for f in sorted((out_dir or cache_dir).glob("*.arrow")):
+        src = source(f) or {}
+        stale = (
+            not src or not Path(src["file"]).exists() or not is_fresh(f, src["file"])
+        )
+        rows.append(
+            {
+                "file": str(f),
+                "source": src.get("file"),
+                "columns": len(read_schema(f).names),
+                "mb": f.stat().st_size / 1024**2,
+                "stale": stale,
+            }
+        )
+    return pl.DataFrame(
+        rows,
+        schema={
+            "file": pl.String,
+            "source": pl.String,
+            "columns": pl.Int64,
+            "mb": pl.Float64,
+            "stale": pl.Boolean,
+        },
+    )
+
+
+def clear(out_dir: Path | None = None, stale_only: bool = False) -> list[Path]:
+    """Remove cached copies (only stale ones if `stale_only`)."""
+    removed = []
+    for row in entries(out_dir).iter_rows(named=True):
+        if row["stale"] or not stale_only:
+            Path(row["file"]).unlink()
+            removed.append(Path(row["file"]))
+    return removed
@@ -0,0 +1,737 @@
+"""
+Command line interface of `sdsprint`.
+
+Only `click` is imported at module load; polars, geopandas and matplotlib are
+imported in the commands that need them so data-only commands start fast.
+"""
+
+from pathlib import Path
+
+import click
+
+
+def emit(df, out: Path | None):
+    """Print `df` or write it to parquet if `out` is given."""
+    if out is None:
+        print(df)
+    else:
+        df.write_parquet(out)
+        print(f"Wrote {df.shape[0]} rows to {out}")
+
+
+files_argument = click.argument(
+    "files", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path)
+)
+out_option = click.option(
+    "--out", type=click.Path(path_type=Path), help="Write result to parquet."
+)
+vessel_table_option = click.option(
+    "--vessel-table",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Vessel table to join to position-only (-pos) products.",
+)
+write_profiles = ["default", "archive", "hot"]  # `storage.profiles`
+write_profile_option = click.option(
+    "--write-profile",
+    type=click.Choice(write_profiles),
+    default="default",
+    show_default=True,
+    help="Parquet write profile; compare them with `sdsprint bench profiles`.",
+)
+
+
+def write_profiles_option(outputs: list[str]):
+    """`--write-profile [OUTPUT=]PROFILE` for commands with several outputs."""
+
+    def callback(ctx, param, values):
+        from sdsprint import storage
+
+        try:
+            return storage.profile_map(list(values), outputs)
+        except ValueError as ex:
+            raise click.BadParameter(str(ex)) from ex
+
+    return click.option(
+        "--write-profile",
+        "profiles",
+        multiple=True,
+        callback=callback,
+        help="Write profile of all outputs or of one as OUTPUT=PROFILE, with "
+        f"OUTPUT one of {', '.join(outputs)} (repeat for several).",
+    )
+
+
+watch_outputs = ["raw", "parts", "products"]  # `watch.outputs`
+
+
+@click.group()
+def cli():
+    """SoDas Data Sprint AIS tools."""
+
+
+@cli.group()
+def query():
+    """Query the parquet products."""
+
+
+@query.command()
+@files_argument
+@vessel_table_option
+def eagle(files: tuple[Path, ...], vessel_table: Path | None):
+    """Months in which Eagle is found."""
+    import polars as pl
+
+    from sdsprint import utils
+
+    yms = (
+        utils.read_eagle(list(files), vessel_table=vessel_table)
+        .select(pl.col("# Timestamp").dt.strftime("%Y-%m").unique().sort())
+        .to_series()
+        .to_list()
+    )
+    print("Eagle found in the given month years:")
+    for ym in yms:
+        print(f"  - {ym}")
+
+
+@query.command()
+@click.argument("mmsi", type=str)
+@files_argument
+@out_option
+def vessel(mmsi: str, files: tuple[Path, ...], out: Path | None):
+    """All rows of a vessel."""
+    import polars as pl
+
+    from sdsprint import storage
+
+    df = storage.scan(list(files)).filter(pl.col("MMSI").eq(mmsi)).collect()
+    emit(df, out)
+
+
+@query.command()
+@files_argument
+@click.option("--every", default="1d", show_default=True, help="Window size.")
+@click.option("--by", default=None, help="Column to count by.")
+@out_option
+def counts(files: tuple[Path, ...], every: str, by: str | None, out: Path | None):
+    """Number of records per time window."""
+    import polars as pl
+
+    from sdsprint import storage
+
+    df = (
+        storage.scan(list(files), ensure_sorted=True)
+        .group_by_dynamic(
+            "# Timestamp",
+            every=every,
+            closed="left",
+            include_boundaries=False,
+            group_by=by,
+        )
+        .agg(pl.len())
+        .collect()
+    )
+    emit(df, out)
+
+
+@query.command()
+@files_argument
+@click.option("--every", default="1h", show_default=True, help="Product window.")
+@click.option("--radius", default=500.0, show_default=True, help="Meters.")
+@click.option("--workers", default=4, show_default=True)
+@out_option
+def encounters(
+    files: tuple[Path, ...],
+    every: str,
+    radius: float,
+    workers: int,
+    out: Path | None,
+):
+    """Vessels within `radius` of each other in the same window."""
+    from sdsprint import encounters as enc
+
+    df = enc.encounters(list(files), every=every, radius=radius, max_workers=workers)
+    emit(df, out)
+
+
+@query.command()
+@files_argument
+@click.option("--max-sog", default=0.5, show_default=True, help="Knots.")
+@click.option("--max-gap", default="2h", show_default=True)
+@click.option("--min-duration", default="30m", show_default=True)
+@click.option("--max-dispersion", default=1_000.0, show_default=True, help="Meters.")
+@click.option("--partition", default="7d", show_default=True)
+@click.option("--workers", default=4, show_default=True)
+@out_option
+def stops(
+    files: tuple[Path, ...],
+    max_sog: float,
+    max_gap: str,
+    min_duration: str,
+    max_dispersion: float,
+    partition: str,
+    workers: int,
+    out: Path | None,
+):
+    """Stop episodes (port calls, anchoring) of all vessels."""
+    from sdsprint import stops
+
+    df = stops.stops(
+        list(files),
+        max_sog=max_sog,
+        max_gap=max_gap,
+        min_duration=min_duration,
+        max_dispersion=max_dispersion,
+        partition=partition,
+        max_workers=workers,
+    )
+    emit(df, out)
+
+
+@query.command()
+@files_argument
+@click.option("--max-gap", default="1h", show_default=True)
+@click.option("--max-speed", default=50.0, show_default=True, help="Knots.")
+@click.option("--max-accel", default=0.5, show_default=True, help="m/s^2.")
+@click.option("--sog-tol", default=5.0, show_default=True, help="Knots.")
+@click.option("--cog-tol", default=45.0, show_default=True, help="Degrees.")
+@click.option("--suspect", is_flag=True, help="Only flagged positions.")
+@click.option("--partition", default="7d", show_default=True)
+@click.option("--workers", default=4, show_default=True)
+@out_option
+def kinematics(
+    files: tuple[Path, ...],
+    max_gap: str,
+    max_speed: float,
+    max_accel: float,
+    sog_tol: float,
+    cog_tol: float,
+    suspect: bool,
+    partition: str,
+    workers: int,
+    out: Path | None,
+):
+    """Implied speed, course and acceleration with consistency flags."""
+    import polars as pl
+
+    from sdsprint import kinematics as kin
+
+    df = kin.kinematics(
+        list(files),
+        max_gap=max_gap,
+        partition=partition,
+        max_workers=workers,
+        max_speed=max_speed,
+        max_accel=max_accel,
+        sog_tol=sog_tol,
+        cog_tol=cog_tol,
+    )
+    if suspect:
+        df = df.filter(pl.col("suspect"))
+    emit(df, out)
+
+
+@cli.command()
+@click.argument(
+    "zips", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path)
+)
+@click.option(
+    "--out",
+    required=True,
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Output directory for the daily parquet files.",
+)
+@click.option(
+    "--dedup-key",
+    "keys",
+    multiple=True,
+    help="Columns identifying duplicate messages (repeat for several); "
+    "defaults to MMSI, # Timestamp, Latitude and Longitude.",
+)
+@click.option("--no-dedup", is_flag=True, help="Keep duplicate messages.")
+@click.option(
+    "--tolerant",
+    is_flag=True,
+    help="Quarantine invalid lines to OUT/quarantine instead of failing the file.",
+)
+@click.option(
+    "--metrics",
+    "metrics_file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Append per-stage metrics to this JSON lines file.",
+)
+@write_profile_option
+def ingest(
+    zips: tuple[Path, ...],
+    out: Path,
+    keys: tuple[str, ...],
+    no_dedup: bool,
+    tolerant: bool,
+    metrics_file: Path | None,
+    write_profile: str,
+):
+    """Extract AIS zip files and sink the csv files to parquet."""
+    from sdsprint import ingest, metrics
+
+    metrics.configure(metrics_file)
+
+    keys = None if no_dedup else list(keys) or ingest.dedup_keys
+    out.mkdir(parents=True, exist_ok=True)
+    for f in zips:
+        ingest.proc_zip(f, out, keys=keys, tolerant=tolerant, profile=write_profile)
+
+
+@cli.command()
+@click.argument("src", type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option(
+    "--out",
+    required=True,
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Output directory of the daily parts and monthly products.",
+)
+@click.option("--workers", default=2, show_default=True, help="Days in parallel.")
+@click.option("--interval", default=60.0, show_default=True, help="Seconds.")
+@click.option(
+    "--settle",
+    default=10.0,
+    show_default=True,
+    help="Seconds a zip file must be unmodified before it is processed.",
+)
+@click.option("--memory-budget", type=int, default=None, help="MB per day.")
+@click.option(
+    "--tolerant/--strict",
+    default=True,
+    show_default=True,
+    help="Quarantine invalid lines, or fail the day on the first one.",
+)
+@click.option("--once", is_flag=True, help="Process pending files and exit.")
+@write_profiles_option(watch_outputs)
+def watch(
+    src: Path,
+    out: Path,
+    workers: int,
+    interval: float,
+    settle: float,
+    memory_budget: int | None,
+    tolerant: bool,
+    once: bool,
+    profiles: dict,
+):
+    """Ingest and resample new zip files in SRC as they arrive."""
+    from sdsprint.watch import Watcher
+
+    w = Watcher(
+        src,
+        out,
+        max_workers=workers,
+        memory_budget=memory_budget * 1024**2 if memory_budget else None,
+        settle=settle,
+        tolerant=tolerant,
+        profiles=profiles,
+    )
+    if once:
+        w.poll()
+    else:
+        w.run(interval=interval)
+
+
+@cli.command()
+@files_argument
+@click.option("--out", required=True, type=click.Path(path_type=Path))
+@click.option(
+    "--kind",
+    type=click.Choice(["points", "tracks"]),
+    default="points",
+    show_default=True,
+)
+@click.option(
+    "--csr",
+    type=click.Choice(["EPSG:25832", "EPSG:25833"]),
+    default="EPSG:25832",
+    show_default=True,
+)
+@click.option("--every", default="1d", show_default=True, help="Track length.")
+@click.option("--start", type=click.DateTime(), default=None)
+@click.option("--end", type=click.DateTime(), default=None)
+@click.option("--columns", default=None, help="Comma-separated columns of points.")
+@click.option(
+    "--partition",
+    default="1d",
+    show_default=True,
+    help="Time partition of points held in memory at once.",
+)
+def export(
+    files: tuple[Path, ...],
+    out: Path,
+    kind: str,
+    csr: str,
+    every: str,
+    start,
+    end,
+    columns: str | None,
+    partition: str,
+):
+    """Positions or tracks as spatially sorted GeoParquet."""
+    from sdsprint import geoexport
+
+    n = geoexport.export(
+        list(files),
+        out,
+        kind=kind,
+        csr=csr,
+        every=every,
+        start=start,
+        end=end,
+        columns=columns.split(",") if columns else None,
+        partition=partition,
+    )
+    print(f"Wrote {n} {kind} to {out}")
+
+
+@cli.command()
+@files_argument
+@click.option("--out", required=True, type=click.Path(path_type=Path))
+@click.option("--every", default="1m", show_default=True, help="Resolution.")
+@click.option("--mmsi", "mmsis", multiple=True, help="Vessels; default all.")
+@click.option("--max-gap", default="2h", show_default=True, help="Longest gap filled.")
+@click.option(
+    "--method",
+    type=click.Choice(["linear", "great-circle"]),
+    default="linear",
+    show_default=True,
+)
+@click.option(
+    "--csr",
+    type=click.Choice(["EPSG:25832", "EPSG:25833"]),
+    default="EPSG:25832",
+    show_default=True,
+    help="Projection of linear interpolation.",
+)
+@click.option("--batch-size", default=1_000, show_default=True, help="Vessels.")
+@click.option("--workers", default=4, show_default=True)
+@write_profile_option
+def interpolate(
+    files: tuple[Path, ...],
+    out: Path,
+    every: str,
+    mmsis: tuple[str, ...],
+    max_gap: str,
+    method: str,
+    csr: str,
+    batch_size: int,
+    workers: int,
+    write_profile: str,
+):
+    """Regular-time tracks with gaps up to --max-gap interpolated."""
+    from sdsprint import interpolate as interp
+
+    n = interp.tracks(
+        list(files),
+        out,
+        every,
+        mmsis=list(mmsis) or None,
+        max_gap=max_gap,
+        method=method,
+        csr=csr,
+        batch_size=batch_size,
+        max_workers=workers,
+        profile=write_profile,
+    )
+    print(f"Wrote {n} rows to {out}")
+
+
+@cli.command()
+@files_argument
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8765, show_default=True)
+@click.option("--no-geometries", is_flag=True, help="Don't preload geometries.")
+def serve(files: tuple[Path, ...], host: str, port: int, no_geometries: bool):
+    """Serve the products from memory; see `sdsprint.serve`."""
+    from sdsprint import serve
+
+    serve.serve(list(files), host=host, port=port, geometries=not no_geometries)
+
+
+@cli.group()
+def cache():
+    """Hot cache of products as memory-mapped Arrow IPC; see `sdsprint.cache`."""
+
+
+cache_dir_option = click.option(
+    "--dir",
+    "out_dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Cache directory; defaults to $SDSPRINT_CACHE or ~/.cache/sdsprint.",
+)
+
+
+@cache.command("add")
+@files_argument
+@click.option("--columns", default=None, help="Comma-separated column subset.")
+@click.option(
+    "--compression",
+    type=click.Choice(["uncompressed", "lz4"]),
+    default="uncompressed",
+    show_default=True,
+)
+@cache_dir_option
+def cache_add(
+    files: tuple[Path, ...],
+    columns: str | None,
+    compression: str,
+    out_dir: Path | None,
+):
+    """Materialize products (or a column subset) in the cache."""
+    from sdsprint import cache
+
+    for f in files:
+        out = cache.materialize(
+            f,
+            columns=columns.split(",") if columns else None,
+            compression=compression,
+            out_dir=out_dir,
+        )
+        print(f"Cached {f} as {out}")
+
+
+@cache.command("list")
+@cache_dir_option
+def cache_list(out_dir: Path | None):
+    """Cached copies and whether they are stale."""
+    from sdsprint import cache
+
+    print(cache.entries(out_dir))
+
+
+@cache.command("clear")
+@cache_dir_option
+@click.option("--stale", is_flag=True, help="Only remove stale copies.")
+def cache_clear(out_dir: Path | None, stale: bool):
+    """Remove cached copies."""
+    from sdsprint import cache
+
+    for f in cache.clear(out_dir, stale_only=stale):
+        print(f"Removed {f}")
+
+
+@cli.group()
+def index():
+    """Nearest vessel index; see `sdsprint.knn`."""
+
+
+index_argument = click.argument(
+    "path", type=click.Path(exists=True, file_okay=False, path_type=Path)
+)
+point_options = [
+    click.option("--lat", type=float, required=True),
+    click.option("--lon", type=float, required=True),
+    click.option("--time", type=click.DateTime(), default=None),
+    click.option("--start", type=click.DateTime(), default=None),
+    click.option("--end", type=click.DateTime(), default=None),
+]
+
+
+def with_point_options(fn):
+    for option in reversed(point_options):
+        fn = option(fn)
+    return fn
+
+
+def check_time(time, start, end):
+    from sdsprint import knn
+
+    try:
+        knn.check_time(time, start, end)
+    except ValueError as ex:
+        raise click.UsageError("Give either --time or both --start and --end") from ex
+
+
+@index.command("build")
+@files_argument
+@click.option("--out", required=True, type=click.Path(path_type=Path))
+@click.option("--every", default="1h", show_default=True, help="Product window.")
+@click.option("--partition", default="1d", show_default=True)
+@click.option("--workers", default=4, show_default=True)
+def index_build(
+    files: tuple[Path, ...], out: Path, every: str, partition: str, workers: int
+):
+    """Build the index of a resampled product."""
+    from sdsprint import knn
+
+    knn.build(list(files), out, every=every, partition=partition, max_workers=workers)
+    print(f"Built index in {out}")
+
+
+@index.command("knn")
+@index_argument
+@with_point_options
+@click.option("--k", default=5, show_default=True)
+@out_option
+def index_knn(path: Path, lat, lon, time, start, end, k: int, out: Path | None):
+    """The K vessels closest to a point at --time or per window in a range."""
+    from sdsprint import knn
+
+    check_time(time, start, end)
+    emit(knn.Index(path).knn(lat, lon, time=time, start=start, end=end, k=k), out)
+
+
+@index.command("within")
+@index_argument
+@with_point_options
+@click.option("--radius", default=1_000.0, show_default=True, help="Meters.")
+@out_option
+def index_within(path: Path, lat, lon, time, start, end, radius, out: Path | None):
+    """Vessels within --radius of a point at --time or per window in a range."""
+    from sdsprint import knn
+
+    check_time(time, start, end)
+    idx = knn.Index(path)
+    emit(idx.within(lat, lon, radius, time=time, start=start, end=end), out)
+
+
+@cli.group()
+def bench():
+    """Benchmark the pipeline and the parquet write profiles."""
+
+
+results_option = click.option(
+    "--results",
+    default="results/bench.jsonl",
+    show_default=True,
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="JSON lines file the results are appended to.",
+)
+
+
+@bench.command("run")
+@click.option("--vessels", default=200, show_default=True)
+@click.option("--days", default=2, show_default=True)
+@click.option("--rate", default=60.0, show_default=True, help="Messages/hour.")
+@click.option("--repeat", default=3, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@results_option
+def bench_run(
+    vessels: int, days: int, rate: float, repeat: int, seed: int, results: Path
+):
+    """Time each stage and append the results."""
+    from sdsprint import bench
+
+    bench.run(
+        results, n_vessels=vessels, days=days, rate=rate, repeat=repeat, seed=seed
+    )
+    bench.compare(results)
+
+
+@bench.command("compare")
+@results_option
+@click.option("--tolerance", default=0.1, show_default=True)
+def bench_compare(results: Path, tolerance: float):
+    """Latest run vs the previous run at the same scale."""
+    from sdsprint import bench
+
+    bench.compare(results, tolerance=tolerance)
+
+
+@bench.command("profiles")
+@click.option(
+    "--sample",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Parquet file of a day; defaults to a synthetic day.",
+)
+@click.option("--vessels", default=200, show_default=True)
+@click.option("--rate", default=60.0, show_default=True, help="Messages/hour.")
+@click.option("--repeat", default=3, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@out_option
+def bench_profiles(
+    sample: Path | None,
+    vessels: int,
+    rate: float,
+    repeat: int,
+    seed: int,
+    out: Path | None,
+):
+    """Size, write time and scan time of the parquet write profiles."""
+    from sdsprint import bench
+
+    table = bench.profiles(
+        sample, n_vessels=vessels, rate=rate, repeat=repeat, seed=seed
+    )
+    if out is not None:
+        emit(table, out)
+
+
+@cli.group()
+def metrics():
+    """Per-stage metrics written by the pipeline scripts."""
+
+
+@metrics.command("summary")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--top", default=10, show_default=True, help="Slowest files shown.")
+def metrics_summary(file: Path, top: int):
+    """Totals per stage and the slowest files of a metrics file."""
+    import tabulate
+
+    from sdsprint import metrics
+
+    per_stage, slowest = metrics.summary(file, top=top)
+    print(
+        tabulate.tabulate(per_stage.rows(), headers=per_stage.columns, floatfmt=".2f")
+    )
+    print()
+    print(tabulate.tabulate(slowest.rows(), headers=slowest.columns, floatfmt=".2f"))
+
+
+@cli.group()
+def plot():
+    """Plot the parquet products."""
+
+
+@plot.command()
+@files_argument
+@click.option("--suffix", required=True, help="Suffix of figs/trace_eagle-*.png.")
+@click.option("--cables", is_flag=True, help="Add submarine cables.")
+@vessel_table_option
+def trace(
+    files: tuple[Path, ...], suffix: str, cables: bool, vessel_table: Path | None
+):
+    """Trace of Eagle."""
+    from sdsprint import utils
+
+    utils.plot_trace(
+        utils.read_eagle(list(files), vessel_table=vessel_table),
+        suffix=suffix,
+        cables=utils.get_cables() if cables else None,
+    )
+    print(f"Generated figs/trace_eagle-{suffix}.png")
+
+
+@plot.command()
+@files_argument
+@click.option("--every", default="1d", show_default=True, help="One obs per window.")
+@click.option("--out", required=True, type=click.Path(path_type=Path))
+@click.option("--title", default=None)
+def activity(files: tuple[Path, ...], every: str, out: Path, title: str | None):
+    """All vessel activity; first position per vessel and window."""
+    import polars as pl
+
+    from sdsprint import utils
+
+    ships = (
+        utils.read_ships(list(files))
+        .group_by_dynamic(
+            "# Timestamp",
+            every=every,
+            closed="both",
+            group_by="MMSI",
+            include_boundaries=False,
+        )
+        .agg(pl.all().first())
+    )
+    fig, ax = utils.plot_activity(ships)
+    if title:
+        ax.set(title=title)
+    fig.savefig(out, bbox_inches="tight")
+    print(f"Generated {out}")
@@ -0,0 +1,125 @@
+"""
+Vessel encounter (ship-to-ship rendezvous) detection.
+
+Positions of a resampled product are bucketed by time window and a spatial
+grid with cells at least `radius` wide, so close vessels are always in the
+same or a neighbouring cell. Only those pairs are compared. The work is split
+in time partitions which are processed in parallel, each in bounded memory;
+the close pairs are then merged into events across partitions.
+"""
+
+import math
+from pathlib import Path
+
+import polars as pl
+
+from sdsprint import storage
+from sdsprint.utils import earth_radius, haversine, map_partitions
+
+meters_per_degree = math.pi * earth_radius / 180
+neighbours = pl.DataFrame(
+    {
+        "dx": [dx for dx in (-1, 0, 1) for _ in range(3)],
+        "dy": [-1, 0, 1] * 3,
+    },
+    schema={"dx": pl.Int64, "dy": pl.Int64},
+)
+
+
+def grid(df: pl.DataFrame, radius: float) -> pl.DataFrame:
+    """Grid cell of each position; cells are at least `radius` meters wide."""
+    max_lat = df["Latitude"].abs().max() or 0.0
+    dlat = radius / meters_per_degree
+    dlon = dlat / max(math.cos(math.radians(max_lat)), 1e-6)
+    return df.with_columns(
+        pl.col("Longitude").truediv(dlon).floor().cast(pl.Int64).alias("cx"),
+        pl.col("Latitude").truediv(dlat).floor().cast(pl.Int64).alias("cy"),
+    )
+
+
+def close_pairs(df: pl.DataFrame, radius: float = 500.0) -> pl.DataFrame:
+    """Pairs of vessels within `radius` meters in the same time window.
+
+    `df` holds one position per (MMSI, `# Timestamp`) as in the resampled
+    products. Returns (MMSI_a, MMSI_b, `# Timestamp`, distance) with
+    MMSI_a < MMSI_b.
+    """
+    pos = (
+        df.select("MMSI", "# Timestamp", "Latitude", "Longitude")
+        .filter(
+            pl.col("Latitude").abs().le(90),
+            pl.col("Longitude").abs().le(180),
+        )
+        .pipe(grid, radius=radius)
+    )
+    left = pos.join(neighbours, how="cross").with_columns(
+        pl.col("cx").add(pl.col("dx")),
+        pl.col("cy").add(pl.col("dy")),
+    )
+    return (
+        left.join(pos, on=["# Timestamp", "cx", "cy"], suffix="_b")
+        .filter(pl.col("MMSI").lt(pl.col("MMSI_b")))
+        .with_columns(
+            haversine(
+                pl.col("Latitude"),
+                pl.col("Longitude"),
+                pl.col("Latitude_b"),
+                pl.col("Longitude_b"),
+            ).alias("distance")
+        )
+        .filter(pl.col("distance").le(radius))
+        .select(
+            pl.col("MMSI").alias("MMSI_a"),
+            "MMSI_b",
+            "# Timestamp",
+            "distance",
+        )
+    )
+
+
+def to_events(pairs: pl.DataFrame, every: str) -> pl.DataFrame:
+    """Merge close pairs in consecutive windows of size `every` into events.
+
+    `start` and `end` are the first and last window in which the vessels were
+    within the radius.
+    """
+    pair = ["MMSI_a", "MMSI_b"]
+    ts = pl.col("# Timestamp")
+    return (
+        pairs.sort(*pair, "# Timestamp")
+        .with_columns(
+            ts.gt(ts.shift().dt.offset_by(every))
+            .fill_null(True)
+            .cum_sum()
+            .over(pair)
+            .alias("event")
+        )
+        .group_by(*pair, "event")
+        .agg(
+            ts.min().alias("start"),
+            ts.max().alias("end"),
+            pl.col("distance").min().alias("min_distance"),
+            pl.len().alias("windows"),
+        )
+        .drop("event")
+        .sort("start", *pair)
+    )
+
+
+def encounters(
+    source: Path | str | list[Path] | list[str] | pl.LazyFrame,
+    every: str = "1h",
+    radius: float = 500.0,
+    partition: str = "1d",
+    max_workers: int = 4,
+) -> pl.DataFrame:
+    """Encounter events in a resampled product with windows of size `every`.
+
+    Partitions are processed in parallel by `utils.map_partitions`.
+    """
+    lf = source if isinstance(source, pl.LazyFrame) else storage.scan(source)
+    lf = lf.select("MMSI", "# Timestamp", "Latitude", "Longitude")
+    pairs = map_partitions(
+        lf, lambda df, _: close_pairs(df, radius=radius), partition, max_workers
+    )
+    return pl.concat(pairs).pipe(to_events, every=every)
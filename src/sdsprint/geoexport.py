@@ -0,0 +1,180 @@
+"""
+Export of positions and tracks as GeoParquet.
+
+Points (one per row) or tracks (one line per vessel and `every` window) in a
+Danish CSR. The export streams time partitions: each is converted, sorted
+along a Hilbert curve over the bounds of the whole export and appended as
+row groups with bounding box covering columns, so GIS readers (GDAL, DuckDB,
+geopandas with `bbox=`) can fetch an area of interest by reading only a few
+row groups per partition. Memory is bounded by one partition.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Literal
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sdsprint import storage, utils
+
+Kind = Literal["points", "tracks"]
+# Row groups small enough that an area of interest only touches a few
+row_group_size = 50_000
+geometry_types = {"points": ["Point"], "tracks": ["LineString"]}
+
+
+def points(df: pl.DataFrame, csr: utils.dk_csrs = "EPSG:25832"):
+    """One point per row in `csr`."""
+    return utils.to_gdf(df, csr=csr)
+
+
+def tracks(df: pl.DataFrame, every: str = "1d", csr: utils.dk_csrs = "EPSG:25832"):
+    """One line per MMSI and `every` window through its positions in time order.
+
+    Windows with a single position give no line and are dropped.
+    """
+    import geopandas as gpd
+    import shapely
+
+    df = (
+        df.select("MMSI", "# Timestamp", "Latitude", "Longitude")
+        .drop_nulls()
+        .with_columns(pl.col("# Timestamp").dt.truncate(every).alias("window"))
+        .sort("MMSI", "window", "# Timestamp")
+        .with_columns(pl.len().over("MMSI", "window").alias("n_points"))
+        .filter(pl.col("n_points").ge(2))
+    )
+    keys = df.select("MMSI", "window").with_columns(
+        pl.struct("MMSI", "window").rank("dense").sub(1).alias("track")
+    )
+    lines = shapely.linestrings(
+        df.select("Longitude", "Latitude").to_numpy(),
+        indices=keys["track"].to_numpy(),
+    )
+    meta = df.group_by("MMSI", "window", maintain_order=True).agg(
+        pl.col("# Timestamp").min().alias("start"),
+        pl.col("# Timestamp").max().alias("end"),
+        pl.col("n_points").first(),
+    )
+    return (
+        gpd.GeoDataFrame(meta.to_pandas(), geometry=lines, crs="EPSG:4326")
+        .drop(columns="window")
+        .to_crs(csr)
+    )
+
+
+def hilbert_sort(gdf, total_bounds: tuple[float, ...] | None = None):
+    """Rows sorted along a Hilbert curve over `total_bounds` (default: data)."""
+    order = gdf.geometry.hilbert_distance(total_bounds=total_bounds)
+    return gdf.iloc[order.argsort(kind="stable")].reset_index(drop=True)
+
+
+def bounds(lf: pl.LazyFrame, csr: utils.dk_csrs) -> tuple[float, ...] | None:
+    """Bounds in `csr` of the positions in `lf`; None if there are none."""
+    lon, lat = pl.col("Longitude"), pl.col("Latitude")
+    box = lf.select(
+        lon.min().alias("xmin"),
+        lat.min().alias("ymin"),
+        lon.max().alias("xmax"),
+        lat.max().alias("ymax"),
+    )
+    box = box.collect().row(0)
+    if box[0] is None:
+        return None
+    return utils.transformer(csr).transform_bounds(*box)
+
+
+def geo_metadata(kind: Kind, csr: utils.dk_csrs) -> bytes:
+    """GeoParquet metadata of the WKB `geometry` and its `bbox` covering."""
+    from pyproj import CRS
+
+    covering = {c: ["bbox", c] for c in ["xmin", "ymin", "xmax", "ymax"]}
+    column = {
+        "encoding": "WKB",
+        "geometry_types": geometry_types[kind],
+        "crs": CRS.from_user_input(csr).to_json_dict(),
+        "covering": {"bbox": covering},
+    }
+    meta = {"version": "1.1.0", "primary_column": "geometry"}
+    return json.dumps({**meta, "columns": {"geometry": column}}).encode()
+
+
+def to_table(gdf) -> pa.Table:
+    """Attributes, WKB `geometry` and the `bbox` covering column."""
+    import shapely
+
+    geoms = gdf.geometry.to_numpy()
+    box = shapely.bounds(geoms)
+    table = pa.Table.from_pandas(gdf.drop(columns="geometry"), preserve_index=False)
+    table = table.replace_schema_metadata(None)  # No pandas metadata
+    return table.append_column(
+        "geometry", pa.array(shapely.to_wkb(geoms), pa.binary())
+    ).append_column(
+        "bbox",
+        pa.StructArray.from_arrays(
+            [pa.array(box[:, i]) for i in range(4)],
+            names=["xmin", "ymin", "xmax", "ymax"],
+        ),
+    )
+
+
+def export(
+    files: Path | list[Path],
+    out: Path,
+    kind: Kind = "points",
+    csr: utils.dk_csrs = "EPSG:25832",
+    every: str = "1d",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    columns: list[str] | None = None,
+    row_group_size: int = row_group_size,
+    partition: str = "1d",
+) -> int:
+    """Write the positions (optionally in `[start, end)`) as GeoParquet.
+
+    `columns` are kept next to the geometry for points (defaults to MMSI and
+    # Timestamp). Points are processed in time partitions of `partition`,
+    tracks in partitions of `every` so no track is split. Returns the number
+    of rows written.
+    """
+    keep = columns or ["MMSI", "# Timestamp"]
+    select = list(
+        dict.fromkeys([*keep, "MMSI", "# Timestamp", "Latitude", "Longitude"])
+    )
+    ts = pl.col("# Timestamp")
+    lf = storage.scan(files).select(select).drop_nulls(["Latitude", "Longitude"])
+    if start is not None:
+        lf = lf.filter(ts.ge(start))
+    if end is not None:
+        lf = lf.filter(ts.lt(end))
+    total_bounds = bounds(lf, csr)
+
+    def convert(df: pl.DataFrame) -> pa.Table:
+        if kind == "points":
+            gdf = points(df, csr=csr)[[*keep, "geometry"]]
+        else:
+            gdf = tracks(df, every=every, csr=csr)
+        return to_table(hilbert_sort(gdf, total_bounds))
+
+    parts = utils.partitions(lf, partition if kind == "points" else every)
+    out = Path(out)
+    tmp = out.with_suffix(".tmp")
+    writer = None
+    n = 0
+    try:
+        for lo, hi in parts or [(None, None)]:
+            df = lf.filter(ts.ge(lo), ts.lt(hi)) if lo is not None else lf.head(0)
+            table = convert(df.collect())
+            if writer is None:
+                schema = table.schema.with_metadata({b"geo": geo_metadata(kind, csr)})
+                writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+            writer.write_table(table.cast(writer.schema), row_group_size)
+            n += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    tmp.replace(out)  # Readers never see a partial file
+    return n
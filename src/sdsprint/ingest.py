@@ -0,0 +1,340 @@
+"""
+Ingest of the raw AIS csv files.
+
+AIS messages are received by several base stations, so the same message often
+appears more than once with identical MMSI, timestamp and position. We drop
+those at ingest so they never reach the resampling.
+
+The tolerant ingest validates the rows against the AIS schema instead of
+failing the whole file on a malformed line; rejected lines are written to a
+quarantine parquet file with the reason.
+"""
+
+import csv
+import tempfile
+import zipfile
+from pathlib import Path
+
+import polars as pl
+import pyarrow.parquet as pq
+from loguru import logger
+
+from sdsprint import metrics, storage
+
+cats = [
+    "IMO",  # IMO number of the vessel
+    "Callsign",  # Callsign of the vessel
+    "Name",  # Name of the vessel
+    "Destination",  # Destination of the vessel
+]
+nums = [
+    "ROT",
+    "Heading",
+    "SOG",
+    "COG",
+    "A",
+    "B",
+    "C",
+    "D",
+    "Width",
+    "Length",
+    "Draught",
+]
+
+
+ts_format = "%d/%m/%Y %H:%M:%S"
+
+
+def proc_ais(df: pl.DataFrame):
+    return df.with_columns(
+        pl.col("# Timestamp").str.to_datetime(
+            # format="%Y-%m-%d %H:%M:%S"
+            format=ts_format
+        ),
+        pl.col("ETA").str.to_datetime(format=ts_format),
+    ).with_columns(
+        pl.col(nums).cast(pl.Float64),
+        #  NOTE: If categorical we'll get some problems when concatenating
+        pl.col(cats).cast(pl.Utf8),
+        pl.col("MMSI").cast(pl.Utf8),
+    )
+
+
+dedup_keys = ["MMSI", "# Timestamp", "Latitude", "Longitude"]
+
+
+def dedup(lf: pl.LazyFrame, keys: list[str] | None = None) -> pl.LazyFrame:
+    """Drop duplicate messages on `keys` (hash-based, first one is kept).
+
+    The original order of the messages is restored afterwards (the streaming
+    `unique` does not keep it); resampling relies on the files being sorted
+    by time.
+    """
+    lf = lf.with_row_index("_row")
+    return lf.unique(subset=keys or dedup_keys, keep="first").sort("_row").drop("_row")
+
+
+timestamps = ["# Timestamp", "ETA"]
+required = ["MMSI", "# Timestamp"]
+batch_size = 500_000
+
+
+def raw_dtype(column: str) -> pl.DataType:
+    """Type of a raw column; timestamps stay strings for `proc_ais`."""
+    if column == "MMSI":
+        return pl.Int64
+    if column in ["Latitude", "Longitude", *nums]:
+        return pl.Float64
+    return pl.String
+
+
+def header(csv_path: Path) -> list[str]:
+    """Column names of a csv file."""
+    with open(csv_path, newline="") as f:
+        return next(csv.reader(f))
+
+
+def raw_schema(columns: list[str]) -> dict[str, pl.DataType]:
+    """Schema of the raw parquet files, the same for strict and tolerant ingest."""
+    return {c: raw_dtype(c) for c in columns}
+
+
+def sink_csv(
+    csv_path: Path,
+    pq_path: Path,
+    keys: list[str] | None = None,
+    profile: storage.Profile = "default",
+) -> int:
+    """Sink a (daily) csv file to parquet with write profile `profile`.
+
+    If `keys` are given, duplicate messages are dropped on them. The
+    deduplication is streamed per file so memory is bounded by the number of
+    unique keys in one day. The csv file is read once: with `keys` it is
+    sunk to a temporary parquet file first, and the rows in and out are taken
+    from the parquet footers (and set on the current metrics stage). Columns
+    are typed by `raw_schema`, so the output matches `sink_csv_tolerant`.
+    Returns the number of dropped rows.
+    """
+    lf = pl.scan_csv(csv_path, schema=raw_schema(header(csv_path)))
+    if keys:
+        with tempfile.TemporaryDirectory(dir=pq_path.parent, prefix=".") as tmp_dir:
+            tmp = Path(tmp_dir) / pq_path.name
+            lf.sink_parquet(tmp, **storage.sink_options())
+            n_in = pq.read_metadata(tmp).num_rows
+            lf = pl.scan_parquet(tmp).pipe(dedup, keys=keys)
+            storage.sink_parquet(lf, pq_path, profile=profile)
+    else:
+        storage.sink_parquet(lf, pq_path, profile=profile)
+    n_out = pq.read_metadata(pq_path).num_rows
+    n_in = n_in if keys else n_out
+    if rec := metrics.current.get():
+        rec.update(rows_in=n_in, rows_out=n_out)
+    if not keys:
+        logger.info(f"Sinked {csv_path} to {pq_path}")
+        return 0
+
+    dropped = n_in - n_out
+    logger.info(
+        f"Sinked {csv_path} to {pq_path}; dropped {dropped} of {n_in} rows "
+        f"duplicated on {keys}"
+    )
+    return dropped
+
+
+def split_fields(lines: pl.DataFrame) -> pl.DataFrame:
+    """Fields (`fields`) of raw csv lines (`line`, `text`), in line order.
+
+    Lines are split on commas; the few lines with a quote are parsed by the
+    csv module, so quoted fields may hold commas and escaped quotes.
+    """
+    quoted = pl.col("text").str.contains('"', literal=True)
+    plain = lines.filter(~quoted).with_columns(
+        pl.col("text").str.split(",").alias("fields")
+    )
+    rest = lines.filter(quoted)
+    if rest.is_empty():
+        return plain
+    fields = pl.Series("fields", list(csv.reader(rest["text"])), pl.List(pl.String))
+    return pl.concat([plain, rest.with_columns(fields)]).sort("line")
+
+
+def validate(
+    lines: pl.DataFrame, columns: list[str]
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Split raw csv lines (`line`, `text`) into typed rows and rejected lines.
+
+    A line is rejected if it does not have one field per column, a value
+    does not parse as its type (timestamps as `ts_format`) or a required
+    column is empty. A malformed optional timestamp (ETA) only nulls the
+    field. Rows have the schema of `raw_schema(columns)`.
+    """
+    fields = pl.col("fields")
+    df = split_fields(lines).with_columns(
+        fields.list.len().alias("_n"),
+        *(
+            fields.list.get(i, null_on_oob=True).replace("", None).alias(c)
+            for i, c in enumerate(columns)
+        ),
+    )
+    parsed = {
+        c: pl.col(c).str.strptime(pl.Datetime, ts_format, strict=False)
+        if c in timestamps
+        else pl.col(c).cast(raw_dtype(c), strict=False)
+        for c in columns
+    }
+    checks = [
+        pl.when(pl.col(c).is_not_null() & e.is_null()).then(pl.lit(f"bad {c}"))
+        for c, e in parsed.items()
+        if c in required or (c not in timestamps and raw_dtype(c) != pl.String)
+    ] + [pl.when(pl.col(c).is_null()).then(pl.lit(f"missing {c}")) for c in required]
+    df = df.with_columns(
+        pl.when(pl.col("_n").ne(len(columns)))
+        .then(pl.format("expected {} fields, got {}", pl.lit(len(columns)), "_n"))
+        .otherwise(pl.concat_str(checks, separator="; ", ignore_nulls=True))
+        .alias("reason")
+    )
+    ok = pl.col("reason").eq("")
+    good = df.filter(ok).select(
+        # Timestamps stay strings as in `sink_csv`; malformed optional ones null
+        pl.when(e.is_not_null()).then(pl.col(c)).alias(c) if c in timestamps else e
+        for c, e in parsed.items()
+    )
+    bad = df.filter(~ok).select("line", "reason", "text")
+    return good, bad
+
+
+def quarantine_path(pq_path: Path) -> Path:
+    """Rejected lines of `pq_path`; outside the directory of the daily files."""
+    return pq_path.parent / "quarantine" / pq_path.name
+
+
+def sink_csv_tolerant(
+    csv_path: Path,
+    pq_path: Path,
+    keys: list[str] | None = None,
+    profile: storage.Profile = "default",
+) -> tuple[int, int]:
+    """Sink a (daily) csv file to parquet, quarantining invalid lines.
+
+    The file is read in batches of raw lines which are validated (see
+    `validate`); valid rows are written as they come and rejected lines go
+    to `quarantine_path(pq_path)` with their line number and the reason.
+    If `keys` are given, duplicates are dropped afterwards as in `sink_csv`.
+    The parquet file is written with write profile `profile`; the counts are
+    also set on the current metrics stage. Returns the number of dropped
+    duplicates and quarantined lines.
+    """
+    columns = header(csv_path)
+    reader = pl.read_csv_batched(
+        csv_path,
+        separator="\x1f",  # Not in the data; one field per line
+        quote_char=None,
+        new_columns=["text"],
+        infer_schema_length=0,  # All strings
+        batch_size=batch_size,
+    )
+    f_bad = quarantine_path(pq_path)
+    writer = bad_writer = None
+    n = {"lines": 0, "good": 0, "bad": 0}
+
+    def tables():
+        """Valid rows per batch; rejected lines are written on the way."""
+        nonlocal bad_writer
+        while batches := reader.next_batches(1):
+            lines = (
+                batches[0]
+                .with_row_index("line", offset=n["lines"] + 2)  # 1-based, header
+                .with_columns(
+                    pl.col("line").cast(pl.Int64),
+                    pl.col("text").str.strip_chars_end("\r"),
+                )
+            )
+            n["lines"] += lines.height
+            good, bad = validate(lines.drop_nulls("text"), columns)
+            n["good"] += good.height
+            if bad.height:
+                if bad_writer is None:
+                    f_bad.parent.mkdir(parents=True, exist_ok=True)
+                    bad_writer = pq.ParquetWriter(f_bad, bad.to_arrow().schema)
+                bad_writer.write_table(bad.to_arrow())
+                n["bad"] += bad.height
+            yield good.to_arrow()
+
+    def write(path: Path, write_profile: storage.Profile):
+        nonlocal writer
+        options = storage.write_options(write_profile)
+        row_group_size = options.pop("row_group_size", None)
+        try:
+            # Batches have the schema of `validate`; full row groups of `profile`
+            for table in storage.coalesce(tables(), row_group_size):
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, **options)
+                writer.write_table(table, row_group_size)
+        finally:
+            for w in (writer, bad_writer):
+                if w is not None:
+                    w.close()
+        if writer is None:  # Empty file
+            empty = pl.DataFrame(schema={"line": pl.Int64, "text": pl.String})
+            validate(empty, columns)[0].write_parquet(path)
+
+    dropped = 0
+    if keys:
+        # Valid rows go to an intermediate file; the deduplicated one is output
+        with tempfile.TemporaryDirectory(dir=pq_path.parent, prefix=".") as tmp_dir:
+            tmp = Path(tmp_dir) / pq_path.name
+            write(tmp, "default")
+            lf = pl.scan_parquet(tmp).pipe(dedup, keys=keys)
+            storage.sink_parquet(lf, pq_path, profile=profile)
+        dropped = n["good"] - pq.read_metadata(pq_path).num_rows
+    else:
+        write(pq_path, profile)
+    if rec := metrics.current.get():
+        rec.update(
+            rows_in=n["lines"], rows_out=n["good"] - dropped, quarantined=n["bad"]
+        )
+    logger.info(
+        f"Sinked {csv_path} to {pq_path}; quarantined {n['bad']} of {n['lines']} "
+        f"lines to {f_bad}, dropped {dropped} rows duplicated on {keys}"
+    )
+    return dropped, n["bad"]
+
+
+def proc_zip(
+    zip_path: Path,
+    output_dir: Path,
+    keys: list[str] | None = None,
+    tolerant: bool = False,
+    profile: storage.Profile = "default",
+):
+    """
+    Extracts the CSV files from a ZIP archive and sinks them as Parquet files
+    with write profile `profile`. Duplicate messages on `keys` are dropped.
+    If `tolerant`, invalid lines are quarantined instead of failing the file.
+    """
+    with zipfile.ZipFile(zip_path, "r") as z:
+        names = z.namelist()
+        logger.info(f"Extracting {len(names)} files from {zip_path}")
+        for filename in names:
+            if filename.endswith(".csv"):
+                csv_out = Path.joinpath(output_dir, filename)
+                pqfile = csv_out.with_suffix(".parquet")
+                if pqfile.exists():
+                    logger.info(f"File {pqfile} already exists")
+                    continue
+                logger.info(f"Extracting {filename}...")
+                with metrics.stage(
+                    "extract", file=filename, paths_in=[zip_path], paths_out=[csv_out]
+                ):
+                    z.extract(filename, output_dir)
+                logger.info(f"Extracted {filename} to {output_dir}")
+                with metrics.stage(
+                    "sink", file=filename, paths_in=[csv_out], paths_out=[pqfile]
+                ):
+                    # Both set the rows in and out on the stage
+                    if tolerant:
+                        sink_csv_tolerant(csv_out, pqfile, keys=keys, profile=profile)
+                    else:
+                        sink_csv(csv_out, pqfile, keys=keys, profile=profile)
+                csv_out.unlink()
+                logger.info(f"Deleted {filename}")
@@ -0,0 +1,228 @@
+"""
+Regular-time vessel tracks with gaps filled by interpolation.
+
+The resampled products keep one observation per window and have no rows for
+windows without messages. `interpolate` puts the positions of each vessel on
+a regular grid of resolution `every` (any duration, e.g. "1m" or "10s"):
+grid times between two observations at most `max_gap` apart are interpolated
+linearly in a projected CSR (`method="linear"`) or along the great circle
+(`method="great-circle"`); longer gaps are left empty. Rows not at an
+observation are marked `interpolated`.
+
+`tracks` sorts the source by vessel once, streams batches of vessels through
+`interpolate` in parallel and writes a file sorted by (MMSI, timestamp):
+
+    interpolate.tracks("data/aisdk-2024-1h.parquet", "tracks.parquet", "5m")
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+import polars as pl
+
+from sdsprint import storage, utils
+from sdsprint.utils import transformer
+
+Method = Literal["linear", "great-circle"]
+columns = ["MMSI", "# Timestamp", "Latitude", "Longitude"]
+track_order = ("MMSI", "# Timestamp")
+# Row groups of the source sorted by vessel; a batch reads at most one more
+row_group_size = 100_000
+
+
+def grid(df: pl.DataFrame, every: str) -> pl.DataFrame:
+    """Times of `every` from the first to the last observation of each MMSI.
+
+    Sorted by (MMSI, timestamp) if `df` is sorted by MMSI.
+    """
+    ts = pl.col("# Timestamp")
+    return (
+        df.group_by("MMSI", maintain_order=True)
+        .agg(ts.min().alias("lo"), ts.max().alias("hi"))
+        .select(
+            "MMSI",
+            "lo",
+            pl.datetime_ranges(pl.col("lo").dt.truncate(every), "hi", every).alias(
+                "# Timestamp"
+            ),
+        )
+        .explode("# Timestamp")
+        .filter(ts.ge(pl.col("lo")))
+        .drop("lo")
+    )
+
+
+def great_circle(df: pl.DataFrame) -> pl.DataFrame:
+    """Interpolate `_0` to `_1` positions by `f` along the great circle."""
+    f, omega = pl.col("f"), pl.col("omega")
+    # Unit vectors of both ends, evaluated once each
+    xyz = []
+    for i in (0, 1):
+        lat, lon = pl.col(f"Latitude_{i}").radians(), pl.col(f"Longitude_{i}").radians()
+        xyz += [
+            (lat.cos() * lon.cos()).alias(f"x_{i}"),
+            (lat.cos() * lon.sin()).alias(f"y_{i}"),
+            lat.sin().alias(f"z_{i}"),
+        ]
+    chord = sum((pl.col(f"{c}_1") - pl.col(f"{c}_0")).pow(2) for c in "xyz").sqrt()
+    # Spherical interpolation; linear for (almost) coinciding positions
+    slerp = omega.gt(1e-12)
+    x, y, z = (
+        pl.col(f"{c}_0") * pl.col("a") + pl.col(f"{c}_1") * pl.col("b") for c in "xyz"
+    )
+    return (
+        df.with_columns(xyz)
+        .with_columns(chord.truediv(2).clip(0, 1).arcsin().mul(2).alias("omega"))
+        .with_columns(
+            pl.when(slerp)
+            .then(((1 - f) * omega).sin() / omega.sin())
+            .otherwise(1 - f)
+            .alias("a"),
+            pl.when(slerp)
+            .then((f * omega).sin() / omega.sin())
+            .otherwise(f)
+            .alias("b"),
+        )
+        .with_columns(x.alias("x"), y.alias("y"), z.alias("z"))
+        .with_columns(
+            pl.arctan2("z", pl.col("x").pow(2).add(pl.col("y").pow(2)).sqrt())
+            .degrees()
+            .alias("Latitude"),
+            pl.arctan2("y", "x").degrees().alias("Longitude"),
+        )
+    )
+
+
+def linear(df: pl.DataFrame, csr: utils.dk_csrs) -> pl.DataFrame:
+    """Interpolate `_0` to `_1` positions by `f` in `csr`."""
+    tr = transformer(csr)
+    x0, y0 = tr.transform(df["Longitude_0"].to_numpy(), df["Latitude_0"].to_numpy())
+    x1, y1 = tr.transform(df["Longitude_1"].to_numpy(), df["Latitude_1"].to_numpy())
+    f = df["f"].to_numpy()
+    lon, lat = tr.transform(x0 + f * (x1 - x0), y0 + f * (y1 - y0), direction="INVERSE")
+    return df.with_columns(
+        pl.Series("Latitude", np.asarray(lat, dtype=np.float64)),
+        pl.Series("Longitude", np.asarray(lon, dtype=np.float64)),
+    )
+
+
+def interpolate(
+    df: pl.DataFrame,
+    every: str,
+    max_gap: str = "2h",
+    method: Method = "linear",
+    csr: utils.dk_csrs = "EPSG:25832",
+) -> pl.DataFrame:
+    """Positions of each MMSI on a regular grid of `every`; see module docs.
+
+    Returns MMSI, `# Timestamp`, Latitude, Longitude and `interpolated`,
+    sorted by (MMSI, timestamp).
+    """
+    ts = pl.col("# Timestamp")
+    obs = (
+        df.select(columns)
+        .drop_nulls()
+        .filter(pl.col("Latitude").abs().le(90), pl.col("Longitude").abs().le(180))
+        .unique(["MMSI", "# Timestamp"], keep="first", maintain_order=True)
+        .sort(*track_order)
+    )
+    times = grid(obs, every)
+
+    def side(i: int) -> pl.DataFrame:
+        return obs.select(
+            "MMSI",
+            ts,
+            ts.alias(f"t_{i}"),
+            pl.col("Latitude").alias(f"Latitude_{i}"),
+            pl.col("Longitude").alias(f"Longitude_{i}"),
+        )
+
+    t0, t1 = pl.col("t_0"), pl.col("t_1")
+    # Both sides are sorted by time within each MMSI, which is all the asof
+    # join needs with `by`; the global check would ask for a costly re-sort.
+    asof = dict(on="# Timestamp", by="MMSI", check_sortedness=False)
+    pairs = (
+        times.join_asof(side(0), strategy="backward", **asof)
+        .join_asof(side(1), strategy="forward", **asof)
+        .filter(t1.le(t0.dt.offset_by(max_gap)))
+        .with_columns(
+            pl.when(t1.gt(t0))
+            .then(
+                ts.sub(t0).dt.total_microseconds() / t1.sub(t0).dt.total_microseconds()
+            )
+            .otherwise(0.0)
+            .alias("f"),
+            ts.ne(t0).alias("interpolated"),
+        )
+    )
+    match method:
+        case "linear":
+            pairs = linear(pairs, csr)
+        case "great-circle":
+            pairs = great_circle(pairs)
+        case _:
+            raise ValueError(f"Unknown method `{method}`")
+    return pairs.select(*columns, "interpolated")
+
+
+def tracks(
+    source: Path | str | list[Path] | list[str],
+    out: Path,
+    every: str,
+    mmsis: list[str] | None = None,
+    max_gap: str = "2h",
+    method: Method = "linear",
+    csr: utils.dk_csrs = "EPSG:25832",
+    batch_size: int = 1_000,
+    max_workers: int = 4,
+    profile: storage.Profile = "default",
+) -> int:
+    """Write interpolated tracks of `mmsis` (default all) to `out`.
+
+    The source is sunk sorted by (MMSI, timestamp) to a temporary file in
+    one streaming pass, so each batch of `batch_size` vessels reads only the
+    row groups of its MMSI range instead of scanning the source again.
+    Batches are processed by `max_workers` threads; memory is bounded by the
+    positions of `max_workers` batches. `out` is written with write profile
+    `profile`. Returns the number of rows written.
+    """
+    out = Path(out)
+    mmsi = pl.col("MMSI")
+    lf = storage.scan(source).select(columns)
+    if mmsis is not None:
+        lf = lf.filter(mmsi.is_in(mmsis))
+    by_vessel = out.with_suffix(".sorted.parquet")
+    parts: list[Path] = []
+    try:
+        lf.sort(*track_order).sink_parquet(by_vessel, row_group_size=row_group_size)
+        vessels = pl.scan_parquet(by_vessel).select(mmsi.unique().sort()).collect()
+        vessels = vessels["MMSI"]
+        batches = [
+            vessels.slice(i, batch_size) for i in range(0, len(vessels), batch_size)
+        ]
+        parts = [out.with_suffix(f".part{i}.parquet") for i in range(len(batches))]
+        sorted_lf = pl.scan_parquet(by_vessel)
+
+        def run(i: int) -> int:
+            lo, hi = batches[i][0], batches[i][-1]
+            # A range on the sorted column, which the row group statistics prune
+            df = sorted_lf.filter(mmsi.is_between(pl.lit(lo), pl.lit(hi))).collect()
+            df = interpolate(df, every, max_gap=max_gap, method=method, csr=csr)
+            if not df.is_empty():  # Empty parts would hide the order of the rest
+                storage.write_parquet(df, parts[i], sorted_by=track_order)
+            return df.height
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            rows = list(pool.map(run, range(len(batches))))
+        written = [p for p, n in zip(parts, rows) if n]
+        if written:
+            storage.concat_parquet(written, out, profile=profile)
+        else:
+            empty = interpolate(lf.head(0).collect(), every)
+            storage.write_parquet(empty, out, sorted_by=track_order, profile=profile)
+    finally:
+        for p in [by_vessel, *parts]:
+            p.unlink(missing_ok=True)
+    return sum(rows)
@@ -0,0 +1,131 @@
+"""
+Kinematic features and consistency checks of vessel tracks.
+
+For every position the distance, speed (knots), course (degrees) and
+acceleration (m/s^2) implied by the previous position of the same vessel are
+computed in one vectorized pass, together with their difference from the
+reported `SOG` and `COG`. A previous position more than `max_gap` earlier
+starts a new segment without features. Implausible values are flagged:
+
+    flag_speed  implied speed above `max_speed` (position jump, spoofing)
+    flag_accel  implied acceleration above `max_accel`
+    flag_sog    implied speed off the reported SOG by more than `sog_tol`
+    flag_cog    implied course off the reported COG by more than `cog_tol`
+    suspect     any of the above
+
+Flags describe the step from the previous position, so a single bad position
+flags the step to it and the step back. The table keeps MMSI and timestamp,
+so analyses can join or filter on it without recomputing.
+"""
+
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+from sdsprint import storage
+from sdsprint.utils import bearing, haversine, map_partitions
+
+columns = ["MMSI", "# Timestamp", "Latitude", "Longitude", "SOG", "COG"]
+knot = 1852 / 3600  # m/s
+
+
+def angle_diff(a: pl.Expr, b: pl.Expr) -> pl.Expr:
+    """Signed difference `a - b` of two angles in degrees, in [-180, 180)."""
+    return (a - b + 180).mod(360) - 180
+
+
+def features(
+    df: pl.DataFrame | pl.LazyFrame,
+    max_gap: str = "1h",
+    max_speed: float = 50.0,
+    max_accel: float = 0.5,
+    sog_tol: float = 5.0,
+    cog_tol: float = 45.0,
+    min_speed: float = 2.0,
+) -> pl.DataFrame | pl.LazyFrame:
+    """Kinematic features and flags of each position; see the module docs.
+
+    The course is only compared if both speeds are at least `min_speed`
+    knots, as it is meaningless for a vessel lying still.
+    """
+    ts, lat, lon = pl.col("# Timestamp"), pl.col("Latitude"), pl.col("Longitude")
+    dt = pl.col("dt")
+    sog = pl.when(pl.col("SOG").lt(102.3)).then(pl.col("SOG"))  # 102.3: n/a
+    cog = pl.when(pl.col("COG").lt(360)).then(pl.col("COG"))  # 360: n/a
+    speed = pl.col("implied_speed")
+
+    def prev(e: pl.Expr) -> pl.Expr:
+        return e.shift().over("MMSI")
+
+    return (
+        df.select(columns)
+        .filter(lat.abs().le(90), lon.abs().le(180))
+        .sort("MMSI", "# Timestamp")
+        .with_columns(
+            pl.when(ts.le(prev(ts).dt.offset_by(max_gap)))
+            .then(ts.sub(prev(ts)).dt.total_microseconds().truediv(1e6))
+            .alias("dt"),
+        )
+        .with_columns(
+            pl.when(dt.is_not_null())
+            .then(haversine(prev(lat), prev(lon), lat, lon))
+            .alias("distance"),
+        )
+        .with_columns(
+            pl.when(dt.gt(0))
+            .then(pl.col("distance").truediv(dt).truediv(knot))
+            .alias("implied_speed"),
+            pl.when(pl.col("distance").gt(0))
+            .then(bearing(prev(lat), prev(lon), lat, lon))
+            .alias("bearing"),
+        )
+        .with_columns(
+            speed.sub(prev(speed)).mul(knot).truediv(dt).alias("acceleration"),
+            speed.sub(sog).alias("sog_diff"),
+            pl.when(speed.ge(min_speed) & sog.ge(min_speed))
+            .then(angle_diff(pl.col("bearing"), cog))
+            .alias("cog_diff"),
+        )
+        .with_columns(
+            speed.gt(max_speed).fill_null(False).alias("flag_speed"),
+            pl.col("acceleration")
+            .abs()
+            .gt(max_accel)
+            .fill_null(False)
+            .alias("flag_accel"),
+            pl.col("sog_diff").abs().gt(sog_tol).fill_null(False).alias("flag_sog"),
+            pl.col("cog_diff").abs().gt(cog_tol).fill_null(False).alias("flag_cog"),
+        )
+        .with_columns(
+            pl.any_horizontal("flag_speed", "flag_accel", "flag_sog", "flag_cog").alias(
+                "suspect"
+            )
+        )
+    )
+
+
+def kinematics(
+    source: Path | str | list[Path] | list[str] | pl.LazyFrame,
+    max_gap: str = "1h",
+    partition: str = "7d",
+    max_workers: int = 4,
+    **limits,
+) -> pl.DataFrame:
+    """Feature table of all positions, sorted by (timestamp, MMSI).
+
+    Partitions are processed in parallel by `utils.map_partitions`; each also
+    reads the `2 * max_gap` before it, so features at partition boundaries are
+    the same as without partitioning. `limits` are passed on to `features`.
+    """
+    lf = source if isinstance(source, pl.LazyFrame) else storage.scan(source)
+    lf = lf.select(columns)
+
+    def run(df: pl.DataFrame, start: datetime) -> pl.DataFrame:
+        res = features(df, max_gap=max_gap, **limits)
+        return res.filter(pl.col("# Timestamp").ge(start))
+
+    # Acceleration needs the two previous positions
+    lookback = f"{max_gap}{max_gap}"
+    parts = map_partitions(lf, run, partition, max_workers, lookback=lookback)
+    return pl.concat(parts).sort("# Timestamp", "MMSI")
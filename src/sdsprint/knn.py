@@ -0,0 +1,217 @@
+"""
+Spatio-temporal index for nearest vessel queries.
+
+"Which vessels were closest to this point at this time?" The index holds the
+positions of a resampled product projected to a Danish CSR, one parquet file
+per time partition (built in parallel), plus `index.json`. On query the
+positions of a time bucket (one window of the product) get an STR tree,
+cached with their partition, so repeated queries take milliseconds:
+
+    idx = knn.build("data/aisdk-2024-1h.parquet", "data/index-2024-1h")
+    idx = knn.Index("data/index-2024-1h")
+    idx.knn(55.68, 12.60, time=datetime(2024, 6, 17, 12), k=5)
+    idx.within(55.68, 12.60, 2_000, start=..., end=...)
+"""
+
+import functools
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from sdsprint import storage, utils
+
+columns = ["# Timestamp", "MMSI", "Latitude", "Longitude"]
+empty = pl.DataFrame(
+    schema={
+        "# Timestamp": pl.Datetime("us"),
+        "MMSI": pl.String,
+        "Latitude": pl.Float64,
+        "Longitude": pl.Float64,
+        "x": pl.Float64,
+        "y": pl.Float64,
+    }
+)
+
+
+def project(df: pl.DataFrame, csr: utils.dk_csrs) -> pl.DataFrame:
+    """Add projected coordinates `x`, `y` in meters."""
+    x, y = utils.transformer(csr).transform(
+        df["Longitude"].to_numpy(), df["Latitude"].to_numpy()
+    )
+    return df.with_columns(pl.Series("x", x), pl.Series("y", y))
+
+
+def part_name(start: datetime) -> str:
+    return f"{start:%Y%m%dT%H%M%S}.parquet"
+
+
+def build(
+    source: Path | str | list[Path] | list[str],
+    out: Path,
+    every: str = "1h",
+    partition: str = "1d",
+    csr: utils.dk_csrs = "EPSG:25832",
+    max_workers: int = 4,
+) -> "Index":
+    """Build the index of a product with windows of size `every`.
+
+    Partitions are projected and written in parallel by `utils.map_partitions`.
+    """
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    lf = (
+        storage.scan(source)
+        .select(columns)
+        .filter(pl.col("Latitude").abs().le(90), pl.col("Longitude").abs().le(180))
+        .with_columns(pl.col("# Timestamp").dt.truncate(every))
+    )
+
+    def write(df: pl.DataFrame, start: datetime) -> int:
+        if not df.is_empty():
+            storage.write_parquet(project(df, csr), out / part_name(start))
+        return df.height
+
+    rows = sum(utils.map_partitions(lf, write, partition, max_workers))
+    meta = {"every": every, "partition": partition, "csr": csr, "rows": rows}
+    (out / "index.json").write_text(json.dumps(meta))
+    return Index(out)
+
+
+def truncate(t: datetime, every: str) -> datetime:
+    return pl.Series([t]).dt.truncate(every).item()
+
+
+def check_time(
+    time: datetime | None, start: datetime | None, end: datetime | None
+) -> None:
+    """Raise ValueError unless only `time` or both `start` and `end` are given."""
+    window = start is not None and end is not None
+    if (time is None) != window or (time is not None and (start or end)):
+        raise ValueError("Give either `time` or both `start` and `end`")
+
+
+class Index:
+    """A built index; see `build`."""
+
+    def __init__(self, path: Path | str, cache_size: int = 16):
+        self.path = Path(path)
+        meta = json.loads((self.path / "index.json").read_text())
+        self.every = meta["every"]
+        self.partition = meta["partition"]
+        self.csr = meta["csr"]
+        self._lock = threading.Lock()
+        self._part = functools.lru_cache(cache_size)(self._load)
+
+    def _load(self, start: datetime) -> tuple[pl.DataFrame | None, dict]:
+        """Positions of a partition and the trees of its buckets built so far."""
+        f = self.path / part_name(start)
+        return storage.scan(f).collect() if f.exists() else None, {}
+
+    def bucket(self, t: datetime):
+        """Positions of the bucket holding `t` and an STR tree over them."""
+        import shapely
+
+        t = truncate(t, self.every)
+        with self._lock:
+            df, trees = self._part(truncate(t, self.partition))
+        if df is None:
+            return empty, None
+        if t not in trees:
+            ts = df["# Timestamp"]
+            lo = ts.search_sorted(t, side="left")
+            hi = ts.search_sorted(t, side="right")
+            pos = df.slice(lo, hi - lo)
+            points = shapely.points(pos["x"].to_numpy(), pos["y"].to_numpy())
+            trees[t] = pos, shapely.STRtree(points)
+        return trees[t]
+
+    def buckets(
+        self,
+        time: datetime | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> list[datetime]:
+        """The bucket of `time` or the buckets overlapping `[start, end)`."""
+        check_time(time, start, end)
+        if time is not None:
+            return [truncate(time, self.every)]
+        return pl.datetime_range(
+            truncate(start, self.every), end, self.every, closed="left", eager=True
+        ).to_list()
+
+    def _point(self, lat: float, lon: float):
+        import shapely
+
+        return shapely.Point(*utils.transformer(self.csr).transform(lon, lat))
+
+    def _result(self, t: datetime, pos: pl.DataFrame, idx, dist) -> pl.DataFrame:
+        return (
+            pos[np.asarray(idx, dtype=np.int64)]
+            .select(columns)
+            .with_columns(
+                pl.lit(t).alias("# Timestamp"),
+                pl.Series("distance", np.asarray(dist, dtype=np.float64)),
+            )
+        )
+
+    def knn(
+        self,
+        lat: float,
+        lon: float,
+        time: datetime | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        k: int = 5,
+    ) -> pl.DataFrame:
+        """The `k` vessels closest to (`lat`, `lon`) per bucket; meters."""
+        import shapely
+
+        point = self._point(lat, lon)
+        out = []
+        for t in self.buckets(time, start, end):
+            pos, tree = self.bucket(t)
+            if pos.is_empty():
+                continue
+            # Grow the search radius until it holds k vessels; the k closest
+            # of those are the k closest overall
+            r = 1_000.0
+            while True:
+                idx = tree.query(point, predicate="dwithin", distance=r)
+                if len(idx) >= k or len(idx) == len(pos):
+                    break
+                r *= 4
+            dist = shapely.distance(point, tree.geometries.take(idx))
+            order = np.argsort(dist, kind="stable")[:k]
+            out.append(self._result(t, pos, idx[order], dist[order]))
+        return self._concat(out)
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius: float,
+        time: datetime | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> pl.DataFrame:
+        """Vessels within `radius` meters of (`lat`, `lon`) per bucket."""
+        import shapely
+
+        point = self._point(lat, lon)
+        out = []
+        for t in self.buckets(time, start, end):
+            pos, tree = self.bucket(t)
+            if pos.is_empty():
+                continue
+            idx = tree.query(point, predicate="dwithin", distance=radius)
+            dist = shapely.distance(point, tree.geometries.take(idx))
+            order = np.argsort(dist, kind="stable")
+            out.append(self._result(t, pos, idx[order], dist[order]))
+        return self._concat(out)
+
+    def _concat(self, out: list[pl.DataFrame]) -> pl.DataFrame:
+        return pl.concat(out) if out else empty.select(columns, distance=pl.lit(0.0))
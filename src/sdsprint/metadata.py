@@ -0,0 +1,91 @@
+"""
+Sort order metadata of parquet and Arrow IPC files.
+
+Writers (`sdsprint.storage`, `sdsprint.cache`) record the sort order of a file
+under `meta_key` in its schema metadata. These helpers read it back, check
+which order holds across several files and scan files with polars' sorted
+flag set from it. They only read footers and schemas.
+"""
+
+import json
+from pathlib import Path
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import ipc
+
+sort_order = ("# Timestamp", "MMSI")
+meta_key = b"sdsprint.sorted_by"
+ipc_suffixes = (".arrow", ".ipc")
+
+
+def is_ipc(file: Path | str) -> bool:
+    return Path(file).suffix in ipc_suffixes
+
+
+def read_schema(file: Path | str) -> pa.Schema:
+    """Schema (with metadata) of a parquet or IPC file, from its footer."""
+    if not is_ipc(file):
+        return pq.read_schema(file)
+    with pa.memory_map(str(file)) as source:
+        return ipc.open_file(source).schema
+
+
+def file_sorted_by(file: Path | str) -> list[str]:
+    """Sort order recorded in a file; empty if none was recorded."""
+    meta = read_schema(file).metadata or {}
+    return json.loads(meta[meta_key]) if meta_key in meta else []
+
+
+def _key_range(file: Path | str, col: str):
+    """(min, max) of `col` in a file from the row group statistics."""
+    if is_ipc(file):  # Sorted by `col`; first and last value
+        keys = pl.scan_ipc(file, memory_map=True).select(col)
+        return keys.first().collect().item(), keys.last().collect().item()
+    md = pq.read_metadata(file)
+    idx = md.schema.names.index(col)
+    stats = [md.row_group(i).column(idx).statistics for i in range(md.num_row_groups)]
+    if not stats or any(s is None or not s.has_min_max for s in stats):
+        return None
+    return stats[0].min, stats[-1].max
+
+
+def sorted_by(files: Path | str | list[Path] | list[str]) -> list[str]:
+    """Sort order that holds across `files` read in the given order.
+
+    All files must record the same order, and the leading key ranges of
+    consecutive files must not overlap.
+    """
+    files = files if isinstance(files, list) else [files]
+    orders = [file_sorted_by(f) for f in files]
+    if not orders or not orders[0] or any(o != orders[0] for o in orders):
+        return []
+    if len(files) > 1:
+        ranges = [_key_range(f, orders[0][0]) for f in files]
+        if any(r is None for r in ranges):
+            return []
+        if any(a[1] > b[0] for a, b in zip(ranges[:-1], ranges[1:])):
+            return []
+    return orders[0]
+
+
+def scan(files: Path | str | list[Path] | list[str]) -> pl.LazyFrame:
+    """Scan parquet or IPC (memory-mapped) file(s) with the sorted flag set.
+
+    Polars keeps one sorted flag per column, so only the leading key of the
+    recorded order is flagged; the other keys are sorted within its ties only.
+    """
+    files = files if isinstance(files, list) else [files]
+    ipcs = [is_ipc(f) for f in files]
+    if all(ipcs):
+        lf = pl.scan_ipc(files, memory_map=True)
+    elif not any(ipcs):
+        lf = pl.scan_parquet(files)
+    else:
+        lf = pl.concat(
+            pl.scan_ipc(f, memory_map=True) if i else pl.scan_parquet(f)
+            for f, i in zip(files, ipcs)
+        )
+    order = sorted_by(files)
+    return lf.set_sorted(order[0]) if order else lf
@@ -0,0 +1,209 @@
+"""
+Per-stage performance metrics of the pipeline.
+
+Wrap a stage in `stage(...)` to record wall time, rows in/out, bytes
+read/written and the RSS of the process during the stage as one JSON line
+per stage:
+
+    metrics.configure("metrics.jsonl", profile=True)
+    with metrics.stage("resample", file=f, paths_in=[f]) as rec:
+        df = metrics.collect(lf)  # Adds the polars query profile if enabled
+        rec["rows_out"] = df.height
+
+Nothing is written before `configure` is called. `summary` aggregates a
+metrics file per stage and lists the slowest files.
+"""
+
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+config = {"path": None, "profile": False}
+current: ContextVar[dict | None] = ContextVar("current", default=None)
+
+
+def configure(path: Path | str | None, profile: bool = False):
+    """Write metrics to `path` (JSON lines); `profile` adds polars profiles."""
+    config["path"] = Path(path) if path else None
+    config["profile"] = profile
+
+
+# Seconds between RSS samples within a stage
+rss_interval = 0.05
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of the RSS over the lifetime of the process."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def rss_mb() -> float | None:
+    """Current RSS of the process; None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+@contextlib.contextmanager
+def sample_rss(interval: float = rss_interval):
+    """Sample the RSS in a thread; yields a dict with `start` and `peak`.
+
+    Without /proc, `start` is None and `peak` is the lifetime high-water mark.
+    """
+    res = {"start": rss_mb(), "peak": None}
+    if res["start"] is None:
+        try:
+            yield res
+        finally:
+            res["peak"] = peak_rss_mb()
+        return
+    res["peak"] = res["start"]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            res["peak"] = max(res["peak"], rss_mb())
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield res
+    finally:
+        done.set()
+        thread.join()
+        res["peak"] = max(res["peak"], rss_mb())
+
+
+def size(paths: list[Path] | None) -> int | None:
+    if not paths:
+        return None
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+@contextlib.contextmanager
+def stage(
+    name: str,
+    file: Path | str | None = None,
+    paths_in: list[Path] | None = None,
+    paths_out: list[Path] | None = None,
+    **fields,
+):
+    """Record a pipeline stage; the yielded dict can be updated in the block.
+
+    Set `rows_in`/`rows_out` (and `paths_out` if only known inside the block)
+    on the record. Bytes are taken from the file sizes of the paths.
+    `peak_rss_mb` is the highest RSS sampled during the stage and
+    `rss_delta_mb` its increase over the RSS at the start, so stages are
+    measured on their own rather than by the peak of the whole process.
+    """
+    rec = {
+        "stage": name,
+        "file": str(file) if file else None,
+        "rows_in": None,
+        "rows_out": None,
+        "paths_out": paths_out,
+        **fields,
+    }
+    rec["bytes_read"] = size(paths_in)
+    token = current.set(rec)
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        with sample_rss() as rss:
+            yield rec
+        ok = True
+    finally:
+        current.reset(token)
+        rec["seconds"] = time.perf_counter() - t0
+        rec["ok"] = ok
+        rec["bytes_written"] = size(rec.pop("paths_out"))
+        rec["peak_rss_mb"] = rss["peak"]
+        rec["rss_delta_mb"] = (
+            None if rss["start"] is None else rss["peak"] - rss["start"]
+        )
+        rec["time"] = datetime.now().isoformat(timespec="seconds")
+        write(rec)
+
+
+# Stages of the watcher's worker threads finish concurrently
+write_lock = threading.Lock()
+
+
+def write(rec: dict):
+    if config["path"] is None:
+        return
+    line = json.dumps(rec, default=str) + "\n"
+    with write_lock:
+        config["path"].parent.mkdir(parents=True, exist_ok=True)
+        with open(config["path"], "a") as f:
+            f.write(line)
+
+
+def collect(lf: pl.LazyFrame) -> pl.DataFrame:
+    """Collect `lf`; with profiling on, add the query profile to the stage.
+
+    The profile is the total time in microseconds per node of the plan,
+    summed over all collects of the stage (e.g. the chunks of a day).
+    """
+    rec = current.get()
+    if not config["profile"] or rec is None:
+        return lf.collect()
+    df, prof = lf.profile()
+    us = dict(rec.get("profile") or [])
+    for node, t in (
+        prof.group_by("node").agg(pl.col("end").sub(pl.col("start")).sum()).rows()
+    ):
+        us[node] = us.get(node, 0) + t
+    rec["profile"] = sorted(us.items(), key=lambda r: r[1], reverse=True)
+    return df
+
+
+def summary(path: Path | str, top: int = 10) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Per-stage totals and the `top` slowest (stage, file) records."""
+    df = pl.read_ndjson(path, infer_schema_length=None)
+    mb = 1024 * 1024
+    per_stage = (
+        df.group_by("stage")
+        .agg(
+            pl.len().alias("n"),
+            pl.col("ok").not_().sum().alias("failed"),
+            pl.col("seconds").sum().alias("total_s"),
+            pl.col("seconds").mean().alias("mean_s"),
+            pl.col("seconds").max().alias("max_s"),
+            pl.col("rows_in").sum(),
+            pl.col("rows_out").sum(),
+            pl.col("bytes_read").sum().truediv(mb).alias("read_mb"),
+            pl.col("bytes_written").sum().truediv(mb).alias("written_mb"),
+            pl.col("peak_rss_mb").max(),
+            pl.col("rss_delta_mb").max(),
+        )
+        .sort("total_s", descending=True)
+    )
+    slowest = (
+        df.sort("seconds", descending=True)
+        .head(top)
+        .select(
+            "stage",
+            "file",
+            "seconds",
+            "rows_in",
+            "rows_out",
+            "peak_rss_mb",
+            "rss_delta_mb",
+        )
+    )
+    return per_stage, slowest
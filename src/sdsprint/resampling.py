@@ -0,0 +1,289 @@
+"""
+Resampling AIS data by (MMSI, time window).
+
+A resampling spec maps column names to an aggregation; columns not in the spec
+get the `default` aggregation. All aggregations are evaluated in a single
+`group_by_dynamic` pass.
+
+Days too large for memory are resampled in chunks of vessels (MMSI hash
+buckets) or of time windows; every (MMSI, window) group falls in exactly one
+chunk, so the result is identical to resampling the whole day.
+"""
+
+import math
+from pathlib import Path
+from typing import Literal
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from sdsprint import metrics, storage, vessels
+from sdsprint.ingest import proc_ais, ts_format
+
+Agg = Literal[
+    "first",
+    "last",
+    "first_non_null",
+    "last_non_null",
+    "mean",
+    "min",
+    "max",
+    "mode",
+    "count",
+]
+Spec = dict[str, Agg]
+
+# Current behaviour of the data sprint products: first non-null value of
+# every column in the window.
+bfill_spec: Spec = {}
+
+# Cheaper and more meaningful aggregates for the dynamic fields.
+position_spec: Spec = {
+    "Latitude": "last",
+    "Longitude": "last",
+    "SOG": "mean",
+    "COG": "last",
+    "Heading": "last",
+    "ROT": "mean",
+    "Navigational status": "mode",
+}
+
+specs: dict[str, Spec] = {"bfill": bfill_spec, "position": position_spec}
+
+Split = Literal["mmsi", "time"]
+# Rough peak memory of parsing and resampling a file relative to its
+# uncompressed size; compare with `rss_delta_mb` in the stage metrics to tune.
+mem_factor = 4.0
+
+
+def agg_expr(expr: pl.Expr, how: Agg, no_nulls: bool = False) -> pl.Expr:
+    """Aggregation `how` of `expr` within a group.
+
+    If the column(s) are known to have no nulls, the non-null variants skip
+    the fill and reduce to `first`/`last`.
+    """
+    match how:
+        case "first":
+            return expr.first()
+        case "last":
+            return expr.last()
+        case "first_non_null":
+            return expr.first() if no_nulls else expr.backward_fill().first()
+        case "last_non_null":
+            return expr.last() if no_nulls else expr.forward_fill().last()
+        case "mean":
+            return expr.mean()
+        case "min":
+            return expr.min()
+        case "max":
+            return expr.max()
+        case "mode":
+            # `mode` can return ties; sort for a deterministic pick
+            return expr.drop_nulls().mode().sort().first()
+        case "count":
+            return expr.count()
+        case _:
+            raise ValueError(f"Unknown aggregation `{how}`")
+
+
+def agg_exprs(
+    columns: list[str],
+    spec: Spec,
+    default: Agg = "first_non_null",
+    no_nulls: list[str] | None = None,
+) -> list[pl.Expr]:
+    """One expression per column; columns outside `spec` get `default`."""
+    no_nulls = set(no_nulls or [])
+    return [
+        agg_expr(pl.col(c), spec.get(c, default), no_nulls=c in no_nulls)
+        for c in columns
+    ]
+
+
+def null_free(df: pl.DataFrame | pl.LazyFrame) -> list[str]:
+    """Columns without nulls; cheap for a DataFrame, unknown for a LazyFrame.
+
+    For a scan of a parquet file use `file_null_free`.
+    """
+    if isinstance(df, pl.LazyFrame):
+        return []
+    counts = df.null_count().row(0, named=True)
+    return [c for c, n in counts.items() if n == 0]
+
+
+def file_null_free(file: Path | str) -> list[str]:
+    """Columns of a parquet file without nulls, from the footer statistics.
+
+    Columns without a null count in some row group are left out. The casts in
+    `proc_ais` are strict, so the result also holds after it.
+    """
+    md = pq.read_metadata(file)
+    counts = {}
+    for i in range(md.num_row_groups):
+        rg = md.row_group(i)
+        for j in range(rg.num_columns):
+            col, stats = rg.column(j), rg.column(j).statistics
+            n = stats.null_count if stats is not None and stats.has_null_count else None
+            prev = counts.get(col.path_in_schema, 0)
+            counts[col.path_in_schema] = None if prev is None or n is None else prev + n
+    return [c for c, n in counts.items() if n == 0]
+
+
+def resample_df(
+    df: pl.DataFrame | pl.LazyFrame,
+    every: str,
+    spec: Spec | None = None,
+    default: Agg = "first_non_null",
+    no_nulls: list[str] | None = None,
+    numobs: bool = False,
+):
+    """Resample by `# Timestamp` windows of size `every` per MMSI.
+
+    Defaults to backward-filling nans and keeping the first observation.
+    Columns in `no_nulls` (detected for an eager frame if not given; pass
+    `file_null_free` for a scan) skip the fill. If `numobs`, the number of
+    messages per window is added.
+    """
+    if no_nulls is None:
+        no_nulls = null_free(df)
+    keys = ["# Timestamp", "MMSI"]
+    exprs = agg_exprs(
+        [c for c in df.collect_schema().names() if c not in keys],
+        spec or bfill_spec,
+        default=default,
+        no_nulls=no_nulls,
+    )
+    if numobs:
+        exprs.append(pl.len().alias("numobs"))
+    return df.group_by_dynamic(
+        "# Timestamp",
+        every=every,
+        closed="left",
+        group_by="MMSI",
+        include_boundaries=False,
+    ).agg(exprs)
+
+
+def estimate_size(file: Path | str) -> int:
+    """Uncompressed size of a parquet file in bytes, from its footer."""
+    md = pq.read_metadata(file)
+    return sum(md.row_group(i).total_byte_size for i in range(md.num_row_groups))
+
+
+def n_chunks(file: Path | str, memory_budget: int | None) -> int:
+    """Number of chunks to resample `file` in within `memory_budget` bytes."""
+    if memory_budget is None:
+        return 1
+    return max(1, math.ceil(estimate_size(file) * mem_factor / memory_budget))
+
+
+def chunk_key(n: int, every: str, split: Split) -> pl.Expr:
+    """Chunk (0..n-1) of each raw row; a window of a vessel is never split.
+
+    Computed on the raw `MMSI` and `# Timestamp` columns, so a filter on it
+    is applied in the parquet scan, before `proc_ais`.
+    """
+    match split:
+        case "mmsi":
+            return pl.col("MMSI").hash(seed=0).mod(n)
+        case "time":
+            # Equal parts of the day by window start (windows are aligned as
+            # in `group_by_dynamic`), so whole windows go to a chunk
+            start = pl.col("# Timestamp").str.to_datetime(ts_format).dt.truncate(every)
+            seconds = (
+                start.dt.hour().cast(pl.Int64) * 3600
+                + start.dt.minute().cast(pl.Int64) * 60
+                + start.dt.second().cast(pl.Int64)
+            )
+            return seconds.mul(n).floordiv(24 * 3600)
+        case _:
+            raise ValueError(f"Unknown split `{split}`")
+
+
+def chunks(
+    file: Path | str, n: int, every: str, split: Split = "mmsi"
+) -> list[pl.LazyFrame]:
+    """Processed rows of `file` in `n` chunks (see `chunk_key`)."""
+    raw = pl.scan_parquet(file)
+    if n == 1:
+        return [raw.pipe(proc_ais)]
+    key = chunk_key(n, every, split)
+    return [raw.filter(key.eq(i)).pipe(proc_ais) for i in range(n)]
+
+
+def rs_df(
+    file: Path,
+    every: str,
+    spec: Spec | None = None,
+    memory_budget: int | None = None,
+    split: Split = "mmsi",
+    split_static: bool = False,
+) -> pl.DataFrame:
+    """Resample a daily raw file by backwards-filling nans.
+
+    The first observation is kept for each group (id, time) unless another
+    `spec` is given. With a `memory_budget` (bytes), files estimated not to
+    fit are resampled in chunks split by `split`. If `split_static`, the
+    static fields are dropped before resampling (see `vessels.vessel_dim`
+    for those). Columns without nulls in the footer statistics skip the
+    fill. The result is sorted by (timestamp, MMSI) either way.
+    """
+    no_nulls = file_null_free(file)
+    n = n_chunks(file, memory_budget)
+    if rec := metrics.current.get():
+        rec["chunks"] = n
+    parts = chunks(file, n, every, split)
+    if split_static:
+        parts = [vessels.positions(p) for p in parts]
+    return pl.concat(
+        part.pipe(resample_df, every=every, spec=spec, no_nulls=no_nulls).pipe(
+            metrics.collect
+        )
+        for part in parts
+    ).sort("# Timestamp", "MMSI")
+
+
+def resample_days(
+    days: list[pl.DataFrame],
+    every: str,
+    spec: Spec | None = None,
+) -> list[pl.DataFrame]:
+    """Resample each day and sort it by (timestamp, MMSI)."""
+    return [
+        d.pipe(resample_df, every=every, spec=spec).sort("# Timestamp", "MMSI")
+        for d in days
+    ]
+
+
+def final_products(
+    days: list[pl.DataFrame],
+    out_dir: Path,
+    name: str,
+    spec: Spec | None = None,
+    profiles: dict[str, storage.Profile] | None = None,
+    suffix: str = "",
+) -> dict[str, pl.DataFrame]:
+    """Write the 15m, 30m and 1h products from the 15m `days` in order.
+
+    Every day is sorted by (timestamp, MMSI) and 30m and 1h windows never
+    cross midnight, so resampling day by day gives sorted products without a
+    global sort. Products are written to `{name}-{every}{suffix}.parquet` in
+    `out_dir` with the write profile of `profiles` (default `default`).
+    """
+    profiles = profiles or {}
+    df = pl.concat(days, rechunk=False)
+    with metrics.stage("resample", file=f"{name}-30m", rows_in=df.height) as rec:
+        days30m = resample_days(days, every="30m", spec=spec)
+        df30m = pl.concat(days30m, rechunk=False)
+        rec["rows_out"] = df30m.height
+    with metrics.stage("resample", file=f"{name}-1h", rows_in=df30m.height) as rec:
+        df1h = pl.concat(resample_days(days30m, every="1h", spec=spec), rechunk=False)
+        rec["rows_out"] = df1h.height
+
+    products = {"15m": df, "30m": df30m, "1h": df1h}
+    for every, d in products.items():
+        f_out = Path(out_dir) / f"{name}-{every}{suffix}.parquet"
+        with metrics.stage("write", file=f_out.name, paths_out=[f_out]) as rec:
+            storage.write_parquet(d, f_out, profile=profiles.get(every, "default"))
+            rec["rows_in"] = d.height
+    return products
@@ -0,0 +1,269 @@
+"""
+Local query server keeping datasets hot.
+
+Every script starts cold: it imports polars and geopandas, opens the parquet
+footers and reads the shapefiles. The server does that once and answers
+queries over HTTP on localhost with results as Arrow IPC streams:
+
+    GET /datasets
+    GET /vessel?dataset=aisdk-2024-1h&mmsi=518998865
+    GET /window?dataset=aisdk-2024-1h&start=2024-01-01&end=2024-01-02
+        [&columns=MMSI,Latitude,Longitude][&region=dk]
+    GET /counts?dataset=aisdk-2024-1h&every=1d[&by=Type of mobile]
+        [&start=...][&end=...]
+
+Use `query` to get a polars DataFrame back.
+"""
+
+import functools
+import io
+import threading
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import polars as pl
+import pyarrow.parquet as pq
+from loguru import logger
+
+from sdsprint import storage
+
+ipc_mime = "application/vnd.apache.arrow.stream"
+
+
+class Dataset:
+    """A parquet product with its footer and row group indexes in memory.
+
+    The vessel index maps each MMSI to the row groups containing it and the
+    time index holds the timestamp range of each row group, so queries only
+    read the row groups they need through the parsed footer.
+    """
+
+    def __init__(self, file: Path):
+        self.file = Path(file)
+        self.name = self.file.stem
+        self.metadata = pq.read_metadata(self.file)
+        self.sorted_by = storage.sorted_by(self.file)
+        self.index = self._vessel_index()
+        self.time_index = self._time_index()
+
+    def _vessel_index(self) -> pl.DataFrame:
+        pf = self.parquet_file()
+        return pl.concat(
+            pl.from_arrow(pf.read_row_group(i, columns=["MMSI"]))
+            .unique()
+            .with_columns(pl.lit(i, dtype=pl.UInt32).alias("row_group"))
+            for i in range(self.metadata.num_row_groups)
+        )
+
+    def _time_index(self) -> list[tuple[datetime, datetime] | None]:
+        # (min, max) timestamp per row group; None without statistics
+        idx = self.metadata.schema.names.index("# Timestamp")
+        ranges = []
+        for i in range(self.metadata.num_row_groups):
+            stats = self.metadata.row_group(i).column(idx).statistics
+            ok = stats is not None and stats.has_min_max
+            ranges.append((stats.min, stats.max) if ok else None)
+        return ranges
+
+    def parquet_file(self) -> pq.ParquetFile:
+        # Reuse the parsed footer; a handle per request keeps reads thread-safe
+        return pq.ParquetFile(self.file, metadata=self.metadata)
+
+    def read(
+        self, row_groups: list[int], columns: list[str] | None = None
+    ) -> pl.DataFrame:
+        """Row groups of the file, with the sorted flag set from the metadata."""
+        table = self.parquet_file().read_row_groups(row_groups, columns=columns)
+        df = pl.from_arrow(table)
+        if self.sorted_by and self.sorted_by[0] in df.columns:
+            df = df.with_columns(pl.col(self.sorted_by[0]).set_sorted())
+        return df
+
+    def vessel(self, mmsi: str) -> pl.DataFrame:
+        rgs = self.index.filter(pl.col("MMSI").eq(mmsi))["row_group"].to_list()
+        return self.read(rgs).filter(pl.col("MMSI").eq(mmsi))
+
+    def window(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        columns: list[str] | None = None,
+    ) -> pl.DataFrame:
+        rgs = [
+            i
+            for i, r in enumerate(self.time_index)
+            if r is None
+            or ((start is None or r[1] >= start) and (end is None or r[0] < end))
+        ]
+        read = (
+            None if columns is None else list(dict.fromkeys(["# Timestamp", *columns]))
+        )
+        df = self.read(rgs, read)
+        if start is not None:
+            df = df.filter(pl.col("# Timestamp").ge(start))
+        if end is not None:
+            df = df.filter(pl.col("# Timestamp").lt(end))
+        return df.select(columns) if columns else df
+
+    def counts(
+        self,
+        every: str,
+        by: str | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> pl.DataFrame:
+        """Number of rows per window of `every` (and `by`)."""
+        df = self.window(start, end, ["# Timestamp"] + ([by] if by else []))
+        if self.sorted_by[:1] != ["# Timestamp"]:
+            df = df.sort("# Timestamp")
+        return df.group_by_dynamic(
+            "# Timestamp",
+            every=every,
+            closed="left",
+            include_boundaries=False,
+            group_by=by,
+        ).agg(pl.len())
+
+    def summary(self) -> dict:
+        return {
+            "dataset": self.name,
+            "file": str(self.file),
+            "rows": self.metadata.num_rows,
+            "row_groups": self.metadata.num_row_groups,
+            "vessels": self.index["MMSI"].n_unique(),
+            "sorted_by": ",".join(self.sorted_by),
+        }
+
+
+@functools.cache
+def danish_region():
+    """Prepared union of the Danish waters, in EPSG:25832."""
+    import shapely
+
+    from sdsprint import utils
+
+    region = utils.get_danish_waters().union_all()
+    shapely.prepare(region)
+    return region
+
+
+def in_danish_waters(df: pl.DataFrame) -> pl.DataFrame:
+    """Rows with positions inside the Danish waters."""
+    import shapely
+
+    from sdsprint import utils
+
+    # The transformer of the request thread; they are not thread-safe
+    to_dk = utils.transformer("EPSG:25832")
+    x, y = to_dk.transform(df["Longitude"].to_numpy(), df["Latitude"].to_numpy())
+    return df.filter(pl.Series(shapely.contains_xy(danish_region(), x, y)))
+
+
+class Server:
+    """Datasets and reference geometries shared by the request handlers."""
+
+    def __init__(self, files: list[Path], geometries: bool = True):
+        self.datasets = {}
+        for f in files:
+            ds = Dataset(f)
+            self.datasets[ds.name] = ds
+            logger.info(f"Loaded {ds.name}; {ds.summary()}")
+        if geometries:
+            self.warm_geometries()
+
+    def warm_geometries(self):
+        try:
+            danish_region()
+        # Geometries are optional for most queries: missing geo dependencies
+        # or shapefiles
+        except (ImportError, OSError, RuntimeError) as ex:
+            logger.info(f"Could not load geometries: {ex}")
+
+    def dataset(self, params: dict) -> Dataset:
+        name = params.get("dataset")
+        if name not in self.datasets:
+            raise KeyError(f"Unknown dataset `{name}`")
+        return self.datasets[name]
+
+    def handle(self, path: str, params: dict) -> pl.DataFrame:
+        start = params.get("start")
+        end = params.get("end")
+        start = datetime.fromisoformat(start) if start else None
+        end = datetime.fromisoformat(end) if end else None
+        match path:
+            case "/datasets":
+                return pl.DataFrame([ds.summary() for ds in self.datasets.values()])
+            case "/vessel":
+                return self.dataset(params).vessel(params["mmsi"])
+            case "/window":
+                columns = params["columns"].split(",") if "columns" in params else None
+                df = self.dataset(params).window(start, end, columns)
+                if params.get("region") == "dk":
+                    df = in_danish_waters(df)
+                return df
+            case "/counts":
+                return self.dataset(params).counts(
+                    params.get("every", "1d"), params.get("by"), start, end
+                )
+            case _:
+                raise KeyError(f"Unknown endpoint `{path}`")
+
+
+def make_handler(server: Server) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            params = dict(urllib.parse.parse_qsl(url.query))
+            try:
+                df = server.handle(url.path, params)
+            except KeyError as ex:
+                return self.send_error(404, str(ex))
+            # Bad parameters: dates, columns, durations
+            except (ValueError, pl.exceptions.PolarsError) as ex:
+                logger.exception(ex)
+                return self.send_error(400, str(ex))
+            buf = io.BytesIO()
+            df.write_ipc_stream(buf)
+            body = buf.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", ipc_mime)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.info(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+def serve(
+    files: list[Path],
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    geometries: bool = True,
+    block: bool = True,
+) -> ThreadingHTTPServer:
+    """Load the datasets and serve them; non-blocking runs in a thread."""
+    httpd = ThreadingHTTPServer((host, port), make_handler(Server(files, geometries)))
+    logger.info(f"Serving {len(files)} datasets on http://{host}:{port}")
+    if block:
+        httpd.serve_forever()
+    else:
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def query(
+    endpoint: str,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    **params,
+) -> pl.DataFrame:
+    """Query a running server, e.g. `query("vessel", dataset=..., mmsi=...)`."""
+    url = f"http://{host}:{port}/{endpoint}?{urllib.parse.urlencode(params)}"
+    with urllib.request.urlopen(url) as res:
+        return pl.read_ipc_stream(io.BytesIO(res.read()))
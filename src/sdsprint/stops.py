@@ -0,0 +1,161 @@
+"""
+Stop episode (port call, anchoring) detection.
+
+A position is stopped if `SOG` is at most `max_sog` knots, or if `SOG` is
+missing and the `Navigational status` is moored or at anchor. Consecutive
+stopped positions of a vessel, without a gap longer than `max_gap`, form an
+episode. Episodes are summarised by mergeable aggregates (counts, sums and
+bounding box), so time partitions are processed in parallel and episodes
+crossing a partition boundary are merged afterwards. Episodes shorter than
+`min_duration` or spread over more than `max_dispersion` meters (the bounding
+box diagonal, e.g. a slowly drifting vessel) are dropped.
+"""
+
+from pathlib import Path
+
+import polars as pl
+
+from sdsprint import storage
+from sdsprint.utils import haversine, map_partitions
+
+columns = ["MMSI", "# Timestamp", "Latitude", "Longitude", "SOG", "Navigational status"]
+stop_status = ["Moored", "At anchor"]
+
+
+def is_stopped(max_sog: float) -> pl.Expr:
+    sog = pl.when(pl.col("SOG").lt(102.3)).then(pl.col("SOG"))  # 102.3: n/a
+    status = pl.col("Navigational status").is_in(stop_status).fill_null(False)
+    return sog.le(max_sog).fill_null(status)
+
+
+def episodes(df: pl.DataFrame, max_sog: float = 0.5, max_gap: str = "2h"):
+    """Stop episodes in `df` as mergeable aggregates.
+
+    `open_start`/`open_end` mark episodes running from the first or to the
+    last position of the vessel in `df`; those may continue in neighbouring
+    partitions.
+    """
+    ts = pl.col("# Timestamp")
+    stopped = pl.col("stopped")
+    return (
+        df.select(columns)
+        .filter(pl.col("Latitude").abs().le(90), pl.col("Longitude").abs().le(180))
+        .sort("MMSI", "# Timestamp")
+        .with_columns(
+            is_stopped(max_sog).alias("stopped"),
+            pl.int_range(pl.len()).over("MMSI").eq(0).alias("first"),
+            pl.int_range(pl.len())
+            .over("MMSI")
+            .eq(pl.len().over("MMSI") - 1)
+            .alias("last"),
+        )
+        .with_columns(
+            (
+                stopped
+                & (
+                    ~stopped.shift().fill_null(False)
+                    | ts.gt(ts.shift().dt.offset_by(max_gap)).fill_null(True)
+                )
+            )
+            .cum_sum()
+            .over("MMSI")
+            .alias("episode")
+        )
+        .filter(stopped)
+        .group_by("MMSI", "episode")
+        .agg(
+            ts.min().alias("start"),
+            ts.max().alias("end"),
+            pl.len().alias("n"),
+            pl.col("Latitude").sum().alias("lat_sum"),
+            pl.col("Longitude").sum().alias("lon_sum"),
+            pl.col("Latitude").min().alias("lat_min"),
+            pl.col("Latitude").max().alias("lat_max"),
+            pl.col("Longitude").min().alias("lon_min"),
+            pl.col("Longitude").max().alias("lon_max"),
+            pl.col("Navigational status").eq("Moored").sum().alias("n_moored"),
+            pl.col("Navigational status").eq("At anchor").sum().alias("n_anchored"),
+            pl.col("first").any().alias("open_start"),
+            pl.col("last").any().alias("open_end"),
+        )
+        .drop("episode")
+    )
+
+
+def merge(eps: pl.DataFrame, max_gap: str = "2h") -> pl.DataFrame:
+    """Merge episodes continuing across partition boundaries."""
+    prev = pl.col("end").shift()
+    joined = (
+        pl.col("MMSI").eq(pl.col("MMSI").shift())
+        & pl.col("open_end").shift()
+        & pl.col("open_start")
+        & pl.col("start").le(prev.dt.offset_by(max_gap))
+    ).fill_null(False)
+    return (
+        eps.sort("MMSI", "start")
+        .with_columns((~joined).cum_sum().alias("episode"))
+        .group_by("MMSI", "episode")
+        .agg(
+            pl.col("start").min(),
+            pl.col("end").max(),
+            pl.col("n", "lat_sum", "lon_sum", "n_moored", "n_anchored").sum(),
+            pl.col("lat_min", "lon_min").min(),
+            pl.col("lat_max", "lon_max").max(),
+        )
+        .drop("episode")
+    )
+
+
+def summarise(eps: pl.DataFrame) -> pl.DataFrame:
+    """Episode table: MMSI, start, end, centroid, duration and status."""
+    return eps.select(
+        "MMSI",
+        "start",
+        "end",
+        pl.col("lat_sum").truediv(pl.col("n")).alias("Latitude"),
+        pl.col("lon_sum").truediv(pl.col("n")).alias("Longitude"),
+        pl.col("end").sub(pl.col("start")).alias("duration"),
+        "n",
+        haversine(
+            pl.col("lat_min"), pl.col("lon_min"), pl.col("lat_max"), pl.col("lon_max")
+        ).alias("dispersion"),
+        pl.when(pl.col("n_moored").mul(2).gt(pl.col("n")))
+        .then(pl.lit("moored"))
+        .when(pl.col("n_anchored").mul(2).gt(pl.col("n")))
+        .then(pl.lit("at anchor"))
+        .otherwise(pl.lit("stopped"))
+        .alias("status"),
+    )
+
+
+def stops(
+    source: Path | str | list[Path] | list[str] | pl.LazyFrame,
+    max_sog: float = 0.5,
+    max_gap: str = "2h",
+    min_duration: str = "30m",
+    max_dispersion: float = 1_000.0,
+    partition: str = "7d",
+    max_workers: int = 4,
+) -> pl.DataFrame:
+    """Stop episodes of all vessels, sorted by start.
+
+    Partitions are processed in parallel by `utils.map_partitions`.
+    """
+    lf = source if isinstance(source, pl.LazyFrame) else storage.scan(source)
+    lf = lf.select(columns)
+    eps = map_partitions(
+        lf,
+        lambda df, _: episodes(df, max_sog=max_sog, max_gap=max_gap),
+        partition,
+        max_workers,
+    )
+    return (
+        pl.concat(eps)
+        .pipe(merge, max_gap=max_gap)
+        .pipe(summarise)
+        .filter(
+            pl.col("start").dt.offset_by(min_duration).le(pl.col("end")),
+            pl.col("dispersion").le(max_dispersion),
+        )
+        .sort("start", "MMSI")
+    )
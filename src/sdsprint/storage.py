@@ -0,0 +1,249 @@
+"""
+Reading and writing parquet files with a recorded sort order.
+
+Writers sort (if needed) and record the sort order in the parquet key-value
+metadata and as parquet sorting columns. Readers set polars' sorted flag from
+that metadata, so e.g. `group_by_dynamic` does not need a sort first.
+
+Readers also take Arrow IPC files and use fresh copies in the hot cache
+(`sdsprint.cache`), both memory-mapped.
+
+Writers take a named write profile (codec, level, row group size, dictionary
+encoding and statistics); `sdsprint bench profiles` compares them.
+"""
+
+import json
+import tempfile
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Literal
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sdsprint import cache, metadata
+from sdsprint.metadata import file_sorted_by as file_sorted_by  # Re-exported
+from sdsprint.metadata import is_ipc, meta_key, sort_order, sorted_by
+
+Profile = Literal["default", "archive", "hot"]
+# String columns with a handful of values, the only ones `archive` keeps
+# dictionary encoded; zstd compresses the rest as well without the pages.
+categoricals = [
+    "Type of mobile",
+    "Navigational status",
+    "Ship type",
+    "Cargo type",
+    "Type of position fixing device",
+    "Data source type",
+]
+# pyarrow writer keywords per profile. `default` is what the writers used
+# before profiles; `archive` is the smallest file at a slow write; `hot` a
+# cheap decode and row groups small enough for fine-grained pruning. All keep
+# statistics on every column: they cost a fraction of a percent of the file,
+# and `utils.read_window` prunes and `resampling.file_null_free` reads null
+# counts with them.
+profiles: dict[str, dict] = {
+    "default": {"compression": "zstd"},
+    "archive": {
+        "compression": "zstd",
+        "compression_level": 19,
+        "row_group_size": 1024**2,
+        "use_dictionary": categoricals,
+    },
+    "hot": {"compression": "lz4", "row_group_size": 128 * 1024},
+}
+
+
+def write_options(profile: Profile = "default", **kwargs) -> dict:
+    """pyarrow writer keywords of `profile`, overridden by `kwargs`."""
+    if profile not in profiles:
+        raise ValueError(f"Unknown write profile `{profile}`")
+    return {**profiles[profile], **kwargs}
+
+
+def sink_options(profile: Profile = "default") -> dict | None:
+    """`LazyFrame.sink_parquet` keywords of `profile`.
+
+    None if polars cannot write it: its sinks always dictionary encode and
+    only switch statistics on or off for all columns.
+    """
+    opts = write_options(profile)
+    stats = opts.get("write_statistics", True)
+    if opts.get("use_dictionary", True) is not True or not isinstance(stats, bool):
+        return None
+    return {
+        "compression": opts["compression"],
+        "compression_level": opts.get("compression_level"),
+        "statistics": stats,
+        "row_group_size": opts.get("row_group_size"),
+    }
+
+
+def sink_parquet(lf: pl.LazyFrame, file: Path | str, profile: Profile = "default"):
+    """Stream `lf` to `file` with write profile `profile`.
+
+    Profiles polars cannot write (see `sink_options`) are sunk to a temporary
+    file first and rewritten by pyarrow one row group at a time, which costs
+    a second pass over the output.
+    """
+    if (opts := sink_options(profile)) is not None:
+        lf.sink_parquet(file, **opts)
+        return
+    file = Path(file)
+    # A hidden directory, so globs over the products never see the file
+    with tempfile.TemporaryDirectory(dir=file.parent, prefix=".") as tmp_dir:
+        tmp = Path(tmp_dir) / file.name
+        lf.sink_parquet(tmp, **sink_options("default"))
+        concat_parquet([tmp], file, profile=profile)
+
+
+def coalesce(tables: Iterable[pa.Table], size: int | None) -> Iterator[pa.Table]:
+    """`tables` regrouped into tables of `size` rows; the last may be shorter.
+
+    pyarrow only caps the row groups of each `write_table` call at the row
+    group size, so writing smaller tables one by one leaves small row groups.
+    `tables` must share a schema; they are passed on as is without a `size`.
+    """
+    if size is None:
+        yield from tables
+        return
+    buf, n = [], 0
+    for table in tables:
+        buf.append(table)
+        n += table.num_rows
+        if n >= size:
+            table = pa.concat_tables(buf)
+            full = n // size * size
+            yield table.slice(0, full)
+            buf, n = [table.slice(full)], n - full
+    if n:
+        yield pa.concat_tables(buf)
+
+
+def profile_map(values: list[str], outputs: list[str]) -> dict[str, Profile]:
+    """Profile per output from `PROFILE` (all outputs) or `OUTPUT=PROFILE`.
+
+    Later values win; outputs not given get `default`.
+    """
+    res = dict.fromkeys(outputs, "default")
+    for v in values:
+        output, _, profile = v.rpartition("=")
+        if profile not in profiles:
+            raise ValueError(f"Unknown write profile `{profile}`")
+        if output and output not in outputs:
+            raise ValueError(f"Unknown output `{output}`; one of {outputs}")
+        res.update({output: profile} if output else dict.fromkeys(outputs, profile))
+    return res
+
+
+def is_sorted(df: pl.DataFrame, by: list[str] | tuple[str, ...]) -> bool:
+    """Whether `df` is sorted ascending (lexicographically) by `by`.
+
+    Nulls come first, as in `DataFrame.sort`.
+    """
+    if df.height < 2:
+        return True
+    greater = pl.lit(False)
+    equal = pl.lit(True)
+    for c in by:
+        col, prev = pl.col(c), pl.col(c).shift()
+        gt = col.gt(prev).fill_null(col.is_not_null() & prev.is_null())
+        greater = greater | (equal & gt)
+        equal = equal & col.eq_missing(prev)
+    return df.select((greater | equal).slice(1).all()).item()
+
+
+def write_parquet(
+    df: pl.DataFrame,
+    file: Path | str,
+    sorted_by: list[str] | tuple[str, ...] = sort_order,
+    profile: Profile = "default",
+    **kwargs,
+):
+    """Write `df` sorted by `sorted_by` and record the order in the file.
+
+    `kwargs` override the pyarrow writer keywords of `profile`.
+    """
+    sorted_by = list(sorted_by)
+    if not is_sorted(df, sorted_by):
+        df = df.sort(sorted_by)
+    table = df.to_arrow()
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), meta_key: json.dumps(sorted_by)}
+    )
+    pq.write_table(
+        table,
+        file,
+        sorting_columns=pq.SortingColumn.from_ordering(
+            table.schema, [(c, "ascending") for c in sorted_by]
+        ),
+        **write_options(profile, **kwargs),
+    )
+
+
+def concat_parquet(
+    files: list[Path],
+    out: Path | str,
+    profile: Profile = "default",
+    **kwargs,
+):
+    """Concatenate parquet files into `out`, one row group in memory at a time.
+
+    The order that holds across `files` (see `sorted_by`) is recorded in
+    `out`. Row groups are coalesced to the row group size of `profile`, so
+    many small files still give full row groups. `out` is replaced
+    atomically, so readers never see a partial file. `kwargs` override the
+    pyarrow writer keywords of `profile`.
+    """
+    if not files:
+        return
+    order = sorted_by(files)
+    opts = write_options(profile, **kwargs)
+    row_group_size = opts.pop("row_group_size", None)  # Per write, not writer
+    first = pq.read_schema(files[0])
+    schema = first.with_metadata(
+        {**(first.metadata or {}), meta_key: json.dumps(order)}
+    )
+
+    def tables() -> Iterator[pa.Table]:
+        for f in files:
+            pf = pq.ParquetFile(f)
+            for i in range(pf.num_row_groups):
+                yield pf.read_row_group(i).cast(schema)
+
+    out = Path(out)
+    tmp = out.with_suffix(".tmp")
+    with pq.ParquetWriter(
+        tmp,
+        schema,
+        sorting_columns=pq.SortingColumn.from_ordering(
+            schema, [(c, "ascending") for c in order]
+        )
+        if order
+        else None,
+        **opts,
+    ) as writer:
+        for table in coalesce(tables(), row_group_size):
+            writer.write_table(table, row_group_size)
+    tmp.replace(out)
+
+
+def scan(
+    files: Path | str | list[Path] | list[str],
+    ensure_sorted: bool = False,
+    hot: bool = True,
+) -> pl.LazyFrame:
+    """Scan parquet or IPC file(s) with the sorted flag set from the metadata.
+
+    If `hot`, parquet files with a fresh full copy in the hot cache are read
+    from the copy instead; see `metadata.scan` for the flags. If
+    `ensure_sorted` and the recorded order does not start with `sort_order`,
+    we fall back to sorting by it.
+    """
+    files = files if isinstance(files, list) else [files]
+    if hot:
+        files = [f if is_ipc(f) else cache.lookup(f) or f for f in files]
+    if ensure_sorted and sorted_by(files)[: len(sort_order)] != list(sort_order):
+        return metadata.scan(files).sort(*sort_order)
+    return metadata.scan(files)
@@ -0,0 +1,251 @@
+"""
+Deterministic synthetic AIS data.
+
+Generates data with the exact schema of the data sprint products (see the
+README) at a configurable scale: vessels x days x messages per hour. Vessels
+sail a random walk kept inside Danish waters (a fraction of them lie still),
+and the data includes nulls, duplicate messages and gaps. `to_csv` and
+`write_zips` write it in the format of the raw files from
+http://web.ais.dk/aisdata/.
+"""
+
+import io
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+schema = pl.Schema(
+    {
+        "MMSI": pl.String,
+        "# Timestamp": pl.Datetime("us"),
+        "Type of mobile": pl.String,
+        "Latitude": pl.Float64,
+        "Longitude": pl.Float64,
+        "Navigational status": pl.String,
+        "ROT": pl.Float64,
+        "SOG": pl.Float64,
+        "COG": pl.Float64,
+        "Heading": pl.Float64,
+        "IMO": pl.String,
+        "Callsign": pl.String,
+        "Name": pl.String,
+        "Ship type": pl.String,
+        "Cargo type": pl.String,
+        "Width": pl.Float64,
+        "Length": pl.Float64,
+        "Type of position fixing device": pl.String,
+        "Draught": pl.Float64,
+        "Destination": pl.String,
+        "ETA": pl.Datetime("us"),
+        "Data source type": pl.String,
+        "A": pl.Float64,
+        "B": pl.Float64,
+        "C": pl.Float64,
+        "D": pl.Float64,
+    }
+)
+raw_format = "%d/%m/%Y %H:%M:%S"
+
+ship_types = ["Cargo", "Tanker", "Fishing", "Passenger", "Pleasure", "Tug"]
+destinations = ["AARHUS", "ESBJERG", "SKAGEN", "GOTEBORG", "ROSTOCK", "KIEL"]
+# Columns that may be missing in a message
+nullable = [
+    "ROT",
+    "Heading",
+    "IMO",
+    "Callsign",
+    "Name",
+    "Cargo type",
+    "Width",
+    "Length",
+    "Draught",
+    "Destination",
+    "ETA",
+    "A",
+    "B",
+    "C",
+    "D",
+]
+bbox = (7.5, 54.5, 15.5, 58.0)  # (lon, lat, lon, lat) of Danish waters
+meters_per_degree = 111_195.0
+knots = 1852 / 3600  # m/s
+
+
+def reflect(x: pl.Expr, lo: float, hi: float) -> pl.Expr:
+    """Fold `x` back into `[lo, hi]` as if bouncing off the edges."""
+    w = hi - lo
+    y = x.sub(lo).mod(2 * w)
+    return y.sub(w).abs().mul(-1).add(lo + w)
+
+
+def vessels(n: int, rng: np.random.Generator, start: datetime) -> pl.DataFrame:
+    """Static fields of `n` vessels."""
+    ids = np.arange(n)
+    a = rng.uniform(5, 200, n).round()
+    c = rng.uniform(2, 20, n).round()
+    return pl.DataFrame(
+        {
+            "MMSI": (219_000_000 + ids).astype(str),
+            "Type of mobile": np.where(rng.random(n) < 0.8, "Class A", "Class B"),
+            "IMO": (9_000_000 + ids).astype(str),
+            "Callsign": [f"OX{i:04d}" for i in ids],
+            "Name": [f"VESSEL {i}" for i in ids],
+            "Ship type": rng.choice(ship_types, n),
+            "Cargo type": [
+                "No additional information" if u < 0.5 else None for u in rng.random(n)
+            ],
+            "Width": c * 2,
+            "Length": a * 1.5,
+            "Type of position fixing device": "GPS",
+            "Draught": rng.uniform(2, 12, n).round(1),
+            "Destination": rng.choice(destinations, n),
+            "ETA": np.datetime64(start, "us")
+            + rng.integers(1, 10, n).astype("timedelta64[D]"),
+            "Data source type": "AIS",
+            "A": a,
+            "B": a / 2,
+            "C": c,
+            "D": c,
+            # Movement
+            "lat0": rng.uniform(54.8, 57.5, n),
+            "lon0": rng.uniform(8.0, 12.5, n),
+            "speed": np.where(rng.random(n) < 0.2, 0.0, rng.uniform(4, 18, n)),
+            "course": rng.uniform(0, 360, n),
+        }
+    )
+
+
+def generate(
+    n_vessels: int = 100,
+    days: int = 1,
+    rate: float = 60.0,
+    start: datetime = datetime(2024, 1, 1),
+    null_frac: float = 0.05,
+    dup_frac: float = 0.05,
+    gap_frac: float = 0.1,
+    seed: int = 0,
+) -> pl.DataFrame:
+    """Synthetic AIS messages sorted by time.
+
+    `rate` is the mean number of messages per vessel and hour. A fraction
+    `gap_frac` of the vessels go silent for 1-6 hours, `null_frac` of the
+    values in the nullable columns are missing and `dup_frac` of the messages
+    are received twice.
+    """
+    rng = np.random.default_rng(seed)
+    ships = vessels(n_vessels, rng, start)
+    seconds = days * 86_400
+    counts = rng.poisson(rate * 24 * days, n_vessels)
+    idx = np.repeat(np.arange(n_vessels), counts)
+    t = rng.integers(0, seconds, idx.size)
+
+    # Gaps
+    gap = rng.random(n_vessels) < gap_frac
+    gap_start = rng.integers(0, seconds, n_vessels)
+    gap_len = rng.integers(3_600, 6 * 3_600, n_vessels)
+    keep = ~(gap[idx] & (t >= gap_start[idx]) & (t < gap_start[idx] + gap_len[idx]))
+    idx, t = idx[keep], t[keep]
+
+    df = (
+        pl.DataFrame({"i": idx, "t": t})
+        .sort("i", "t")
+        .join(ships.with_row_index("i").cast({"i": pl.Int64}), on="i")
+        .with_columns(
+            pl.Series("_turn", rng.normal(0, 2, idx.size)),
+            pl.Series("_speed", rng.uniform(0.9, 1.1, idx.size)),
+            pl.Series("ROT", rng.normal(0, 5, idx.size)).round(),
+        )
+        .with_columns(
+            pl.col("course")
+            .add(pl.col("_turn").cum_sum().over("i"))
+            .mod(360)
+            .alias("COG"),
+            pl.col("speed").mul(pl.col("_speed")).alias("SOG"),
+        )
+        .with_columns(
+            # Meters moved since the previous message
+            pl.col("t")
+            .diff()
+            .fill_null(0)
+            .over("i")
+            .mul(pl.col("SOG") * knots)
+            .alias("_dist"),
+        )
+        .with_columns(
+            pl.col("lat0")
+            .add(
+                pl.col("_dist")
+                .mul(pl.col("COG").radians().cos())
+                .truediv(meters_per_degree)
+                .cum_sum()
+                .over("i")
+            )
+            .alias("Latitude"),
+            pl.col("lon0")
+            .add(
+                pl.col("_dist")
+                .mul(pl.col("COG").radians().sin())
+                .truediv(meters_per_degree * pl.col("lat0").radians().cos())
+                .cum_sum()
+                .over("i")
+            )
+            .alias("Longitude"),
+            (
+                pl.lit(start, dtype=pl.Datetime("us"))
+                + pl.duration(seconds=pl.col("t"))
+            ).alias("# Timestamp"),
+            pl.when(pl.col("speed").eq(0))
+            .then(pl.lit("Moored"))
+            .otherwise(pl.lit("Under way using engine"))
+            .alias("Navigational status"),
+        )
+        .with_columns(
+            pl.col("SOG").round(1),
+            pl.col("COG").round(1),
+            pl.col("COG").round().alias("Heading"),
+            reflect(pl.col("Latitude"), *bbox[1::2]).round(6),
+            reflect(pl.col("Longitude"), *bbox[::2]).round(6),
+        )
+    )
+
+    # Nulls
+    df = df.with_columns(
+        pl.when(pl.Series(rng.random(df.height) < null_frac))
+        .then(None)
+        .otherwise(pl.col(c))
+        .alias(c)
+        for c in nullable
+    )
+
+    # Duplicates
+    dups = df.filter(pl.Series(rng.random(df.height) < dup_frac))
+    return pl.concat([df, dups]).sort("# Timestamp", "MMSI").select(schema.names())
+
+
+def to_csv(df: pl.DataFrame, file: Path | str | io.BytesIO):
+    """Write in the format of the raw csv files."""
+    df.with_columns(
+        pl.col("# Timestamp").dt.strftime(raw_format),
+        pl.col("ETA").dt.strftime(raw_format),
+        pl.col("MMSI").cast(pl.Int64),
+    ).write_csv(file)
+
+
+def write_zips(df: pl.DataFrame, out_dir: Path) -> list[Path]:
+    """One `aisdk-YYYY-MM-DD.zip` holding the day's csv file per day."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for (day,), part in df.group_by(
+        pl.col("# Timestamp").dt.date().alias("day"), maintain_order=True
+    ):
+        name = f"aisdk-{day}"
+        buf = io.BytesIO()
+        to_csv(part, buf)
+        f = out_dir / f"{name}.zip"
+        with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            z.writestr(f"{name}.csv", buf.getvalue())
+        files.append(f)
+    return files
@@ -1,10 +1,24 @@
+import functools
 import json
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
-import geopandas as gpd
 import polars as pl
-from shapely.geometry import Point
+import pyarrow.parquet as pq
+
+from sdsprint import resampling, storage, vessels
+
+# Geo and plotting dependencies are slow to import; only import them in the
+# functions that need them.
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+# Downloaded from: https://simplemaps.com/gis/country/dk#all
+fp_dk_shape = "data/geom/dk-shape2/dk.shp"
 
 eagle_mmsi = "518998865"
 eagle_imo = "9329760"
@@ -12,7 +26,7 @@ eagle_imo = "9329760"
 
 def read_ships(file: str | list[str]):
     return (
-        pl.scan_parquet(file)
+        storage.scan(file)
         .collect()
         .select(
             "MMSI",
@@ -23,10 +37,21 @@ def read_ships(file: str | list[str]):
     )
 
 
-def read_eagle(file: str | list[str]):
+def read_eagle(file: str | list[str], vessel_table: str | Path | None = None):
+    """Positions of Eagle, found by MMSI or IMO.
+
+    Position-only products (`-pos`) have no IMO; pass their vessel table
+    (`aisdk-{year}-vessels.parquet`) as `vessel_table` to join it first.
+    """
+    lf = storage.scan(file)
+    if vessel_table is not None:
+        lf = vessels.join_static(lf, storage.scan(vessel_table), columns=["IMO"])
+    elif "IMO" not in lf.collect_schema():
+        raise ValueError(
+            "No IMO in the product; pass the vessel table of a position-only product"
+        )
     return (
-        pl.scan_parquet(file)
-        .filter(pl.col("MMSI").eq(eagle_mmsi).or_(pl.col("IMO").eq(eagle_imo)))
+        lf.filter(pl.col("MMSI").eq(eagle_mmsi).or_(pl.col("IMO").eq(eagle_imo)))
         .collect()
         .select(
             "MMSI",
@@ -37,13 +62,217 @@ def read_eagle(file: str | list[str]):
     )
 
 
+# (min lon, min lat, max lon, max lat) in degrees
+BBox = tuple[float, float, float, float]
+
+
+def _stats_range(rg: pq.RowGroupMetaData, idx: int | None):
+    """(min, max) of a column in a row group; None if unknown."""
+    if idx is None:
+        return None
+    stats = rg.column(idx).statistics
+    if stats is None or not stats.has_min_max:
+        return None
+    return stats.min, stats.max
+
+
+def row_groups(
+    files: Path | str | list[Path] | list[str],
+    start: datetime | None = None,
+    end: datetime | None = None,
+    bbox: BBox | None = None,
+) -> pl.DataFrame:
+    """Row groups of parquet files and whether they can hold rows in the window.
+
+    Uses the row group statistics on `# Timestamp`, `Latitude` and
+    `Longitude`; row groups without statistics are kept.
+    """
+    files = files if isinstance(files, list) else [files]
+    bounds = {"# Timestamp": (start, end)}
+    if bbox is not None:
+        bounds["Longitude"] = (bbox[0], bbox[2])
+        bounds["Latitude"] = (bbox[1], bbox[3])
+    rows = []
+    for f in files:
+        md = pq.read_metadata(f)
+        names = md.schema.names
+        idx = {c: names.index(c) if c in names else None for c in bounds}
+        for i in range(md.num_row_groups):
+            rg = md.row_group(i)
+            keep = True
+            for c, (lo, hi) in bounds.items():
+                rng = _stats_range(rg, idx[c])
+                if rng is None:
+                    continue
+                # `end` is exclusive, the bbox is closed
+                if lo is not None and rng[1] < lo:
+                    keep = False
+                if hi is not None and (
+                    rng[0] >= hi if c == "# Timestamp" else rng[0] > hi
+                ):
+                    keep = False
+            rows.append(
+                {
+                    "file": str(f),
+                    "row_group": i,
+                    "rows": rg.num_rows,
+                    "bytes": sum(
+                        rg.column(j).total_compressed_size
+                        for j in range(rg.num_columns)
+                    ),
+                    "keep": keep,
+                }
+            )
+    return pl.DataFrame(
+        rows,
+        schema={
+            "file": pl.String,
+            "row_group": pl.Int64,
+            "rows": pl.Int64,
+            "bytes": pl.Int64,
+            "keep": pl.Boolean,
+        },
+    )
+
+
+def read_window(
+    files: Path | str | list[Path] | list[str],
+    start: datetime | None = None,
+    end: datetime | None = None,
+    bbox: BBox | None = None,
+    columns: list[str] | None = None,
+    report: bool = False,
+):
+    """Rows with `start <= # Timestamp < end` and positions inside `bbox`.
+
+    Only the row groups whose statistics overlap the window are read, which
+    pays off on the time-sorted products. With `report`, also returns the
+    number of row groups and bytes (compressed) read and skipped.
+    """
+    rgs = row_groups(files, start, end, bbox)
+    kept = rgs.filter("keep")
+    cond = pl.lit(True)
+    if start is not None:
+        cond &= pl.col("# Timestamp").ge(start)
+    if end is not None:
+        cond &= pl.col("# Timestamp").lt(end)
+    if bbox is not None:
+        cond &= pl.col("Longitude").is_between(bbox[0], bbox[2])
+        cond &= pl.col("Latitude").is_between(bbox[1], bbox[3])
+    needed = None
+    if columns is not None:
+        needed = list(dict.fromkeys([*columns, *cond.meta.root_names()]))
+
+    parts = [
+        pl.from_arrow(pq.ParquetFile(f).read_row_groups(g["row_group"], columns=needed))
+        for (f,), g in kept.group_by("file", maintain_order=True)
+    ]
+    if parts:
+        df = pl.concat(parts).filter(cond)
+    else:
+        df = storage.scan(rgs["file"].unique(maintain_order=True).to_list(), hot=False)
+        df = df.head(0).collect()
+    if columns is not None:
+        df = df.select(columns)
+    if not report:
+        return df
+    return df, {
+        "row_groups": rgs.height,
+        "row_groups_read": kept.height,
+        "row_groups_skipped": rgs.height - kept.height,
+        "bytes_read": kept["bytes"].sum(),
+        "bytes_skipped": rgs["bytes"].sum() - kept["bytes"].sum(),
+    }
+
+
+earth_radius = 6_371_008.8  # Mean earth radius in meters
+
+
+def haversine(lat1: pl.Expr, lon1: pl.Expr, lat2: pl.Expr, lon2: pl.Expr) -> pl.Expr:
+    """Great-circle distance in meters between two positions in degrees."""
+    lat1, lon1, lat2, lon2 = (e.radians() for e in (lat1, lon1, lat2, lon2))
+    a = (lat2 - lat1).truediv(2).sin().pow(2) + lat1.cos() * lat2.cos() * (
+        lon2 - lon1
+    ).truediv(2).sin().pow(2)
+    # Rounding can push `a` just outside [0, 1] for (near) antipodal points
+    return a.clip(0, 1).sqrt().arcsin().mul(2 * earth_radius)
+
+
+def bearing(lat1: pl.Expr, lon1: pl.Expr, lat2: pl.Expr, lon2: pl.Expr) -> pl.Expr:
+    """Initial great-circle course in degrees [0, 360) from 1 to 2."""
+    lat1, lon1, lat2, lon2 = (e.radians() for e in (lat1, lon1, lat2, lon2))
+    y = (lon2 - lon1).sin() * lat2.cos()
+    x = lat1.cos() * lat2.sin() - lat1.sin() * lat2.cos() * (lon2 - lon1).cos()
+    return pl.arctan2(y, x).degrees().mod(360)
+
+
+def partitions(lf: pl.LazyFrame, partition: str) -> list[tuple[datetime, datetime]]:
+    """Time partitions `[start, end)` of size `partition` covering `lf`."""
+    lo, hi = (
+        lf.select(
+            pl.col("# Timestamp").min().dt.truncate(partition).alias("lo"),
+            pl.col("# Timestamp").max().alias("hi"),
+        )
+        .collect()
+        .row(0)
+    )
+    if lo is None:
+        return []
+    starts = pl.datetime_range(lo, hi, partition, eager=True)
+    return list(zip(starts.to_list(), starts.dt.offset_by(partition).to_list()))
+
+
+def map_partitions(
+    lf: pl.LazyFrame,
+    fn: Callable,
+    partition: str,
+    max_workers: int = 4,
+    lookback: str | None = None,
+) -> list:
+    """Results of `fn(df, start)` for the time partitions of `lf`, in order.
+
+    `df` holds the positions of the partition `[start, end)`, and of the
+    `lookback` before it if given. Partitions of size `partition` are
+    processed by `max_workers` threads; memory is bounded by the positions of
+    `max_workers` partitions. An empty `lf` gives one call on an empty frame,
+    so results can still be concatenated.
+    """
+    ts = pl.col("# Timestamp")
+
+    def run(bounds: tuple[datetime, datetime]):
+        start, end = bounds
+        lo = start
+        if lookback:
+            lo = pl.Series([start]).dt.offset_by(f"-{lookback}").item()
+        return fn(lf.filter(ts.is_between(lo, end, closed="left")).collect(), start)
+
+    bounds = partitions(lf, partition)
+    if not bounds:
+        return [fn(lf.head(0).collect(), datetime.min)]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(run, bounds))
+
+
 dk_csrs = Literal["EPSG:25832", "EPSG:25833"]
+_local = threading.local()
+
+
+def transformer(csr: dk_csrs):
+    """WGS84 to `csr`; one per thread as transformers are not thread-safe."""
+    from pyproj import Transformer
+
+    cache = _local.__dict__.setdefault("transformers", {})
+    if csr not in cache:
+        cache[csr] = Transformer.from_crs("EPSG:4326", csr, always_xy=True)
+    return cache[csr]
 
 
 def to_gdf(df: pl.DataFrame, csr: dk_csrs = "EPSG:25832"):
+    import geopandas as gpd
+
     # Convert to GeoDataFrame
-    geometry = [Point(xy) for xy in zip(df["Longitude"], df["Latitude"])]
-    gdf = gpd.GeoDataFrame(df, geometry=geometry)
+    geometry = gpd.points_from_xy(df["Longitude"], df["Latitude"])
+    gdf = gpd.GeoDataFrame(df.to_pandas(), geometry=geometry)
     gdf = gdf.set_crs("EPSG:4326")  # WGS84 first
     gdf = gdf.to_crs(csr)  # Convert to Danish projection
     if not isinstance(gdf, gpd.GeoDataFrame):
@@ -56,14 +285,20 @@ def resample(
     index_col: str,
     every: str,
     group_by: str,
+    spec: resampling.Spec | None = None,
+    default: resampling.Agg = "first",
 ):
+    columns = [c for c in df.columns if c not in (index_col, group_by)]
     return df.group_by_dynamic(
         index_col,
         every=every,
         closed="left",
         group_by=group_by,
         include_boundaries=False,
-    ).agg(pl.all().first(), pl.len().alias("numobs"))
+    ).agg(
+        *resampling.agg_exprs(columns, spec or {}, default=default),
+        pl.len().alias("numobs"),
+    )
 
 
 def despine(ax):
@@ -75,14 +310,25 @@ def despine(ax):
     ax.tick_params(left=False, bottom=False, labelleft=False, labelbottom=False)
 
 
+@functools.cache
+def get_danish_waters(csr: dk_csrs = "EPSG:25832") -> "gpd.GeoDataFrame":
+    """Danish waters; read once per process and csr."""
+    import geopandas as gpd
+
+    danish_waters = gpd.read_file(fp_dk_shape)
+    return danish_waters.to_crs(csr)
+
+
+@functools.cache
 def get_cables():
+    import geopandas as gpd
+
     # https://www.submarinecablemap.com/api/v3/cable/cable-geo.json
     csr = "EPSG:25832"
     cables = gpd.read_file("data/geom/cable-geo.json")
     cables = cables.to_crs(csr)
     cables = cables[cables.geometry.is_valid]
-    danish_waters = gpd.read_file("data/geom/dk-shape2/dk.shp")
-    danish_waters = danish_waters.to_crs(csr)
+    danish_waters = get_danish_waters(csr)
 
     # spatial join cables + Danish waters
     return gpd.sjoin(cables, danish_waters, how="inner", predicate="intersects")
@@ -91,15 +337,14 @@ def get_cables():
 def plot_trace(
     df: pl.DataFrame,
     suffix: str,
-    cables: gpd.GeoDataFrame | None = None,
+    cables: "gpd.GeoDataFrame | None" = None,
     save: bool = True,
     title: str | None = None,
 ):
-    gdf = to_gdf(df)
+    import geopandas as gpd
 
-    # Downloaded from: https://simplemaps.com/gis/country/dk#all
-    danish_waters = gpd.read_file("data/geom/dk-shape2/dk.shp")
-    danish_waters = danish_waters.to_crs("EPSG:25832")
+    gdf = to_gdf(df)
+    danish_waters = get_danish_waters()
 
     # Plot geometry
     ax = danish_waters.plot(figsize=(8, 8), color="lightblue")
@@ -138,10 +383,7 @@ def plot_activity(
     **kwargs,
 ):
     gdf = to_gdf(df)
-
-    # Downloaded from: https://simplemaps.com/gis/country/dk#all
-    danish_waters = gpd.read_file("data/geom/dk-shape2/dk.shp")
-    danish_waters = danish_waters.to_crs("EPSG:25832")
+    danish_waters = get_danish_waters()
 
     # Plot geometry
     ax = danish_waters.plot(figsize=(8, 8), color="lightblue")
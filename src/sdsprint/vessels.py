@@ -0,0 +1,131 @@
+"""
+Vessel dimension table.
+
+Static and voyage fields are repeated on every AIS position row. We split them
+into a slowly-changing dimension table keyed by MMSI with validity intervals
+and keep a narrow position table; join back with `join_static` when needed.
+"""
+
+import polars as pl
+
+static_cols = [
+    "IMO",
+    "Callsign",
+    "Name",
+    "Ship type",
+    "Cargo type",
+    "Width",
+    "Length",
+    "A",
+    "B",
+    "C",
+    "D",
+    "Destination",
+    "ETA",
+]
+
+
+# A static field is carried forward at most this long after its last report
+fill_window = "1d"
+
+
+def versions(lf: pl.LazyFrame, ts: str) -> pl.LazyFrame:
+    """Rows starting a version: the MMSI or a static field changed.
+
+    `lf` is sorted by (MMSI, `ts`); `ts` becomes `valid_from` and the start
+    of the next version of the MMSI `valid_to`.
+    """
+    return (
+        lf.filter(
+            pl.any_horizontal(
+                [pl.col(c).ne_missing(pl.col(c).shift()) for c in static_cols]
+            ).or_(pl.col("MMSI").ne_missing(pl.col("MMSI").shift()))
+        )
+        .rename({ts: "valid_from"})
+        .with_columns(
+            pl.col("valid_from").shift(-1).over("MMSI").alias("valid_to"),
+        )
+        .select("MMSI", "valid_from", "valid_to", *static_cols)
+    )
+
+
+def vessel_dim(
+    df: pl.LazyFrame | pl.DataFrame, window: str | None = fill_window
+) -> pl.LazyFrame:
+    """Slowly-changing vessel table with one row per (MMSI, version).
+
+    Rows reporting none of the static fields are skipped. Each field is
+    forward-filled per MMSI for at most `window` (`None`: indefinitely) after
+    it was last reported, and never backwards, so no value is attributed to a
+    time before it was reported. A new version starts whenever the MMSI or
+    any of the fields changes. A version is valid on `[valid_from,
+    valid_to)`; the current version has a null `valid_to`.
+    """
+    ts = pl.col("# Timestamp")
+
+    def fill(c: str) -> pl.Expr:
+        filled = pl.col(c).forward_fill().over("MMSI")
+        if window is None:
+            return filled.alias(c)
+        last = pl.when(pl.col(c).is_not_null()).then(ts).forward_fill().over("MMSI")
+        return pl.when(ts.le(last.dt.offset_by(window))).then(filled).alias(c)
+
+    return (
+        df.lazy()
+        .select("MMSI", "# Timestamp", *static_cols)
+        .filter(pl.any_horizontal(pl.col(static_cols).is_not_null()))
+        .sort("MMSI", "# Timestamp")
+        .with_columns(fill(c) for c in static_cols)
+        .pipe(versions, ts="# Timestamp")
+    )
+
+
+def merge_dims(dims: list[pl.LazyFrame | pl.DataFrame]) -> pl.LazyFrame:
+    """Vessel table of consecutive periods (e.g. days) from their tables.
+
+    A version repeating the last version of the previous period is merged
+    into it. Fields are not carried forward across periods.
+    """
+    return (
+        pl.concat([d.lazy() for d in dims])
+        .select("MMSI", "valid_from", *static_cols)
+        .sort("MMSI", "valid_from")
+        .pipe(versions, ts="valid_from")
+    )
+
+
+def positions(df: pl.LazyFrame | pl.DataFrame) -> pl.LazyFrame:
+    """Narrow position table; everything but the static fields."""
+    return df.lazy().drop(static_cols, strict=False)
+
+
+def split_static(
+    df: pl.LazyFrame | pl.DataFrame,
+) -> tuple[pl.LazyFrame, pl.LazyFrame]:
+    """Split AIS rows into (vessel dimension, position fact) tables."""
+    return vessel_dim(df), positions(df)
+
+
+def join_static(
+    pos: pl.LazyFrame | pl.DataFrame,
+    dim: pl.LazyFrame | pl.DataFrame,
+    columns: list[str] | None = None,
+) -> pl.LazyFrame:
+    """Attach the vessel version valid at each position's timestamp.
+
+    Rows before the first version of a vessel (only possible when `pos` and
+    `dim` come from different sources) get nulls.
+    """
+    columns = columns or static_cols
+    return (
+        pos.lazy()
+        .sort("# Timestamp")
+        .join_asof(
+            dim.lazy().select("MMSI", "valid_from", *columns).sort("valid_from"),
+            left_on="# Timestamp",
+            right_on="valid_from",
+            by="MMSI",
+            strategy="backward",
+        )
+        .drop("valid_from")
+    )
@@ -0,0 +1,184 @@
+"""
+Incremental ingest of new daily zip files.
+
+`Watcher` polls a directory (e.g. `AIS_DK`) for daily `aisdk-YYYY-MM-DD.zip`
+files (monthly archives are left alone). Each new archive is ingested and
+resampled once it is complete, and the monthly products of its month are
+rebuilt from the daily parts. Output layout:
+
+    out/raw/{year}/aisdk-{day}.parquet             # Deduplicated raw messages
+    out/raw/{year}/quarantine/aisdk-{day}.parquet  # Rejected lines
+    out/proc/{year}/{every}/aisdk-{day}.parquet    # Resampled day
+    out/aisdk-{month}-{every}.parquet              # Monthly products
+
+A new day only rewrites its month, so a poll costs at most a month of parts.
+The year is the monthly products scanned together, which keep the order:
+
+    storage.scan(w.products("2024", "1h"))
+
+Days are done when their last part exists, so restarting picks up where it
+stopped. Days are processed in a bounded thread pool; the products are only
+rebuilt once per poll. Raw files, parts and products are written
+with their own write profile (see `storage.profiles`).
+"""
+
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import polars as pl
+from loguru import logger
+
+from sdsprint import ingest, metrics, resampling, storage
+
+everys = ["15m", "30m", "1h"]
+outputs = ["raw", "parts", "products"]
+daily = re.compile(r"aisdk-(\d{4}-\d{2}-\d{2})\.zip")
+# What ingesting a bad or vanished zip raises; anything else is a bug
+errors = (OSError, ValueError, zipfile.BadZipFile, pl.exceptions.PolarsError)
+
+
+def is_complete(zip_path: Path, settle: float) -> bool:
+    """Not modified for `settle` seconds and with a readable zip directory.
+
+    The central directory is at the end of a zip file, so a file still being
+    copied does not open. A file removed meanwhile is not complete either.
+    """
+    try:
+        if time.time() - zip_path.stat().st_mtime < settle:
+            return False
+        with zipfile.ZipFile(zip_path) as z:
+            return any(n.endswith(".csv") for n in z.namelist())
+    except (zipfile.BadZipFile, FileNotFoundError):
+        return False
+
+
+class Watcher:
+    """Ingests and resamples the zip files appearing in `src` into `out`."""
+
+    def __init__(
+        self,
+        src: Path,
+        out: Path,
+        max_workers: int = 2,
+        keys: list[str] | None = ingest.dedup_keys,
+        spec: resampling.Spec | None = None,
+        memory_budget: int | None = None,
+        settle: float = 10.0,
+        tolerant: bool = True,
+        profiles: dict[str, storage.Profile] | None = None,
+    ):
+        self.src = Path(src)
+        self.out = Path(out)
+        self.max_workers = max_workers
+        self.keys = keys
+        self.spec = spec
+        self.memory_budget = memory_budget
+        self.settle = settle
+        self.tolerant = tolerant
+        self.profiles = {**dict.fromkeys(outputs, "default"), **(profiles or {})}
+        self.failed: dict[Path, float] = {}  # Retried if modified again
+
+    def part(self, day: str, every: str) -> Path:
+        return self.out / "proc" / day[:4] / every / f"aisdk-{day}.parquet"
+
+    def product(self, month: str, every: str) -> Path:
+        return self.out / f"aisdk-{month}-{every}.parquet"
+
+    def products(self, year: str, every: str) -> list[Path]:
+        """Monthly products of `year` in time order."""
+        return sorted(self.out.glob(f"aisdk-{year}-??-{every}.parquet"))
+
+    def pending(self) -> list[Path]:
+        """Complete daily zip files whose day has not been processed."""
+        files = []
+        zips = (f for f in self.src.rglob("aisdk-*.zip") if daily.fullmatch(f.name))
+        for f in sorted(zips, key=lambda f: f.name):
+            day = f.stem.removeprefix("aisdk-")
+            if self.part(day, everys[-1]).exists():
+                continue
+            try:
+                if self.failed.get(f) == f.stat().st_mtime:
+                    continue
+            except FileNotFoundError:  # Removed since the listing
+                self.failed.pop(f, None)
+                continue
+            if is_complete(f, self.settle):
+                files.append(f)
+        return files
+
+    def process(self, zip_path: Path) -> str:
+        """Ingest and resample a day; returns the day."""
+        day = zip_path.stem.removeprefix("aisdk-")
+        raw_dir = self.out / "raw" / day[:4]
+        raw_dir.mkdir(parents=True, exist_ok=True)
+        ingest.proc_zip(
+            zip_path,
+            raw_dir,
+            keys=self.keys,
+            tolerant=self.tolerant,
+            profile=self.profiles["raw"],
+        )
+        raw = raw_dir / f"aisdk-{day}.parquet"
+
+        with metrics.stage("resample", file=raw.name, paths_in=[raw]) as rec:
+            df = resampling.rs_df(
+                raw, every=everys[0], spec=self.spec, memory_budget=self.memory_budget
+            )
+            rec["rows_out"] = df.height
+        for i, every in enumerate(everys):
+            if i > 0:
+                df = resampling.resample_days([df], every=every, spec=self.spec)[0]
+            f = self.part(day, every)
+            f.parent.mkdir(parents=True, exist_ok=True)
+            # The last part marks the day as done, so write parts atomically
+            tmp = f.with_suffix(".tmp")
+            storage.write_parquet(df, tmp, profile=self.profiles["parts"])
+            tmp.replace(f)
+        logger.info(f"Processed {zip_path.name}")
+        return day
+
+    def update_products(self, month: str):
+        """Rebuild the monthly products of `month` from its daily parts."""
+        for every in everys:
+            parent = self.part(f"{month}-01", every).parent
+            parts = sorted(parent.glob(f"aisdk-{month}-??.parquet"))
+            f = self.product(month, every)
+            with metrics.stage("product", file=f.name, paths_out=[f]) as rec:
+                storage.concat_parquet(parts, f, profile=self.profiles["products"])
+                rec["rows_in"] = len(parts)
+            logger.info(f"Updated {f} from {len(parts)} days")
+
+    def poll(self) -> list[str]:
+        """Process all pending zip files and update their monthly products."""
+        files = self.pending()
+        if not files:
+            return []
+        logger.info(f"Processing {len(files)} new zip files")
+        days = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {f: pool.submit(self.process, f) for f in files}
+            for f, fut in futures.items():
+                try:
+                    days.append(fut.result())
+                except errors as ex:
+                    logger.info(f"Failed processing {f}")
+                    logger.exception(ex)
+                    try:
+                        self.failed[f] = f.stat().st_mtime
+                    except FileNotFoundError:  # Retried if it comes back
+                        self.failed.pop(f, None)
+        for month in sorted({d[:7] for d in days}):
+            self.update_products(month)
+        return days
+
+    def run(self, interval: float = 60.0, stop: threading.Event | None = None):
+        """Poll every `interval` seconds until `stop` is set."""
+        stop = stop or threading.Event()
+        logger.info(f"Watching {self.src} for new zip files")
+        while not stop.is_set():
+            self.poll()
+            stop.wait(interval)
@@ -0,0 +1,87 @@
+"""
+Test the Arrow IPC hot cache.
+"""
+
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from sdsprint import cache, storage
+
+df = pl.DataFrame(
+    {
+        "MMSI": ["a", "b"] * 24,
+        "# Timestamp": [
+            datetime(2024, 1, 1) + timedelta(hours=h // 2) for h in range(48)
+        ],
+        "Latitude": [55.0 + i / 100 for i in range(48)],
+        "Longitude": [10.0] * 48,
+    }
+)
+
+
+@pytest.fixture
+def product(tmp_path):
+    f = tmp_path / "aisdk-2024-1h.parquet"
+    storage.write_parquet(df, f, row_group_size=10)
+    return f
+
+
+@pytest.mark.parametrize("compression", ["uncompressed", "lz4"])
+def test_materialize(product, tmp_path, compression):
+    out = cache.materialize(product, compression=compression, out_dir=tmp_path / "c")
+    assert cache.is_fresh(out, product)
+    assert storage.file_sorted_by(out) == list(storage.sort_order)
+    assert pl.read_ipc(out, memory_map=True).equals(df)
+
+
+def test_storage_scan_uses_full_copy(product, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "cache_dir", tmp_path / "c")
+    assert cache.lookup(product) is None
+    out = cache.materialize(product)
+    assert cache.lookup(product) == out
+    lf = storage.scan(product)
+    assert "Ipc SCAN" in lf.explain()
+    assert lf.collect().equals(df)
+    assert lf.collect()["# Timestamp"].flags["SORTED_ASC"]
+
+
+def test_subset_and_stale(product, tmp_path):
+    c = tmp_path / "c"
+    sub = cache.materialize(product, columns=["MMSI", "Latitude"], out_dir=c)
+    assert cache.lookup(product, out_dir=c) is None  # No full copy
+    assert cache.lookup(product, ["Latitude"], out_dir=c) == sub
+    assert cache.scan(product, ["Latitude"], out_dir=c).collect().width == 1
+
+    storage.write_parquet(df.head(10), product)
+    assert cache.lookup(product, ["Latitude"], out_dir=c) is None
+    assert cache.entries(c)["stale"].to_list() == [True]
+    assert cache.clear(c, stale_only=True) == [sub]
+
+
+def test_same_name_products(product, tmp_path):
+    c = tmp_path / "c"
+    other = tmp_path / "other" / product.name
+    other.parent.mkdir()
+    storage.write_parquet(df.head(10), other)
+    # And a product whose name extends the first one
+    longer = product.with_name("aisdk-2024-1h-pos.parquet")
+    storage.write_parquet(df.head(4), longer)
+    copies = [cache.materialize(f, out_dir=c) for f in (product, other, longer)]
+    assert len(set(copies)) == 3
+    assert cache.lookup(other, out_dir=c) == copies[1]
+    assert cache.lookup(product, ["Latitude"], out_dir=c) == copies[0]
+    assert cache.scan(other, out_dir=c).collect().height == 10
+
+
+def test_cache_dir_absolute():
+    assert cache.cache_dir.is_absolute()
+
+
+def test_no_import_cycle():
+    code = "import sdsprint.cache, sys; print('sdsprint.storage' in sys.modules)"
+    res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert res.stdout.strip() == "False"
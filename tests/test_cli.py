@@ -0,0 +1,83 @@
+"""
+Test the `sdsprint` command line interface.
+"""
+
+import io
+import subprocess
+import sys
+import zipfile
+from datetime import datetime, timedelta
+
+import polars as pl
+from click.testing import CliRunner
+
+from sdsprint import storage, synth
+from sdsprint.cli import cli
+
+
+def test_no_geo_imports():
+    code = "import sys, sdsprint.cli, sdsprint.utils; print('geopandas' in sys.modules)"
+    res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert res.stdout.strip() == "False"
+
+
+def test_query_counts(tmp_path):
+    f = tmp_path / "aisdk-2024-1h.parquet"
+    storage.write_parquet(
+        pl.DataFrame(
+            {
+                "MMSI": ["a", "b"] * 24,
+                "# Timestamp": [
+                    datetime(2024, 1, 1) + timedelta(hours=h // 2) for h in range(48)
+                ],
+            }
+        ),
+        f,
+    )
+    out = tmp_path / "counts.parquet"
+    res = CliRunner().invoke(
+        cli, ["query", "counts", str(f), "--every", "12h", "--out", str(out)]
+    )
+    assert res.exit_code == 0, res.output
+    assert pl.read_parquet(out)["len"].to_list() == [24, 24]
+
+
+def test_write_profiles():
+    from sdsprint import watch
+    from sdsprint.cli import watch_outputs, write_profiles
+
+    assert write_profiles == list(storage.profiles)
+    assert watch_outputs == watch.outputs
+
+
+def test_bench_profiles(tmp_path):
+    out = tmp_path / "profiles.parquet"
+    res = CliRunner().invoke(
+        cli,
+        ["bench", "profiles", "--vessels", "5", "--repeat", "1", "--out", str(out)],
+    )
+    assert res.exit_code == 0, res.output
+    table = pl.read_parquet(out)
+    assert table["profile"].to_list() == list(storage.profiles)
+    assert table["window_rows"].n_unique() == 1
+
+
+def test_watch_strict(tmp_path):
+    buf = io.StringIO()
+    synth.to_csv(synth.generate(5, rate=10), buf)
+    lines = buf.getvalue().splitlines()
+    lines[3] = ",".join(["abc", *lines[3].split(",")[1:]])  # Bad MMSI
+    src = tmp_path / "AIS_DK"
+    src.mkdir()
+    with zipfile.ZipFile(src / "aisdk-2024-01-01.zip", "w") as z:
+        z.writestr("aisdk-2024-01-01.csv", "\n".join(lines) + "\n")
+
+    def watch(out, *args):
+        cmd = ["watch", str(src), "--out", str(out), "--settle", "0", "--once"]
+        res = CliRunner().invoke(cli, [*cmd, *args])
+        assert res.exit_code == 0, res.output
+        return sorted(out.glob("aisdk-*.parquet"))
+
+    assert watch(tmp_path / "strict", "--strict") == []
+    assert len(watch(tmp_path / "tolerant")) == 3
+    assert (tmp_path / "tolerant" / "raw" / "2024" / "quarantine").exists()
@@ -0,0 +1,49 @@
+"""
+Test detecting vessel encounters on a small resampled product.
+"""
+
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from sdsprint import encounters
+
+t0 = datetime(2024, 1, 1, 22)
+hours = [t0 + timedelta(hours=h) for h in range(5)]  # Crosses midnight
+
+# `a` and `b` are ~100m apart for 3 hours, then `b` sails off; `c` is far away.
+# `d` meets `a` in the first and last hour only (two events).
+df = pl.DataFrame(
+    {
+        "MMSI": ["a"] * 5 + ["b"] * 5 + ["c"] * 5 + ["d"] * 5,
+        "# Timestamp": hours * 4,
+        "Latitude": [55.0] * 5
+        + [55.0009] * 3
+        + [55.5] * 2
+        + [57.0] * 5
+        + [55.0, 56.0, 56.0, 56.0, 55.0],
+        "Longitude": [10.0] * 20,
+    }
+)
+
+
+def test_close_pairs():
+    pairs = encounters.close_pairs(df, radius=500)
+    assert pairs.filter(pl.col("MMSI_b").eq("c")).is_empty()
+    assert pairs["distance"].max() < 110
+
+
+def test_encounters():
+    events = encounters.encounters(df.lazy(), every="1h", radius=500)
+    ab = events.filter(pl.col("MMSI_a").eq("a"), pl.col("MMSI_b").eq("b"))
+    assert ab.rows(named=True)[0] | {"min_distance": None} == {
+        "MMSI_a": "a",
+        "MMSI_b": "b",
+        "start": hours[0],
+        "end": hours[2],
+        "min_distance": None,
+        "windows": 3,
+    }
+    ad = events.filter(pl.col("MMSI_a").eq("a"), pl.col("MMSI_b").eq("d"))
+    assert ad["start"].to_list() == [hours[0], hours[4]]
+    assert events.shape[0] == 4  # a-b, a-d (twice), b-d
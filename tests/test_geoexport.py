@@ -0,0 +1,79 @@
+"""
+Test the GeoParquet export.
+"""
+
+import json
+
+import geopandas as gpd
+import polars as pl
+import pyarrow.parquet as pq
+from click.testing import CliRunner
+
+from sdsprint import geoexport, storage, synth
+from sdsprint.cli import cli
+
+raw = synth.generate(n_vessels=10, days=2, rate=4, seed=4)
+
+
+def test_points(tmp_path):
+    f = tmp_path / "aisdk-2024-1h.parquet"
+    storage.write_parquet(raw, f)
+    out = tmp_path / "points.parquet"
+    n = geoexport.export(f, out, row_group_size=100)
+    assert n == raw.drop_nulls(["Latitude", "Longitude"]).height
+
+    schema = pq.read_schema(out)
+    assert schema.names == ["MMSI", "# Timestamp", "geometry", "bbox"]
+    geo = json.loads(schema.metadata[b"geo"])
+    assert "covering" in geo["columns"]["geometry"]
+    gdf = gpd.read_parquet(out)
+    assert gdf.crs == "EPSG:25832"
+    # Hilbert sorted over the bounds of the export within each daily partition
+    bounds = geoexport.bounds(storage.scan(f), "EPSG:25832")
+    for _, day in gdf.groupby(gdf["# Timestamp"].dt.date):
+        assert day.geometry.hilbert_distance(bounds).is_monotonic_increasing
+    assert gdf["# Timestamp"].dt.date.is_monotonic_increasing
+
+    # An area of interest only touches some row groups, judged by the footer
+    # statistics of the covering columns alone
+    xmin, ymin, xmax, ymax = gdf.total_bounds
+    aoi = (xmin, ymin, (xmin + xmax) / 2, (ymin + ymax) / 2)
+    meta = pq.ParquetFile(out).metadata
+    paths = [f"bbox.{c}" for c in ["xmin", "ymin", "xmax", "ymax"]]
+
+    def box(i: int) -> dict[str, tuple[float, float]]:
+        rg = meta.row_group(i)
+        cols = (rg.column(j) for j in range(rg.num_columns))
+        return {
+            c.path_in_schema: (c.statistics.min, c.statistics.max)
+            for c in cols
+            if c.path_in_schema in paths
+        }
+
+    boxes = [box(i) for i in range(meta.num_row_groups)]
+    hit = [
+        b["bbox.xmin"][0] <= aoi[2]
+        and b["bbox.xmax"][1] >= aoi[0]
+        and b["bbox.ymin"][0] <= aoi[3]
+        and b["bbox.ymax"][1] >= aoi[1]
+        for b in boxes
+    ]
+    assert 0 < sum(hit) < meta.num_row_groups / 2
+    inside = gdf.cx[aoi[0] : aoi[2], aoi[1] : aoi[3]]
+    assert len(gpd.read_parquet(out, bbox=aoi)) == len(inside) < n
+
+
+def test_tracks(tmp_path):
+    f = tmp_path / "aisdk-2024-1h.parquet"
+    storage.write_parquet(raw, f)
+    out = tmp_path / "tracks.parquet"
+    res = CliRunner().invoke(
+        cli, ["export", str(f), "--out", str(out), "--kind", "tracks"]
+    )
+    assert res.exit_code == 0, res.output
+
+    gdf = gpd.read_parquet(out)
+    assert (gdf.geom_type == "LineString").all()
+    days = raw.select("MMSI", pl.col("# Timestamp").dt.date()).unique()
+    assert len(gdf) == days.height
+    assert gdf["n_points"].sum() == raw.drop_nulls(["Latitude", "Longitude"]).height
@@ -0,0 +1,138 @@
+"""
+Test dropping duplicate AIS messages at ingest.
+"""
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from sdsprint import ingest, metrics, storage, synth
+
+csv = """\
+# Timestamp,MMSI,Latitude,Longitude,SOG,Data source type
+01/01/2024 00:00:00,219000001,55.1,10.1,1.0,AIS
+01/01/2024 00:00:00,219000001,55.1,10.1,1.0,AIS
+01/01/2024 00:00:00,219000001,55.1,10.1,1.1,AIS
+01/01/2024 00:00:01,219000001,55.1,10.1,1.0,AIS
+01/01/2024 00:00:00,219000002,55.1,10.1,1.0,AIS
+"""
+
+
+def test_sink_csv_dedup(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    f_csv.write_text(csv)
+    f_pq = f_csv.with_suffix(".parquet")
+
+    dropped = ingest.sink_csv(f_csv, f_pq, keys=ingest.dedup_keys)
+    assert dropped == 2
+    assert pl.read_parquet(f_pq).shape[0] == 3
+
+
+def test_sink_csv_counts(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    f_csv.write_text(csv)
+    # The deduplication streams without Python callbacks
+    plan = pl.scan_csv(f_csv).pipe(ingest.dedup).explain(streaming=True)
+    assert plan.startswith("STREAMING") and "python" not in plan.lower()
+
+    with metrics.stage("sink") as rec:
+        ingest.sink_csv(f_csv, f_csv.with_suffix(".parquet"), keys=ingest.dedup_keys)
+    assert (rec["rows_in"], rec["rows_out"]) == (5, 3)
+    # The temporary parquet file is gone
+    assert sorted(f.name for f in tmp_path.iterdir()) == [
+        "aisdk-2024-01-01.csv",
+        "aisdk-2024-01-01.parquet",
+    ]
+
+
+def test_sink_csv_no_dedup(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    f_csv.write_text(csv)
+    f_pq = f_csv.with_suffix(".parquet")
+
+    assert ingest.sink_csv(f_csv, f_pq) == 0
+    assert pl.read_parquet(f_pq).shape[0] == 5
+
+
+def test_sink_csv_profile(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    f_csv.write_text(csv)
+    f_pq = f_csv.with_suffix(".parquet")
+
+    ingest.sink_csv(f_csv, f_pq, keys=ingest.dedup_keys, profile="hot")
+    assert pq.read_metadata(f_pq).row_group(0).column(0).compression == "LZ4"
+
+
+def test_sink_csv_dedup_keeps_order(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    synth.to_csv(synth.generate(20, rate=30, dup_frac=0.2), f_csv)
+    f_pq = f_csv.with_suffix(".parquet")
+
+    ingest.sink_csv(f_csv, f_pq, keys=ingest.dedup_keys)
+    df = pl.read_parquet(f_pq).pipe(ingest.proc_ais)
+    assert df["# Timestamp"].is_sorted()
+    assert not df.select(ingest.dedup_keys).is_duplicated().any()
+
+
+def test_sink_csv_tolerant(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    synth.to_csv(synth.generate(5, rate=10, dup_frac=0), f_csv)
+    lines = f_csv.read_text().splitlines()
+    n = len(lines) - 1
+    lines[3] = lines[3].replace("/2024 ", "-2024 ", 1)  # Bad timestamp
+    lines[5] = lines[5] + ",extra"
+    lines[8] = ",".join(["abc", *lines[8].split(",")[1:]])  # Bad MMSI
+    fields = lines[10].split(",")
+    fields[19] = '"SKAGEN, ""DK"""'  # Quoted destination with a comma
+    lines[10] = ",".join(fields)
+    fields = lines[12].split(",")
+    fields[20] = "soon"  # Bad ETA, which is optional
+    lines[12] = ",".join(fields)
+    f_csv.write_text("\n".join(lines) + "\n")
+    f_pq = f_csv.with_suffix(".parquet")
+
+    dropped, bad = ingest.sink_csv_tolerant(f_csv, f_pq, keys=ingest.dedup_keys)
+    assert bad == 3
+    df = pl.read_parquet(f_pq)
+    assert df.height == n - bad - dropped
+    assert df.pipe(ingest.proc_ais)["# Timestamp"].is_sorted()
+    assert df.filter(pl.col("Destination").eq('SKAGEN, "DK"')).height == 1
+    ts = lines[12].split(",")[1]
+    assert df.filter(pl.col("# Timestamp").eq(ts))["ETA"].null_count() >= 1
+
+    q = pl.read_parquet(ingest.quarantine_path(f_pq))
+    assert q["line"].to_list() == [4, 6, 9]
+    assert q["reason"].to_list() == [
+        "bad # Timestamp",
+        "expected 26 fields, got 27",
+        "bad MMSI",
+    ]
+
+
+def test_temp_files_hidden(tmp_path, monkeypatch):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    synth.to_csv(synth.generate(5, rate=10), f_csv)
+    concat, seen = storage.concat_parquet, []
+
+    def spy(files, out, **kwargs):
+        # Both intermediate files exist here; a crash would leave them behind
+        seen.extend(tmp_path.glob("aisdk*.parquet"))
+        concat(files, out, **kwargs)
+
+    monkeypatch.setattr(storage, "concat_parquet", spy)
+    f_pq = f_csv.with_suffix(".parquet")
+    ingest.sink_csv_tolerant(f_csv, f_pq, keys=ingest.dedup_keys, profile="archive")
+    assert seen == []
+    assert sorted(f.name for f in tmp_path.iterdir()) == [f_csv.name, f_pq.name]
+
+
+def test_sink_csv_tolerant_matches_sink_csv(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    synth.to_csv(synth.generate(10, rate=20), f_csv)
+    f_pq, f_tol = tmp_path / "a.parquet", tmp_path / "b.parquet"
+
+    ingest.sink_csv(f_csv, f_pq, keys=ingest.dedup_keys)
+    ingest.sink_csv_tolerant(f_csv, f_tol, keys=ingest.dedup_keys)
+    a, b = pl.read_parquet(f_pq), pl.read_parquet(f_tol)
+    assert b.schema == a.schema
+    assert b.equals(a)
+    assert not ingest.quarantine_path(f_tol).exists()
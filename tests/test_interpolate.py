@@ -0,0 +1,86 @@
+"""
+Test interpolating vessel tracks.
+"""
+
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from sdsprint import interpolate, storage
+
+t0 = datetime(2024, 1, 1)
+
+# `a` sails east along 55N with a 1h and a 3h gap; `b` has a single position.
+df = pl.DataFrame(
+    {
+        "MMSI": ["a"] * 4 + ["b"],
+        "# Timestamp": [
+            t0,
+            t0 + timedelta(hours=1),
+            t0 + timedelta(hours=4),
+            t0 + timedelta(hours=4, minutes=30),
+            t0 + timedelta(minutes=7),
+        ],
+        "Latitude": [55.0, 55.0, 55.0, 55.0, 56.0],
+        "Longitude": [10.0, 11.0, 12.0, 12.5, 10.0],
+    }
+)
+
+
+@pytest.mark.parametrize("method", ["linear", "great-circle"])
+def test_interpolate(method):
+    res = interpolate.interpolate(df, "15m", max_gap="2h", method=method)
+    a = res.filter(pl.col("MMSI").eq("a"))
+    # 0:00-1:00 and 4:00-4:30 filled; the 3h gap is left empty
+    assert a["# Timestamp"].dt.hour().to_list() == [0] * 4 + [1, 4, 4, 4]
+    assert a["interpolated"].to_list() == [False, True, True, True] + [
+        False,
+        False,
+        True,
+        False,
+    ]
+    assert a["Longitude"][2] == pytest.approx(10.5, abs=1e-3)
+    # Both methods bend towards the pole between points on a parallel
+    assert a["Latitude"][2] > 55.0
+    assert a["Latitude"][2] == pytest.approx(55.0, abs=0.01)
+    # A single off-grid position has no grid time in its range
+    assert res.filter(pl.col("MMSI").eq("b")).is_empty()
+
+
+def test_tracks(tmp_path):
+    storage.write_parquet(df, tmp_path / "in.parquet")
+    out = tmp_path / "tracks.parquet"
+    n = interpolate.tracks(tmp_path / "in.parquet", out, "5m", batch_size=1)
+    res = storage.scan(out).collect()
+    assert n == res.height == 13 + 7
+    assert storage.file_sorted_by(out) == ["MMSI", "# Timestamp"]
+    assert sorted(f.name for f in tmp_path.iterdir()) == [
+        "in.parquet",
+        "tracks.parquet",
+    ]
+
+    n = interpolate.tracks(tmp_path / "in.parquet", out, "5m", mmsis=["b"])
+    assert n == 0 and storage.scan(out).collect().is_empty()
+
+
+def test_tracks_read_once(tmp_path, monkeypatch):
+    storage.write_parquet(df, tmp_path / "in.parquet")
+    plans = []
+    collect = pl.LazyFrame.collect
+
+    def spy(lf, *args, **kwargs):
+        plans.append(lf.explain())
+        return collect(lf, *args, **kwargs)
+
+    monkeypatch.setattr(pl.LazyFrame, "collect", spy)
+    out = tmp_path / "tracks.parquet"
+    interpolate.tracks(tmp_path / "in.parquet", out, "5m", batch_size=1)
+    # Batches filter the vessel-sorted copy on an MMSI range in the scan; the
+    # source itself is only read by the sort
+    batches = [p for p in plans if "is_between" in p]
+    assert len(batches) == 2
+    for plan in batches:
+        scan = plan.split("Parquet SCAN")[1]
+        assert "tracks.sorted.parquet" in scan and "SELECTION" in scan
+    assert not any("in.parquet" in p for p in plans)
@@ -0,0 +1,74 @@
+"""
+Test kinematic features and consistency checks.
+"""
+
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from sdsprint import kinematics
+
+t0 = datetime(2024, 3, 1, 6)
+dlat = 10 * kinematics.knot * 600 / 111_195  # 10 knots north in 10 minutes
+
+
+def track(mmsi, minutes, lat, lon=10.0, sog=10.0, cog=0.0):
+    """Positions of one vessel at the given minutes after `t0`."""
+    n = len(minutes)
+    return pl.DataFrame(
+        {
+            "MMSI": [mmsi] * n,
+            "# Timestamp": [t0 + timedelta(minutes=m) for m in minutes],
+            "Latitude": lat,
+            "Longitude": lon if isinstance(lon, list) else [lon] * n,
+            "SOG": sog if isinstance(sog, list) else [sog] * n,
+            "COG": cog if isinstance(cog, list) else [cog] * n,
+        }
+    )
+
+
+def test_jump():
+    lon = [10.0] * 4 + [11.0] + [10.0] * 4
+    df = track("a", range(0, 90, 10), [55.0 + dlat * i for i in range(9)], lon)
+    res = kinematics.features(df)
+    assert res["implied_speed"][1] == pytest.approx(10, rel=1e-3)
+    assert res["bearing"][1] == pytest.approx(0, abs=1e-6)
+    assert res["sog_diff"][1] == pytest.approx(0, abs=0.01)
+    # The jump and the way back are flagged, nothing else
+    assert res["flag_speed"].arg_true().to_list() == [4, 5]
+    assert res["suspect"].arg_true().to_list() == [4, 5]
+    assert res["acceleration"][4] > 0 > res["acceleration"][6]
+
+
+def test_gap():
+    # 10 knots for 50 minutes without positions, then a stop of 2 hours
+    minutes = [0, 10, 60, 180]
+    lat = [55.0, 55.0 + dlat, 55.0 + 6 * dlat, 55.0 + 6 * dlat]
+    res = kinematics.features(track("a", minutes, lat), max_gap="1h")
+    # Speed over the gap is implied from the positions around it
+    assert res["dt"].to_list() == [None, 600, 3000, None]
+    assert res["implied_speed"][2] == pytest.approx(10, rel=1e-3)
+    assert res["acceleration"][2] == pytest.approx(0, abs=1e-6)
+    # A gap longer than `max_gap` starts a new segment, not a jump
+    assert res["distance"][3] is None
+    assert not res["suspect"].any()
+
+
+def test_first_row():
+    lat = [55.0 + dlat * i for i in range(6)]
+    df = pl.concat(
+        [
+            track("a", range(0, 60, 10), lat),
+            track("b", range(0, 60, 10), lat, sog=30.0, cog=180.0),
+        ]
+    )
+    features = ["dt", "distance", "implied_speed", "bearing", "acceleration"]
+    first = pl.int_range(pl.len()).over("MMSI").eq(0)
+    res = kinematics.kinematics(df.lazy(), partition="20m")
+    assert res.filter(first).select(features).rows() == [(None,) * 5] * 2
+    # The first row of `b` is not compared to `a` or flagged
+    assert res.filter(first)["suspect"].to_list() == [False, False]
+    assert res.filter(~first, pl.col("MMSI").eq("b"))["flag_sog"].all()
+    # Rows at partition starts still have their previous positions
+    assert res.filter(~first)["acceleration"].null_count() == 2
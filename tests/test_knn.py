@@ -0,0 +1,87 @@
+"""
+Test the spatio-temporal nearest vessel index.
+"""
+
+from datetime import datetime
+
+import polars as pl
+import pytest
+from click.testing import CliRunner
+
+from sdsprint import knn, resampling, storage, synth, utils
+from sdsprint.cli import cli
+
+positions = (
+    synth.generate(n_vessels=30, days=2, rate=6, seed=6)
+    .pipe(resampling.resample_df, every="1h")
+    .sort("# Timestamp", "MMSI")
+)
+lat, lon = 56.0, 10.5
+
+
+def brute_force(t: datetime) -> pl.DataFrame:
+    return (
+        positions.filter(pl.col("# Timestamp").eq(t))
+        .with_columns(
+            utils.haversine(
+                pl.lit(lat), pl.lit(lon), pl.col("Latitude"), pl.col("Longitude")
+            ).alias("distance")
+        )
+        .sort("distance")
+    )
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    f = tmp_path_factory.mktemp("data") / "aisdk-2024-1h.parquet"
+    storage.write_parquet(positions, f)
+    return knn.build(f, tmp_path_factory.mktemp("index"), max_workers=2)
+
+
+def test_knn(index):
+    t = datetime(2024, 1, 1, 12)
+    res = index.knn(lat, lon, time=datetime(2024, 1, 1, 12, 40), k=5)
+    expected = brute_force(t).head(5)
+    assert res["MMSI"].to_list() == expected["MMSI"].to_list()
+    assert (res["# Timestamp"] == t).all()
+    # Projected vs great-circle distances
+    assert res["distance"].to_numpy() == pytest.approx(
+        expected["distance"].to_numpy(), rel=1e-2
+    )
+
+
+def test_within_range(index):
+    start, end = datetime(2024, 1, 1, 22), datetime(2024, 1, 2, 2)
+    res = index.within(lat, lon, 50_000, start=start, end=end)
+    assert res["# Timestamp"].is_between(start, end, closed="left").all()
+    assert (res["distance"] <= 50_000).all()
+    for t in pl.datetime_range(start, end, "1h", closed="left", eager=True):
+        found = set(res.filter(pl.col("# Timestamp").eq(t))["MMSI"])
+        near = brute_force(t)
+        # Projected vs great-circle distances
+        assert set(near.filter(pl.col("distance").le(49_500))["MMSI"]) <= found
+        assert found <= set(near.filter(pl.col("distance").le(50_500))["MMSI"])
+
+
+def test_persisted(index):
+    idx = knn.Index(index.path)
+    assert idx.knn(lat, lon, time=datetime(2024, 1, 2, 5), k=3).height == 3
+    assert idx.knn(lat, lon, time=datetime(2025, 1, 1), k=3).is_empty()
+
+
+def test_cli(index):
+    args = ["--lat", lat, "--lon", lon, "--time", "2024-01-01T12:00:00"]
+    res = CliRunner().invoke(cli, ["index", "knn", str(index.path), *map(str, args)])
+    assert res.exit_code == 0, res.output
+    assert "distance" in res.output
+
+
+def test_time_required(index):
+    with pytest.raises(ValueError, match="time"):
+        index.knn(lat, lon, start=datetime(2024, 1, 1))
+    with pytest.raises(ValueError, match="time"):
+        index.within(lat, lon, 1_000)
+    args = ["--lat", lat, "--lon", lon, "--start", "2024-01-01T12:00:00"]
+    res = CliRunner().invoke(cli, ["index", "within", str(index.path), *map(str, args)])
+    assert res.exit_code == 2
+    assert "--time or both --start and --end" in res.output
@@ -0,0 +1,111 @@
+"""
+Test the per-stage metrics.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import polars as pl
+import pytest
+
+from sdsprint import ingest, metrics, synth
+
+
+@pytest.fixture
+def metrics_file(tmp_path):
+    f = tmp_path / "metrics.jsonl"
+    metrics.configure(f)
+    yield f
+    metrics.configure(None)
+
+
+def read(f) -> list[dict]:
+    return [json.loads(line) for line in f.read_text().splitlines()]
+
+
+def test_stage(metrics_file, tmp_path):
+    f = tmp_path / "out.parquet"
+    with metrics.stage("write", file=f.name, paths_out=[f], rows_in=3) as rec:
+        pl.DataFrame({"a": [1, 2, 3]}).write_parquet(f)
+        rec["rows_out"] = 3
+    (rec,) = read(metrics_file)
+    assert rec["stage"] == "write"
+    assert rec["ok"]
+    assert rec["rows_in"] == rec["rows_out"] == 3
+    assert rec["bytes_written"] == f.stat().st_size
+    assert rec["peak_rss_mb"] > 0
+
+
+@pytest.mark.skipif(metrics.rss_mb() is None, reason="needs /proc")
+def test_stage_rss(metrics_file):
+    with metrics.stage("alloc"):
+        a = np.ones(256 * 1024**2 // 8)  # 256 MB
+    del a
+    with metrics.stage("idle"):
+        pass
+    alloc, idle = read(metrics_file)
+    assert alloc["rss_delta_mb"] > 200
+    # Measured per stage, not the high-water mark of the process
+    assert idle["rss_delta_mb"] < 50
+    assert idle["peak_rss_mb"] < alloc["peak_rss_mb"]
+
+
+def test_stage_failed(metrics_file):
+    with pytest.raises(ValueError), metrics.stage("boom"):
+        raise ValueError
+    assert not read(metrics_file)[0]["ok"]
+
+
+def test_not_configured(tmp_path):
+    with metrics.stage("noop"):
+        pass
+    assert not list(tmp_path.iterdir())
+
+
+def test_profile(metrics_file):
+    metrics.configure(metrics_file, profile=True)
+    with metrics.stage("collect"):
+        df = metrics.collect(pl.LazyFrame({"a": [1, 2]}).select(pl.col("a").sum()))
+    assert df.item() == 3
+    assert read(metrics_file)[0]["profile"]
+
+
+def test_profile_chunks(metrics_file):
+    metrics.configure(metrics_file, profile=True)
+    lf = pl.LazyFrame({"a": [1, 2]})
+    plans = [lf.select(pl.col("a").sum()), lf.filter(pl.col("a").gt(1))]
+    for plan in plans:
+        with metrics.stage("one"):
+            metrics.collect(plan)
+    with metrics.stage("chunks"):
+        for plan in plans:
+            metrics.collect(plan)
+    *ones, chunks = read(metrics_file)
+    # The profiles of all chunks are kept, not only the last one
+    nodes = {node for rec in ones for node, _ in rec["profile"]}
+    assert {node for node, _ in chunks["profile"]} == nodes
+
+
+def test_write_threads(metrics_file):
+    def run(i: int):
+        for _ in range(50):
+            with metrics.stage("thread", file="x" * 10_000, worker=i):
+                pass
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(run, range(8)))
+    recs = read(metrics_file)  # Every line parses
+    assert len(recs) == 400
+
+
+def test_proc_zip_summary(metrics_file, tmp_path):
+    raw = synth.generate(n_vessels=5, days=1, rate=10, seed=1)
+    (z,) = synth.write_zips(raw, tmp_path / "zips")
+    ingest.proc_zip(z, tmp_path / "out", keys=ingest.dedup_keys)
+    per_stage, slowest = metrics.summary(metrics_file)
+    assert sorted(per_stage["stage"]) == ["extract", "sink"]
+    sink = per_stage.filter(pl.col("stage").eq("sink")).row(0, named=True)
+    assert sink["rows_in"] == raw.height
+    assert sink["rows_out"] < raw.height  # Duplicates dropped
+    assert slowest.height == 2
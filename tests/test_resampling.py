@@ -6,7 +6,8 @@ from datetime import datetime
 
 import polars as pl
 
-from sdsprint import utils
+from sdsprint import ingest, resampling, storage, synth, utils, vessels
+from sdsprint.resampling import position_spec, resample_df
 
 dtr = pl.datetime_range(
     start=datetime(year=2021, month=12, day=15, hour=3, minute=0),
@@ -55,3 +56,93 @@ res = filled.select(
 )
 
 assert res.to_numpy().flatten().all()  # All True
+
+
+ais = pl.DataFrame(
+    {
+        "MMSI": ["a"] * 4 + ["b"] * 4,
+        "# Timestamp": dtr[:8].to_list(),  # 03:00 to 04:45 by 15m
+        "Latitude": [55.0, 55.1, 55.2, 55.3, 56.0, 56.1, 56.2, 56.3],
+        "SOG": [1.0, 3.0, None, 2.0, 0.0, 0.0, 1.0, 1.0],
+        "Navigational status": ["Moored", "Moored", "Moored", None] * 2,
+        "Name": [None, "x", None, None, "y", None, None, None],
+    }
+)
+
+
+def test_resample_df_bfill():
+    old = ais.group_by_dynamic(
+        "# Timestamp",
+        every="1h",
+        closed="left",
+        group_by="MMSI",
+        include_boundaries=False,
+    ).agg(pl.all().backward_fill().first())
+    assert resample_df(ais, every="1h").equals(old)
+    assert resample_df(ais.lazy(), every="1h").collect().equals(old)
+
+
+def test_resample_df_spec():
+    out = resample_df(ais, every="1h", spec=position_spec, numobs=True).sort("MMSI")
+    assert out["Latitude"].to_list() == [55.3, 56.3]  # last position per window
+    assert out["SOG"].to_list() == [2.0, 0.5]
+    assert out["Navigational status"].to_list() == ["Moored", "Moored"]
+    assert out["Name"].to_list() == ["x", "y"]
+    assert out["numobs"].to_list() == [4, 4]
+
+
+def test_rs_df_chunked(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    synth.to_csv(synth.generate(n_vessels=20, days=1, rate=20, seed=2), f_csv)
+    f = f_csv.with_suffix(".parquet")
+    ingest.sink_csv(f_csv, f, keys=ingest.dedup_keys)
+
+    whole = resampling.rs_df(f, every="15m")
+    budget = resampling.estimate_size(f)  # Needs mem_factor chunks
+    assert resampling.n_chunks(f, budget) == 4
+    n_rows = pl.scan_parquet(f).select(pl.len()).collect().item()
+    for split in ["mmsi", "time"]:
+        out = resampling.rs_df(f, every="15m", memory_budget=budget, split=split)
+        assert out.equals(whole)
+
+        # Each chunk reads its own rows only, filtered in the scan
+        parts = resampling.chunks(f, 4, "15m", split)
+        assert "SELECTION" in parts[0].explain().split("Parquet SCAN")[1]
+        rows = [p.select(pl.len()).collect().item() for p in parts]
+        assert sum(rows) == n_rows
+        assert max(rows) < n_rows / 2
+
+
+def test_file_null_free(tmp_path):
+    f = tmp_path / "ais.parquet"
+    ais.write_parquet(f)
+    assert resampling.file_null_free(f) == resampling.null_free(ais)
+    assert resampling.file_null_free(f) == ["MMSI", "# Timestamp", "Latitude"]
+
+
+def test_rs_df_split_static(tmp_path):
+    f_csv = tmp_path / "aisdk-2024-01-01.csv"
+    synth.to_csv(synth.generate(n_vessels=5, days=1, rate=20, seed=3), f_csv)
+    f = f_csv.with_suffix(".parquet")
+    ingest.sink_csv(f_csv, f, keys=ingest.dedup_keys)
+
+    whole = resampling.rs_df(f, every="15m")
+    pos = resampling.rs_df(f, every="15m", split_static=True)
+    assert not set(pos.columns) & set(vessels.static_cols)
+    assert pos.equals(whole.select(pos.columns))
+
+
+def test_final_products(tmp_path):
+    days = [
+        ais.with_columns(pl.col("# Timestamp").dt.offset_by(f"{d}d"))
+        .pipe(resample_df, every="15m")
+        .sort("# Timestamp", "MMSI")
+        for d in range(2)
+    ]
+    products = resampling.final_products(days, tmp_path, "aisdk-2021", suffix="-pos")
+    assert sorted(f.name for f in tmp_path.iterdir()) == [
+        f"aisdk-2021-{every}-pos.parquet" for every in ["15m", "1h", "30m"]
+    ]
+    f_1h = tmp_path / "aisdk-2021-1h-pos.parquet"
+    assert storage.scan(f_1h).collect().equals(products["1h"])
+    assert storage.is_sorted(products["1h"], storage.sort_order)
@@ -0,0 +1,91 @@
+"""
+Test the local query server.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from sdsprint import serve, storage
+
+df = pl.DataFrame(
+    {
+        "MMSI": ["a", "b", "c"] * 48,
+        "# Timestamp": [
+            datetime(2024, 1, 1) + timedelta(hours=h // 3) for h in range(144)
+        ],
+        "Latitude": [55.0] * 144,
+        "Longitude": [10.0] * 144,
+    }
+)
+
+
+def test_serve(tmp_path):
+    f = tmp_path / "aisdk-2024-1h.parquet"
+    storage.write_parquet(df, f, row_group_size=24)
+    httpd = serve.serve([f], port=0, geometries=False, block=False)
+    port = httpd.server_address[1]
+    try:
+        ds = serve.query("datasets", port=port)
+        assert ds["rows"].to_list() == [144]
+
+        vessel = serve.query("vessel", port=port, dataset=f.stem, mmsi="b")
+        assert vessel.equals(df.filter(pl.col("MMSI").eq("b")))
+
+        window = serve.query(
+            "window",
+            port=port,
+            dataset=f.stem,
+            start="2024-01-02",
+            end="2024-01-02T12:00",
+            columns="MMSI,# Timestamp",
+        )
+        assert window.shape == (36, 2)
+
+        counts = serve.query("counts", port=port, dataset=f.stem, every="1d")
+        assert counts["len"].to_list() == [72, 72]
+    finally:
+        httpd.shutdown()
+
+
+def test_counts_unrecorded(tmp_path):
+    f = tmp_path / "shuffled.parquet"
+    df.sample(fraction=1.0, shuffle=True, seed=1).write_parquet(f, row_group_size=24)
+    ds = serve.Dataset(f)
+    assert ds.sorted_by == []
+    counts = ds.counts("1d", by="MMSI").sort("MMSI", "# Timestamp")
+    assert counts["len"].to_list() == [24] * 6
+
+
+def test_window_row_groups(tmp_path, monkeypatch):
+    f = tmp_path / "aisdk-2024-1h.parquet"
+    storage.write_parquet(df, f, row_group_size=24)
+    ds = serve.Dataset(f)
+    read = []
+    read_row_groups = pq.ParquetFile.read_row_groups
+
+    def spy(self, row_groups, **kwargs):
+        read.append(list(row_groups))
+        return read_row_groups(self, row_groups, **kwargs)
+
+    monkeypatch.setattr(pq.ParquetFile, "read_row_groups", spy)
+    window = ds.window(datetime(2024, 1, 2), datetime(2024, 1, 2, 6))
+    assert read == [[3]]  # Row groups hold 8 hours
+    assert window.equals(df.slice(72, 18))
+
+
+def test_in_danish_waters_threads(monkeypatch):
+    import shapely
+
+    # A box around 10E 55N in EPSG:25832 instead of the coastline file
+    region = shapely.box(500_000, 6_000_000, 600_000, 6_200_000)
+    monkeypatch.setattr(serve, "danish_region", lambda: region)
+    pos = df.with_columns(
+        pl.Series("Longitude", [10.0, 13.0, 10.5] * 48),
+    )
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        res = list(pool.map(lambda _: serve.in_danish_waters(pos), range(32)))
+    assert all(r.equals(res[0]) for r in res)
+    assert res[0]["MMSI"].unique().sort().to_list() == ["a", "c"]
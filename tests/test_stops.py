@@ -0,0 +1,67 @@
+"""
+Test detecting stop episodes.
+"""
+
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from sdsprint import stops
+
+t0 = datetime(2024, 3, 1, 6)
+
+
+def track(mmsi, sog, minutes, status="Under way using engine", lat=55.0):
+    """Positions of one vessel at the given minutes after `t0`."""
+    n = len(minutes)
+    return pl.DataFrame(
+        {
+            "MMSI": [mmsi] * n,
+            "# Timestamp": [t0 + timedelta(minutes=m) for m in minutes],
+            "Latitude": lat if isinstance(lat, list) else [lat] * n,
+            "Longitude": [10.0] * n,
+            "SOG": sog,
+            "Navigational status": status if isinstance(status, list) else [status] * n,
+        },
+        schema_overrides={"SOG": pl.Float64},
+    )
+
+
+def test_open_end():
+    # Sails in and is still moored at the last position of its track
+    df = track("a", [8.0] * 3 + [0.1] * 6, range(0, 90, 10), status="Moored")
+    res = stops.stops(df.lazy())
+    assert res.select("start", "end", "n", "status").rows() == [
+        (t0 + timedelta(minutes=30), t0 + timedelta(minutes=80), 6, "moored")
+    ]
+    # Open at both ends of every partition, merged back into one episode
+    assert stops.stops(df.lazy(), partition="20m").equals(res)
+
+
+def test_gap():
+    minutes = [0, 10, 20, 30, 40] + [220, 230, 240, 250, 260]
+    df = track("a", [0.0] * 10, minutes)
+    assert stops.stops(df.lazy(), max_gap="2h").height == 2
+    assert stops.stops(df.lazy(), max_gap="4h").height == 1
+    # Only the second stop is long enough
+    short = track("b", [0.0] * 7, [0, 10, 220, 230, 240, 250, 260])
+    assert stops.stops(short.lazy())["start"].to_list() == [
+        t0 + timedelta(hours=3, minutes=40)
+    ]
+
+
+def test_status():
+    # SOG not available (102.3) or missing: stopped if at anchor or moored
+    anchored = track("a", [102.3] * 3 + [None] * 3, range(0, 60, 10), "At anchor")
+    sailing = track("b", [None] * 6, range(0, 60, 10))
+    res = stops.stops(pl.concat([anchored, sailing]).lazy())
+    assert res.select("MMSI", "n", "status").rows() == [("a", 6, "at anchor")]
+
+
+def test_drifting():
+    lat = [55.0 + 0.005 * i for i in range(12)]  # SOG 0.3, over ~6 km
+    df = track("a", [0.3] * 12, range(0, 120, 10), lat=lat)
+    assert stops.stops(df.lazy()).is_empty()
+    res = stops.stops(df.lazy(), max_dispersion=10_000)
+    assert res["dispersion"].item() == pytest.approx(6_116, rel=0.01)
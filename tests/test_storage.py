@@ -0,0 +1,127 @@
+"""
+Test recording the sort order in parquet files and reading it back.
+"""
+
+from datetime import datetime
+
+import polars as pl
+import pyarrow.parquet as pq
+import pytest
+
+from sdsprint import storage
+
+
+def day(d: int) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "MMSI": ["b", "a", "a", "b"],
+            "# Timestamp": [datetime(2024, 1, d, h) for h in [1, 1, 0, 2]],
+            "SOG": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+
+def test_is_sorted():
+    assert not storage.is_sorted(day(1), storage.sort_order)
+    assert storage.is_sorted(day(1).sort("# Timestamp", "MMSI"), storage.sort_order)
+    assert not storage.is_sorted(day(1).sort("# Timestamp"), storage.sort_order)
+
+
+def test_is_sorted_nulls():
+    ts = day(1).sort("# Timestamp", "MMSI")["# Timestamp"]
+    mmsi = [None, "a", None, "b"]
+    df = pl.DataFrame({"# Timestamp": ts, "MMSI": mmsi})
+    assert not storage.is_sorted(df, storage.sort_order)
+    assert storage.is_sorted(df.sort(*storage.sort_order), storage.sort_order)
+    assert not storage.is_sorted(df.sort("MMSI", nulls_last=True), ["MMSI"])
+
+
+def test_roundtrip(tmp_path):
+    files = [tmp_path / f"aisdk-2024-01-0{d}.parquet" for d in [1, 2]]
+    for d, f in enumerate(files, start=1):
+        storage.write_parquet(day(d), f)
+
+    assert storage.sorted_by(files) == list(storage.sort_order)
+    assert storage.sorted_by(files[::-1]) == []  # Overlapping ranges
+
+    df = storage.scan(files).collect()
+    assert df["# Timestamp"].flags["SORTED_ASC"]
+    assert df.equals(pl.concat([day(1), day(2)]).sort(*storage.sort_order))
+
+
+def test_scan_unrecorded(tmp_path):
+    f = tmp_path / "unsorted.parquet"
+    day(1).write_parquet(f)
+    assert storage.sorted_by(f) == []
+    assert storage.scan(f, ensure_sorted=True).collect()["# Timestamp"].is_sorted()
+
+    # Recorded in another order
+    storage.write_parquet(day(1), f, sorted_by=["MMSI", "# Timestamp"])
+    assert storage.scan(f).collect()["MMSI"].flags["SORTED_ASC"]
+    df = storage.scan(f, ensure_sorted=True).collect()
+    assert storage.is_sorted(df, storage.sort_order)
+
+
+def codecs(f) -> set[str]:
+    md = pq.read_metadata(f)
+    return {
+        md.row_group(i).column(j).compression
+        for i in range(md.num_row_groups)
+        for j in range(md.num_columns)
+    }
+
+
+def test_write_profiles(tmp_path):
+    f = tmp_path / "day.parquet"
+    storage.write_parquet(day(1), f, profile="hot", row_group_size=2)
+    assert codecs(f) == {"LZ4"}
+    assert pq.read_metadata(f).num_row_groups == 2
+    assert storage.sorted_by(f) == list(storage.sort_order)
+
+    out = tmp_path / "concat.parquet"
+    storage.concat_parquet([f], out, profile="archive")
+    assert codecs(out) == {"ZSTD"}
+    assert storage.scan(out).collect().equals(storage.scan(f).collect())
+
+    with pytest.raises(ValueError, match="write profile"):
+        storage.write_parquet(day(1), f, profile="fast")
+
+
+def test_archive_columns(tmp_path):
+    df = day(1).with_columns(pl.lit("Class A").alias("Type of mobile"))
+    f = tmp_path / "archive.parquet"
+    # Polars cannot sink it; rewritten by pyarrow
+    assert storage.sink_options("archive") is None
+    storage.sink_parquet(df.lazy(), f, profile="archive")
+    rg = pq.read_metadata(f).row_group(0)
+    cols = {c.path_in_schema: c for c in map(rg.column, range(rg.num_columns))}
+    assert "RLE_DICTIONARY" in cols["Type of mobile"].encodings
+    assert "RLE_DICTIONARY" not in cols["MMSI"].encodings
+    # Statistics for pruning and null counts for the resampling fills
+    assert cols["SOG"].statistics.has_min_max
+    assert cols["SOG"].statistics.null_count == 0
+    assert pl.read_parquet(f).equals(df)
+
+
+def test_concat_coalesces(tmp_path):
+    files = [tmp_path / f"{d}.parquet" for d in range(1, 6)]
+    for d, f in enumerate(files, 1):
+        storage.write_parquet(day(d), f)
+    out = tmp_path / "out.parquet"
+    # Five files of 4 rows into row groups of 8 rows
+    storage.concat_parquet(files, out, profile="hot", row_group_size=8)
+    md = pq.read_metadata(out)
+    sizes = [md.row_group(i).num_rows for i in range(md.num_row_groups)]
+    assert sizes == [8, 8, 4]
+    assert storage.sorted_by(out) == list(storage.sort_order)
+
+
+def test_profile_map():
+    outputs = ["15m", "1h"]
+    assert storage.profile_map([], outputs) == {"15m": "default", "1h": "default"}
+    assert storage.profile_map(["archive", "1h=hot"], outputs) == {
+        "15m": "archive",
+        "1h": "hot",
+    }
+    with pytest.raises(ValueError, match="Unknown output"):
+        storage.profile_map(["30m=hot"], outputs)
@@ -0,0 +1,36 @@
+"""
+Test the synthetic AIS data generator.
+"""
+
+import polars as pl
+
+from sdsprint import ingest, synth
+
+df = synth.generate(50, days=2, rate=20, seed=1)
+
+
+def test_schema():
+    assert df.schema == synth.schema
+
+
+def test_deterministic():
+    assert df.equals(synth.generate(50, days=2, rate=20, seed=1))
+    assert not df.equals(synth.generate(50, days=2, rate=20, seed=2))
+
+
+def test_features():
+    assert df["# Timestamp"].is_sorted()
+    assert df.select(ingest.dedup_keys).is_duplicated().any()
+    assert df["IMO"].null_count() > 0
+    assert df["Latitude"].is_between(*synth.bbox[1::2]).all()
+
+
+def test_raw_roundtrip(tmp_path):
+    f = tmp_path / "aisdk-2024-01-01.csv"
+    synth.to_csv(df, f)
+    assert pl.read_csv(f).pipe(ingest.proc_ais).equals(df)
+
+
+def test_write_zips(tmp_path):
+    files = synth.write_zips(df, tmp_path)
+    assert [f.name for f in files] == ["aisdk-2024-01-01.zip", "aisdk-2024-01-02.zip"]
@@ -0,0 +1,127 @@
+"""
+Test reading time windows and bounding boxes with row group pruning.
+"""
+
+import math
+from datetime import datetime
+
+import polars as pl
+import pytest
+
+from sdsprint import storage, synth, utils
+
+raw = synth.generate(n_vessels=20, days=2, rate=6, seed=3).unique(
+    ["# Timestamp", "MMSI"], maintain_order=True
+)
+start, end = datetime(2024, 1, 1, 6), datetime(2024, 1, 1, 9)
+bbox = (9.0, 55.0, 11.0, 56.5)
+
+
+def expected(df: pl.DataFrame) -> pl.DataFrame:
+    return df.filter(
+        pl.col("# Timestamp").ge(start),
+        pl.col("# Timestamp").lt(end),
+        pl.col("Longitude").is_between(bbox[0], bbox[2]),
+        pl.col("Latitude").is_between(bbox[1], bbox[3]),
+    )
+
+
+def test_read_window(tmp_path):
+    f = tmp_path / "aisdk-2024-1m.parquet"
+    storage.write_parquet(raw, f, row_group_size=500)
+
+    df, rep = utils.read_window(f, start, end, bbox=bbox, report=True)
+    assert df.equals(expected(raw))
+    assert rep["row_groups_read"] < rep["row_groups"] / 4
+    assert rep["row_groups_read"] + rep["row_groups_skipped"] == rep["row_groups"]
+    assert rep["bytes_skipped"] > rep["bytes_read"]
+
+
+def test_read_window_archive(tmp_path):
+    # Sorted by latitude, so only the position statistics can prune
+    f = tmp_path / "aisdk-2024-1m.parquet"
+    storage.write_parquet(raw, f, ["Latitude"], profile="archive", row_group_size=500)
+    box = (9.0, 55.0, 11.0, 55.5)
+
+    df, rep = utils.read_window(f, bbox=box, report=True)
+    assert df.equals(
+        raw.sort("Latitude").filter(
+            pl.col("Longitude").is_between(box[0], box[2]),
+            pl.col("Latitude").is_between(box[1], box[3]),
+        )
+    )
+    assert rep["row_groups_read"] < rep["row_groups"] / 3
+
+
+def test_read_window_partitioned(tmp_path):
+    files = []
+    for (day,), part in raw.group_by(
+        pl.col("# Timestamp").dt.date(), maintain_order=True
+    ):
+        files.append(tmp_path / f"aisdk-{day}.parquet")
+        storage.write_parquet(part, files[-1], row_group_size=500)
+
+    df = utils.read_window(files, start, end, bbox=bbox, columns=["MMSI"])
+    assert df.equals(expected(raw).select("MMSI"))
+
+    empty, rep = utils.read_window(
+        files, datetime(2025, 1, 1), datetime(2025, 1, 2), report=True
+    )
+    assert empty.is_empty() and empty.columns == raw.columns
+    assert rep["row_groups_read"] == 0
+
+
+def test_haversine_antipodal():
+    ends = pl.DataFrame({"lat": [0.0, 55.0], "lon": [0.0, 10.0]})
+    dist = ends.select(
+        utils.haversine(
+            pl.col("lat"), pl.col("lon"), -pl.col("lat"), pl.col("lon") + 180
+        )
+    )
+    assert dist.to_series().to_list() == [math.pi * utils.earth_radius] * 2
+
+
+def test_partitions():
+    parts = utils.partitions(raw.lazy(), "1d")
+    assert parts == [(datetime(2024, 1, d), datetime(2024, 1, d + 1)) for d in (1, 2)]
+    assert utils.partitions(raw.lazy().head(0), "1d") == []
+
+
+def test_map_partitions():
+    def span(df, start):
+        return start, df.height, df["# Timestamp"].min()
+
+    res = utils.map_partitions(raw.lazy(), span, "6h", max_workers=8)
+    assert [r[0] for r in res] == [p[0] for p in utils.partitions(raw.lazy(), "6h")]
+    assert sum(r[1] for r in res) == raw.height
+    assert all(r[2] >= r[0] for r in res)
+
+    res = utils.map_partitions(raw.lazy(), span, "6h", lookback="1h")
+    assert sum(r[1] for r in res) > raw.height
+    assert all(r[2] < r[0] for r in res[1:])
+
+    # One call on an empty frame, for the schema of the results
+    res = utils.map_partitions(raw.lazy().head(0), lambda df, _: df, "6h")
+    assert len(res) == 1 and res[0].is_empty() and res[0].schema == raw.schema
+
+
+def test_read_eagle_positions(tmp_path):
+    t = [datetime(2024, 1, 1, h) for h in range(3)]
+    pos = pl.DataFrame(
+        {
+            "MMSI": ["1", "2", "1"],
+            "# Timestamp": t,
+            "Latitude": [55.0, 56.0, 55.1],
+            "Longitude": [10.0, 11.0, 10.1],
+        }
+    )
+    dim = pl.DataFrame(
+        {"MMSI": ["1", "2"], "valid_from": t[:2], "IMO": [utils.eagle_imo, "1"]}
+    )
+    f, f_dim = tmp_path / "aisdk-2024-1h-pos.parquet", tmp_path / "vessels.parquet"
+    storage.write_parquet(pos, f)
+    dim.write_parquet(f_dim)
+    with pytest.raises(ValueError, match="vessel table"):
+        utils.read_eagle(f)
+    eagle = utils.read_eagle(f, vessel_table=f_dim)
+    assert eagle["Latitude"].to_list() == [55.0, 55.1]
@@ -0,0 +1,81 @@
+"""
+Test splitting static vessel fields into a dimension table and joining back.
+"""
+
+from datetime import datetime, timedelta
+
+import polars as pl
+
+from sdsprint import vessels
+
+ts = [datetime(2024, 1, 1, h) for h in range(5)]
+df = (
+    pl.DataFrame(
+        {
+            "MMSI": ["a", "a", "a", "a", "b"],
+            "# Timestamp": ts,
+            "SOG": [1.0, 2.0, 3.0, 4.0, 5.0],
+            "IMO": [None, "1", None, "2", "3"],  # `a` reports IMO at 01:00 and 03:00
+            "Name": ["x", "x", "x", "x", "y"],
+        }
+    )
+    .with_columns(
+        pl.lit(None, dtype=pl.String).alias(c)
+        for c in ["Callsign", "Ship type", "Cargo type", "Destination"]
+    )
+    .with_columns(
+        pl.lit(None, dtype=pl.Float64).alias(c)
+        for c in ["Width", "Length", "A", "B", "C", "D"]
+    )
+    .with_columns(pl.lit(None, dtype=pl.Datetime("us")).alias("ETA"))
+)
+
+dim, pos = vessels.split_static(df)
+dim = dim.collect()
+
+
+def test_versions():
+    assert dim.shape[0] == 4
+    a = dim.filter(pl.col("MMSI").eq("a")).sort("valid_from")
+    # Only filled forwards: no IMO before it was first reported
+    assert a["IMO"].to_list() == [None, "1", "2"]
+    assert a["valid_from"].to_list() == [ts[0], ts[1], ts[3]]
+    assert a["valid_to"].to_list() == [ts[1], ts[3], None]
+
+
+def test_fill_window():
+    late = df.with_columns(pl.col("# Timestamp") + pl.duration(days=pl.int_range(5)))
+    a = vessels.vessel_dim(late.filter(pl.col("MMSI").eq("a")), window="1d")
+    # IMO "1" is reported on day 1 and expires after day 2
+    assert a.collect()["IMO"].to_list() == [None, "1", None, "2"]
+    a = vessels.vessel_dim(late.filter(pl.col("MMSI").eq("a")), window=None)
+    assert a.collect()["IMO"].to_list() == [None, "1", "2"]
+
+
+def test_merge_dims():
+    day = timedelta(days=1)
+    dims = [
+        vessels.vessel_dim(df),
+        vessels.vessel_dim(df.with_columns(pl.col("# Timestamp") + day)),
+    ]
+    merged = vessels.merge_dims(dims).collect()
+    a = merged.filter(pl.col("MMSI").eq("a"))
+    # Day 2 starts without an IMO again, `b` is unchanged
+    assert a["IMO"].to_list() == [None, "1", "2"] * 2
+    assert a["valid_to"][2] == ts[0] + day
+    b = merged.filter(pl.col("MMSI").eq("b"))
+    assert b["valid_from"].to_list() == [ts[4]] and b["valid_to"][0] is None
+
+
+def test_positions_narrow():
+    assert set(pos.collect_schema().names()) == {"MMSI", "# Timestamp", "SOG"}
+
+
+def test_join_back():
+    joined = vessels.join_static(pos, dim).collect().sort("MMSI", "# Timestamp")
+    expected = (
+        df.with_columns(pl.col("IMO").forward_fill().over("MMSI"))
+        .select(joined.columns)
+        .sort("MMSI", "# Timestamp")
+    )
+    assert joined.equals(expected)
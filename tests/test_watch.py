@@ -0,0 +1,79 @@
+"""
+Test the incremental ingest of new zip files.
+"""
+
+import threading
+from datetime import datetime
+
+import polars as pl
+
+from sdsprint import storage, synth
+from sdsprint.watch import Watcher
+
+# Two days of January and one of February
+raw = synth.generate(n_vessels=10, days=3, rate=6, start=datetime(2024, 1, 30), seed=5)
+
+
+def test_poll_incremental(tmp_path):
+    src, out = tmp_path / "AIS_DK", tmp_path / "out"
+    zips = synth.write_zips(raw, tmp_path / "zips")
+    src.mkdir()
+    w = Watcher(src, out, settle=0)
+    assert w.poll() == []
+
+    (src / zips[0].name).write_bytes(zips[0].read_bytes())
+    (src / zips[1].name).write_bytes(zips[1].read_bytes())
+    (src / "aisdk-2024-02-01.zip").write_bytes(b"PK partial")  # Still copying
+    (src / "aisdk-2023-12.zip").write_bytes(zips[0].read_bytes())  # Monthly
+    assert sorted(w.poll()) == ["2024-01-30", "2024-01-31"]
+    assert w.poll() == []
+    january = w.product("2024-01", "1h")
+    two, mtime = pl.read_parquet(january), january.stat().st_mtime_ns
+
+    (src / zips[2].name).write_bytes(zips[2].read_bytes())
+    assert w.poll() == ["2024-02-01"]
+    # Only the month of the new day is rewritten
+    assert january.stat().st_mtime_ns == mtime
+    for every in ["15m", "30m", "1h"]:
+        files = w.products("2024", every)
+        assert [f.name for f in files] == [
+            f"aisdk-2024-01-{every}.parquet",
+            f"aisdk-2024-02-{every}.parquet",
+        ]
+        assert storage.sorted_by(files) == list(storage.sort_order)
+    df = storage.scan(w.products("2024", "1h")).collect()
+    assert df.head(two.height).equals(two)
+    assert df["# Timestamp"].dt.date().n_unique() == 3
+    assert df.select("# Timestamp", "MMSI").is_unique().all()
+
+
+def test_run(tmp_path):
+    src = tmp_path / "AIS_DK" / "2024"
+    synth.write_zips(raw.head(100), src)
+    w = Watcher(src.parent, tmp_path / "out", settle=0)
+    stop = threading.Event()
+    t = threading.Thread(target=w.run, kwargs={"interval": 0.05, "stop": stop})
+    t.start()
+    for _ in range(100):
+        if w.products("2024", "1h"):
+            break
+        stop.wait(0.05)
+    stop.set()
+    t.join()
+    assert w.products("2024", "1h")
+
+
+def test_zip_removed(tmp_path):
+    src = tmp_path / "AIS_DK"
+    zips = synth.write_zips(raw, src)
+
+    class Removing(Watcher):
+        def process(self, zip_path):
+            if zip_path == zips[0]:
+                zip_path.unlink()  # Moved away while being processed
+            return super().process(zip_path)
+
+    w = Removing(src, tmp_path / "out", settle=0)
+    assert w.poll() == ["2024-01-31", "2024-02-01"]
+    assert not w.failed
+    assert w.poll() == []